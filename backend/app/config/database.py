@@ -1,14 +1,20 @@
 """Database Configuration Module for Loan Management System.
 
 This module handles MongoDB database connectivity and threshold configuration management.
-It implements a singleton pattern for database connections and provides default threshold values.
+It implements a per-process singleton pattern for database connections (a synchronous
+PyMongo client for scripts, workers and CPU-bound routes, and an asynchronous Motor client
+for async routes), builds both clients from one set of tunable pool settings, and provides
+default threshold values.
 """
 
 import os
 import logging
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference
+from pymongo.write_concern import WriteConcern
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pymongo.errors import ConnectionFailure
+from app.config.pool_metrics import PoolStatsListener
 
 # Load environment variables from .env file
 load_dotenv()
@@ -27,36 +33,167 @@ if not MONGO_URI:
 # Log in a safe way to avoid exposing sensitive information
 logger.debug("MongoDB URI loaded successfully (sanitized).")
 
-# Singleton MongoDB client instance
+def _optional_int(name):
+    """Read an optional integer setting from the environment."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+# Database name and connection pool settings
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "loan_database")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = _optional_int("MONGO_MAX_IDLE_TIME_MS")  # None: keep idle connections
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")  # None: wait for a free connection
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "1")  # e.g. "1", "majority"
+MONGO_JOURNAL = os.getenv("MONGO_JOURNAL", "").lower() in ("1", "true", "yes")
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "absecure-backend")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+if MONGO_READ_PREFERENCE not in READ_PREFERENCES:
+    raise ValueError(f"Invalid MONGO_READ_PREFERENCE '{MONGO_READ_PREFERENCE}'. Use one of {list(READ_PREFERENCES)}.")
+
+# Pool statistics for the sync and async clients of the current process
+pool_stats = {
+    "sync": PoolStatsListener("sync"),
+    "async": PoolStatsListener("async"),
+}
+
+def get_client_options(listener=None) -> dict:
+    """Build the keyword arguments shared by every MongoDB client.
+    
+    Args:
+        listener: Optional PoolStatsListener to register on the client.
+        
+    Returns:
+        dict: Keyword arguments for MongoClient / AsyncIOMotorClient.
+    """
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "appname": MONGO_APP_NAME,
+    }
+    if MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if listener is not None:
+        options["event_listeners"] = [listener]
+    return options
+
+def _configure_database(client):
+    """Return the application database with the configured read preference and write concern."""
+    w = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    return client.get_database(
+        MONGO_DB_NAME,
+        read_preference=READ_PREFERENCES[MONGO_READ_PREFERENCE],
+        write_concern=WriteConcern(w=w, j=MONGO_JOURNAL or None),
+    )
+
+def create_client(uri=None, **overrides) -> MongoClient:
+    """Create a new synchronous MongoClient using the configured pool settings.
+    
+    Scripts such as seed.py use this instead of building their own client so that
+    every process shares the same tuning.
+    
+    Args:
+        uri: Connection string; defaults to MONGO_URI.
+        **overrides: Client options overriding the configured defaults.
+        
+    Returns:
+        MongoClient: A new, unshared client.
+    """
+    return MongoClient(uri or MONGO_URI, **{**get_client_options(), **overrides})
+
+# Per-process singleton MongoDB client instances
 _client = None  # Global variable to hold the MongoDB client instance
+_async_client = None  # Global variable to hold the Motor (asyncio) client instance
+_client_pid = None  # Process that created `_client`
+_async_client_pid = None  # Process that created `_async_client`
+
+def _reset_clients_after_fork():
+    """Drop the parent's clients in a forked child so it creates its own.
+    
+    MongoClient is not fork-safe: sockets and monitor threads belong to the parent.
+    The inherited clients are discarded without closing them (closing would act on
+    the parent's connections).
+    """
+    global _client, _async_client, _client_pid, _async_client_pid
+    _client = _async_client = None
+    _client_pid = _async_client_pid = None
+    for listener in pool_stats.values():
+        listener.reset()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
 
 def get_database():
-    """Get a singleton MongoDB database connection instance.
+    """Get the per-process singleton MongoDB database connection instance.
     
     Returns:
-        Database: The MongoDB database instance named 'loan_database'.
+        Database: The MongoDB database instance (MONGO_DB_NAME, 'loan_database' by default).
         
     Raises:
         Exception: If connection to MongoDB fails.
         
     Note:
-        Uses singleton pattern to maintain single connection throughout application.
+        Uses a singleton per process: a process forked after the client was created
+        (e.g. a Celery worker) gets a fresh client on its first call.
     """
-    global _client  # Use the global `_client` variable
+    global _client, _client_pid  # Use the global `_client` variable
 
-    if _client is None:  # Check if the client is already initialized
+    if _client is None or _client_pid != os.getpid():  # Create once per process
         try:
-            _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)  # 5s timeout for connection
+            _client = MongoClient(MONGO_URI, **get_client_options(pool_stats["sync"]))
+            _client_pid = os.getpid()
             logger.info("MongoDB connection established successfully.")
         except ConnectionFailure as e:
             logger.error(f"MongoDB Connection Failed: {str(e)}")
             raise Exception("MongoDB Connection Failed!")
 
-    return _client["loan_database"]  # Return the `loan_database` instance
+    return _configure_database(_client)
+
+def get_async_database():
+    """Get the per-process singleton asynchronous (Motor) database instance for async routes.
+    
+    Returns:
+        AsyncIOMotorDatabase: The Motor database instance (MONGO_DB_NAME, 'loan_database' by default).
+        
+    Note:
+        Every operation on the returned database must be awaited. The client binds to
+        the running event loop lazily, so it is safe to create at import time.
+    """
+    global _async_client, _async_client_pid
+
+    if _async_client is None or _async_client_pid != os.getpid():
+        _async_client = AsyncIOMotorClient(MONGO_URI, **get_client_options(pool_stats["async"]))
+        _async_client_pid = os.getpid()
+        logger.info("Async MongoDB client created successfully.")
 
-# Define Collections for Direct Access
-db = get_database()
-threshold_collection = db["thresholds"]  # Collection for storing threshold values
+    return _configure_database(_async_client)
+
+def get_pool_settings() -> dict:
+    """Return the effective connection pool settings (without credentials)."""
+    return {
+        "database": MONGO_DB_NAME,
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+        "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "server_selection_timeout_ms": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "read_preference": MONGO_READ_PREFERENCE,
+        "write_concern": MONGO_WRITE_CONCERN,
+        "journal": MONGO_JOURNAL,
+    }
 
 DEFAULT_THRESHOLDS = {
     "_id": "threshold_values",
@@ -155,6 +292,7 @@ def initialize_default_thresholds():
     Note:
         Checks if thresholds document exists before inserting to prevent duplicates.
     """
+    threshold_collection = get_database()["thresholds"]  # Collection for storing threshold values
     if threshold_collection.find_one({"_id": "threshold_values"}) is None:
         threshold_collection.insert_one(DEFAULT_THRESHOLDS)
         logger.info("Default thresholds inserted into the database.")
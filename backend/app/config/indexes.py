@@ -0,0 +1,213 @@
+"""MongoDB index registry and query plan report.
+
+This module declares every index the application relies on, next to the hot
+queries those indexes are meant to serve:
+- `apply_indexes` creates the declared indexes idempotently and is called at
+  application startup, after `initialize_default_thresholds`,
+- `explain_hot_queries` runs `explain()` on each hot query and flags plans
+  that scan a whole collection or sort in memory.
+
+Run the report (and apply the indexes first) from the backend directory with:
+
+    python -m app.config.indexes            # apply indexes, then explain
+    python -m app.config.indexes --no-apply # explain only
+"""
+
+import sys
+import logging
+import argparse
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Declared indexes, by collection. Names are fixed so re-applying is a no-op.
+INDEXES = {
+    "users": [
+        # login / verify_email lookups; also makes register's DuplicateKeyError real
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "tranches": [
+        # /tranch/available pages unsold tranches in _id order; user-tranches lists an investor's
+        IndexModel([("investor_id", ASCENDING), ("_id", ASCENDING)], name="investor_id_id"),
+        # marketplace filters
+        IndexModel([("investor_id", ASCENDING), ("risk_category", ASCENDING), ("_id", ASCENDING)],
+                   name="investor_id_risk_category_id"),
+        IndexModel([("investor_id", ASCENDING), ("criteria", ASCENDING), ("suboption", ASCENDING), ("_id", ASCENDING)],
+                   name="investor_id_criteria_suboption_id"),
+        # min_budget / max_budget: tight bounds on budget_spent, the matches are sorted by _id
+        IndexModel([("investor_id", ASCENDING), ("budget_spent", ASCENDING), ("_id", ASCENDING)],
+                   name="investor_id_budget_spent_id"),
+    ],
+    "loans": [
+        # min_/max_ range filters used by the listing, export and bulk endpoints
+        IndexModel([("CreditScore", ASCENDING)], name="credit_score"),
+        IndexModel([("LoanDuration", ASCENDING)], name="loan_duration"),
+        IndexModel([("DebtToIncomeRatio", ASCENDING)], name="debt_to_income"),
+        IndexModel([("Age", ASCENDING)], name="age"),
+        # change feed: loans changed after a (change_seq, _id) position
+        IndexModel([("change_seq", ASCENDING), ("_id", ASCENDING)], name="change_seq_id"),
+    ],
+    "loan_reservations": [
+        # _id (the loan id) is unique by default; release by tranche on delete / re-checkout
+        IndexModel([("tranche_id", ASCENDING)], name="tranche_id"),
+    ],
+    "email_outbox": [
+        # outbox worker: due pending messages and expired sending leases; the claimed batch
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("claim", ASCENDING)], name="claim", sparse=True),
+    ],
+    "macro_alerts": [
+        # /health/alerts lists the latest alerts
+        IndexModel([("started_at", ASCENDING)], name="started_at"),
+    ],
+    "anomaly_events": [
+        # /health/anomalies lists the latest alerts
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "loan_tombstones": [
+        IndexModel([("change_seq", ASCENDING), ("_id", ASCENDING)], name="change_seq_id"),
+    ],
+}
+
+# Hot queries checked by the plan report: (description, collection, filter, sort)
+HOT_QUERIES = [
+    ("login / verify_email by email", "users", {"email": "investor@example.com"}, None),
+    ("available tranches page", "tranches", {"investor_id": None}, [("_id", ASCENDING)]),
+    ("available tranches by risk category", "tranches", {"investor_id": None, "risk_category": "Low"},
+     [("_id", ASCENDING)]),
+    ("available tranches by criteria", "tranches",
+     {"investor_id": None, "criteria": "Duration", "suboption": "Short-Term"}, [("_id", ASCENDING)]),
+    ("available tranches by budget range", "tranches",
+     {"investor_id": None, "budget_spent": {"$gte": 10000, "$lte": 50000}}, [("_id", ASCENDING)]),
+    ("tranches of an investor (portfolio rebuild)", "tranches", {"investor_id": ObjectId()}, None),
+    ("loans by credit score range", "loans", {"CreditScore": {"$gte": 700, "$lte": 800}}, None),
+    ("loans by loan duration", "loans", {"LoanDuration": {"$lte": 36}}, None),
+    ("loans by debt-to-income", "loans", {"DebtToIncomeRatio": {"$lte": 30}}, None),
+    ("loans by age", "loans", {"Age": {"$gte": 50}}, None),
+    ("loan keyset page", "loans", {"_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", ASCENDING)]),
+    ("loan change feed", "loans", {"change_seq": {"$gt": 0}}, [("change_seq", ASCENDING), ("_id", ASCENDING)]),
+    ("reservations of a tranche", "loan_reservations", {"tranche_id": ObjectId()}, None),
+    ("due outbox emails", "email_outbox",
+     {"status": "pending", "next_attempt_at": {"$lte": datetime.now(timezone.utc)}}, None),
+    ("tombstone change feed", "loan_tombstones", {"change_seq": {"$gt": 0}},
+     [("change_seq", ASCENDING), ("_id", ASCENDING)]),
+]
+
+
+def apply_indexes(db, registry: dict = INDEXES) -> dict:
+    """Create the declared indexes; existing identical indexes are left untouched.
+
+    A failure on one collection (e.g. duplicate emails blocking the unique index,
+    or an index of the same name with different options) is logged and does not
+    stop the others or the application startup.
+
+    Args:
+        db: PyMongo database
+        registry: Mapping of collection name to IndexModel list
+
+    Returns:
+        dict: Created index names per collection, or the error message on failure
+    """
+    results = {}
+    for collection_name, models in registry.items():
+        try:
+            results[collection_name] = db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            logger.error(f"Could not create indexes on '{collection_name}': {e.details.get('errmsg', str(e))}")
+            results[collection_name] = f"error: {e.details.get('errmsg', str(e))}"
+    logger.info(f"Indexes applied: {results}")
+    return results
+
+
+def _plan_nodes(plan: dict) -> list:
+    """Flatten a winning plan tree into a list of its nodes, root first."""
+    if not plan:
+        return []
+    plan = plan.get("queryPlan", plan)  # slot-based engine wraps the plan tree
+    nodes = [plan]
+    children = list(plan.get("inputStages", []))
+    if "inputStage" in plan:
+        children.append(plan["inputStage"])
+    for child in children:
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def explain_query(db, collection_name: str, query: dict, sort=None) -> dict:
+    """Explain one query and summarize its winning plan.
+
+    Returns:
+        dict: stages, the indexes used, and collscan / in_memory_sort flags
+    """
+    cursor = db[collection_name].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = cursor.explain()
+    nodes = _plan_nodes(explanation.get("queryPlanner", {}).get("winningPlan", {}))
+    stages = [node.get("stage", "?") for node in nodes]
+    return {
+        "stages": stages,
+        "indexes": [node["indexName"] for node in nodes if "indexName" in node],
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+    }
+
+
+def explain_hot_queries(db, queries: list = HOT_QUERIES) -> list:
+    """Explain every hot query.
+
+    Returns:
+        list: One report dict per query (description, collection plus explain_query fields)
+    """
+    reports = []
+    for description, collection_name, query, sort in queries:
+        report = {"query": description, "collection": collection_name}
+        try:
+            report.update(explain_query(db, collection_name, query, sort))
+        except OperationFailure as e:
+            report["error"] = e.details.get("errmsg", str(e))
+        reports.append(report)
+    return reports
+
+
+def print_report(reports: list) -> int:
+    """Print the plan report and return the number of flagged queries."""
+    flagged = 0
+    for report in reports:
+        if "error" in report:
+            status = f"ERROR {report['error']}"
+            flagged += 1
+        else:
+            problems = [name for name, flag in (("COLLSCAN", report["collscan"]),
+                                               ("IN-MEMORY SORT", report["in_memory_sort"])) if flag]
+            status = "FLAGGED " + ", ".join(problems) if problems else "ok"
+            flagged += bool(problems)
+        plan = " <- ".join(report.get("stages", []))
+        if report.get("indexes"):
+            plan += f"; index: {', '.join(report['indexes'])}"
+        print(f"[{status}] {report['collection']}: {report['query']}  ({plan})")
+    print(f"\n{flagged} of {len(reports)} hot queries flagged.")
+    return flagged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply the index registry and explain the hot queries.")
+    parser.add_argument("--no-apply", action="store_true", help="Only explain; do not create indexes")
+    args = parser.parse_args()
+
+    from app.config.database import get_database
+
+    db = get_database()
+    if not args.no_apply:
+        apply_indexes(db)
+    flagged = print_report(explain_hot_queries(db))
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,121 @@
+"""MongoDB connection pool metrics.
+
+This module provides a PyMongo connection pool listener that keeps running
+counters for a client's pools: connections checked out, checkout wait time,
+checkout failures and connection churn (connections created and closed).
+The counters are exposed through the readiness endpoints so pool sizes can be
+tuned under load.
+"""
+
+import os
+import time
+import threading
+from pymongo import monitoring
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Connection pool listener that aggregates pool statistics in memory.
+
+    PyMongo invokes listeners from its own threads, so all counters are
+    updated under a lock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset every counter (used when a new client replaces an old one)."""
+        with self._lock:
+            self.pid = os.getpid()
+            self.started_at = time.monotonic()
+            self.pools_cleared = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+
+    # Pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    # Connection lifecycle events
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    # Checkout events
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _record_wait(self, event) -> None:
+        """Accumulate the time a checkout spent waiting (caller holds the lock)."""
+        duration = getattr(event, "duration", None) or 0.0
+        self.checkout_wait_total += duration
+        self.checkout_wait_max = max(self.checkout_wait_max, duration)
+
+    def snapshot(self) -> dict:
+        """Return a point-in-time copy of the pool statistics.
+
+        Returns:
+            dict: Current and cumulative counters. Wait times are in milliseconds;
+                churn is connections created/closed per minute since the reset.
+        """
+        with self._lock:
+            uptime = max(time.monotonic() - self.started_at, 1e-9)
+            waits = self.checkouts + self.checkout_failures
+            return {
+                "client": self.name,
+                "pid": self.pid,
+                "uptime_seconds": round(uptime, 1),
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": round(self.checkout_wait_total / waits * 1000, 3) if waits else 0.0,
+                "max_checkout_wait_ms": round(self.checkout_wait_max * 1000, 3),
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "connections_created_per_minute": round(self.connections_created / uptime * 60, 2),
+                "connections_closed_per_minute": round(self.connections_closed / uptime * 60, 2),
+                "pools_cleared": self.pools_cleared,
+            }
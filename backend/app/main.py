@@ -2,9 +2,15 @@ from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import logging
-from app.routes import loan_routes, auth_routes, pool_routes, tranch_routes  # Import auth routes
-from app.config.database import initialize_default_thresholds
+from app.routes import loan_routes, auth_routes, pool_routes, tranch_routes, health_routes  # Import auth routes
+from app.config.database import initialize_default_thresholds, get_database
+from app.config.indexes import apply_indexes
+from app.services.loan_reservations import backfill_reservations
+from app.services.loan_versioning import backfill_change_seqs
 from app.services.celery_worker import check_cpi_spike
+from app.services.allocation_worker import allocation_pool
+from app.services.auth_service import password_pool
+from app.services.email_outbox import EMAIL_OUTBOX_WORKER, outbox_worker
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +23,28 @@ app = FastAPI()
 @app.on_event("startup")
 def startup_event():
     initialize_default_thresholds()
+    apply_indexes(get_database())
+    backfill_reservations(get_database())
+    backfill_change_seqs(get_database())
+    allocation_pool.start()
+    password_pool.start()
+
+
+@app.on_event("startup")
+async def start_email_outbox():
+    if EMAIL_OUTBOX_WORKER:
+        outbox_worker.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    allocation_pool.shutdown()
+    password_pool.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    await outbox_worker.stop()
 
 
 @app.post("/trigger-cpi-check")
@@ -28,6 +56,7 @@ app.include_router(loan_routes.router)
 app.include_router(auth_routes.router, prefix="/auth")  # Include auth routes
 app.include_router(pool_routes.router, prefix="/pool")  
 app.include_router(tranch_routes.router, prefix="/tranch")  
+app.include_router(health_routes.router, prefix="/health")
 
 # CORS Configuration (if required)
 from fastapi.middleware.cors import CORSMiddleware
@@ -38,6 +67,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Root endpoint
@@ -52,6 +82,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "status_code": exc.status_code},
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(Exception)
@@ -4,9 +4,9 @@ import os
 import logging
 import requests
 import pandas as pd
+import numpy as np
 import yfinance as yf
 import kagglehub
-import google.generativeai as genai
 from dotenv import load_dotenv
 import sys
 
@@ -15,6 +15,7 @@ from app.services.pool_service import allocate_tranches
 
 #from app.services.pool_service import allocate_tranches
 from app.ml.risk_model import get_updated_dataset, get_risk_score
+from app.services.report_service import generate_report
 
 # Load environment variables
 load_dotenv()
@@ -22,7 +23,6 @@ load_dotenv()
 # Constants
 MODEL_PKL = "loan_risk_model.pkl" 
 api_key = os.getenv("api_key")
-GENAI_API_KEY = os.getenv("GENAI_API_KEY")
 
 
 # Configure logging
@@ -37,8 +37,9 @@ def download_loan_data():
     return pd.read_csv(os.path.join(path, "Loan.csv"))
 
 
-# Function to Process Loan Data with Macroeconomic Features
-def process_loan_data(df,start_year=2018, end_year=2024):
+# Function to Fetch Yearly Macroeconomic Indicators
+def fetch_macro_indicators(start_year=2018, end_year=2024):
+    """Fetch yearly macroeconomic indicators, one row per `Year`."""
     logging.info("Fetching macroeconomic data...")
 
     # Step 1: Fetch macroeconomic data from Yahoo Finance
@@ -72,7 +73,14 @@ def process_loan_data(df,start_year=2018, end_year=2024):
     inflation_data = inflation_data[["Year", "InflationRate"]].dropna().groupby("Year").mean().reset_index()
 
     # Merge macroeconomic and inflation data
-    merged_data = pd.merge(df_macro, inflation_data, on='Year', how='left')
+    return pd.merge(df_macro, inflation_data, on='Year', how='left')
+
+
+# Function to Process Loan Data with Macroeconomic Features
+def process_loan_data(df, start_year=2018, end_year=2024, macro_data=None):
+    if macro_data is None:
+        macro_data = fetch_macro_indicators(start_year, end_year)
+    merged_data = macro_data
 
     logging.info("Merging loan dataset with macroeconomic indicators...")
 
@@ -94,74 +102,169 @@ def process_loan_data(df,start_year=2018, end_year=2024):
     loan_data["InflationImpact"] = loan_data["TotalDebtToIncomeRatio"] * (loan_data["InflationRate"] / 100)
 
     logging.info("Loan data processing completed.")
-    logging.info(f"the data is {loan_data.head()}")
+    logging.debug(f"the data is {loan_data.head()}")
 
     return loan_data
 
 
+def _macro_by_year(macro_data):
+    """Reduce macro data to one row per year with the columns used for impact analysis.
 
+    Accepts either the yearly table from fetch_macro_indicators (keyed by `Year`)
+    or a loan-level frame from process_loan_data (keyed by `ApplicationYear`).
+    """
+    if "ApplicationYear" in macro_data.columns:
+        macro_data = macro_data.drop_duplicates("ApplicationYear").rename(columns={"ApplicationYear": "Year"})
+    return macro_data[["Year", "interest_rate", "InflationRate"]].drop_duplicates("Year").set_index("Year")
 
 
-def summarize_tranche_allocation(selected_loans_per_tranche, criterion, suboption):
-    """Generate a summary of the tranche allocation."""
+def compute_tranche_statistics(selected_loans_per_tranche, macro_data=None):
+    """Compute allocation and macroeconomic impact statistics for every tranche in one pass.
+
+    All selected loans are concatenated into a single frame, joined with the yearly
+    macro features on `ApplicationYear`, and aggregated with one groupby, so the cost
+    is linear in the number of selected loans.
+
+    Args:
+        selected_loans_per_tranche: Mapping of tranche name to its selected loans
+        macro_data: Yearly macro indicators (or loan data carrying them); optional
+
+    Returns:
+        pd.DataFrame: One row per tranche indexed by tranche name with columns
+            loan_count, total_amount, avg_risk_score and, when macro data is given,
+            avg_interest_impact and avg_inflation_impact. None if there is no allocation.
+    """
     if selected_loans_per_tranche is None:
         return None
-    summary = f"Investor selected loans based on '{criterion}' with suboption '{suboption}'.\nTranche Allocation Summary:\n"
-    for tranche, loans in selected_loans_per_tranche.items():
-        total_loans = len(loans)
-        total_amount = loans["LoanAmount"].sum() if not loans.empty else 0
-        avg_risk_score = loans["RiskScore"].mean() if not loans.empty else 0
-        summary += f" - {tranche}: {total_loans} loans, Total Amount: {total_amount}, Avg Risk Score: {avg_risk_score:.2f}\n"
-    return summary
-
-
-def analyze_macro_impact(selected_loans_per_tranche, loan_data):
-    """Analyze macroeconomic impact on selected tranches."""
-    if selected_loans_per_tranche is None  or loan_data is None:
+
+    tranche_names = list(selected_loans_per_tranche.keys())
+    wanted = ["LoanAmount", "RiskScore", "InterestRate", "TotalDebtToIncomeRatio", "ApplicationYear"]
+    if tranche_names:
+        frames = [loans[[c for c in wanted if c in loans.columns]] for loans in selected_loans_per_tranche.values()]
+        combined = pd.concat(frames, keys=tranche_names, names=["Tranche", None]).reset_index(level="Tranche")
+        combined = combined.reindex(columns=["Tranche"] + wanted)
+    else:
+        combined = pd.DataFrame(columns=["Tranche"] + wanted)
+
+    aggregations = {
+        "loan_count": ("LoanAmount", "size"),
+        "total_amount": ("LoanAmount", "sum"),
+        "avg_risk_score": ("RiskScore", "mean"),
+    }
+    if macro_data is not None:
+        macro = _macro_by_year(macro_data)
+        combined = combined.join(macro, on="ApplicationYear")
+        combined["InterestImpact"] = (combined["LoanAmount"] * (combined["InterestRate"] / combined["interest_rate"])).replace([np.inf, -np.inf], np.nan)
+        combined["InflationImpact"] = combined["TotalDebtToIncomeRatio"] * (combined["InflationRate"] / 100)
+        aggregations["avg_interest_impact"] = ("InterestImpact", "mean")
+        aggregations["avg_inflation_impact"] = ("InflationImpact", "mean")
+
+    stats = combined.groupby("Tranche", sort=False).agg(**aggregations)
+    stats = stats.reindex(tranche_names)
+    stats["loan_count"] = stats["loan_count"].fillna(0).astype(int)
+    stats["total_amount"] = stats["total_amount"].fillna(0)
+    return stats
+
+
+def _stat_value(value):
+    """Convert a numpy/pandas scalar to a JSON-friendly Python value (NaN becomes None)."""
+    if pd.isna(value):
         return None
-    summary = "Macroeconomic Impact on Tranches:\n"
-    for tranche, loans in selected_loans_per_tranche.items():
+    return value.item() if hasattr(value, "item") else value
+
+
+def summarize_tranche_allocation(selected_loans_per_tranche, criterion, suboption, stats=None):
+    """Summarize the tranche allocation as structured statistics.
 
-        if loans.empty:
-            summary += f" - {tranche}: No loans in this tranche.\n"
+    Args:
+        selected_loans_per_tranche: Mapping of tranche name to its selected loans
+        criterion: Pooling criterion chosen by the investor
+        suboption: Pooling suboption chosen by the investor
+        stats: Precomputed result of compute_tranche_statistics (computed if omitted)
+
+    Returns:
+        dict: criterion, suboption and per-tranche loan_count, total_amount and
+            avg_risk_score, or None if there is no allocation
+    """
+    if selected_loans_per_tranche is None:
+        return None
+    if stats is None:
+        stats = compute_tranche_statistics(selected_loans_per_tranche)
+    return {
+        "criterion": criterion,
+        "suboption": suboption,
+        "tranches": [
+            {
+                "tranche": row.Index,
+                "loan_count": _stat_value(row.loan_count),
+                "total_amount": _stat_value(row.total_amount),
+                "avg_risk_score": _stat_value(row.avg_risk_score),
+            }
+            for row in stats.itertuples()
+        ],
+    }
+
+
+def analyze_macro_impact(selected_loans_per_tranche, macro_data, stats=None):
+    """Analyze macroeconomic impact on selected tranches as structured statistics.
+
+    Args:
+        selected_loans_per_tranche: Mapping of tranche name to its selected loans
+        macro_data: Yearly macro indicators, or the loan data returned by process_loan_data
+        stats: Precomputed result of compute_tranche_statistics with macro data (computed if omitted)
+
+    Returns:
+        dict: Per-tranche loan_count, avg_interest_impact and avg_inflation_impact,
+            or None if there is no allocation or macro data
+    """
+    if selected_loans_per_tranche is None or macro_data is None:
+        return None
+    if stats is None or "avg_interest_impact" not in stats.columns:
+        stats = compute_tranche_statistics(selected_loans_per_tranche, macro_data)
+    return {
+        "tranches": [
+            {
+                "tranche": row.Index,
+                "loan_count": _stat_value(row.loan_count),
+                "avg_interest_impact": _stat_value(row.avg_interest_impact),
+                "avg_inflation_impact": _stat_value(row.avg_inflation_impact),
+            }
+            for row in stats.itertuples()
+        ],
+    }
+
+
+def format_tranche_summary(summary):
+    """Render the structured tranche allocation summary as report text."""
+    if summary is None:
+        return None
+    text = f"Investor selected loans based on '{summary['criterion']}' with suboption '{summary['suboption']}'.\nTranche Allocation Summary:\n"
+    for item in summary["tranches"]:
+        avg_risk_score = item["avg_risk_score"] or 0
+        text += f" - {item['tranche']}: {item['loan_count']} loans, Total Amount: {item['total_amount']}, Avg Risk Score: {avg_risk_score:.2f}\n"
+    return text
+
+
+def format_macro_impact(impact):
+    """Render the structured macroeconomic impact summary as report text."""
+    if impact is None:
+        return None
+    text = "Macroeconomic Impact on Tranches:\n"
+    for item in impact["tranches"]:
+        if not item["loan_count"]:
+            text += f" - {item['tranche']}: No loans in this tranche.\n"
             continue
-        loans["InterestImpact"] = loans["LoanAmount"] * (loans["InterestRate"] / loan_data["interest_rate"])
-        logging.info(f"LoanAmount: {loans['LoanAmount']}")
-        logging.info(f"InterestRate: {loans['InterestRate']}")
-        logging.info(f"interest_rate: {loan_data['interest_rate']}")
-        loans["InflationImpact"] = loans["TotalDebtToIncomeRatio"] * (loans["InflationRate"] / 100)
-        summary += f" - {tranche}: Avg Interest Impact: {loans['InterestImpact'].mean()}, Avg Inflation Impact: {loans['InflationImpact'].mean()}\n"
-    return summary
+        text += f" - {item['tranche']}: Avg Interest Impact: {item['avg_interest_impact']}, Avg Inflation Impact: {item['avg_inflation_impact']}\n"
+    return text
 
 
 def generate_ai_report(tranche_summary, macro_impact_summary):
-    """Generate AI-powered report using Google Gemini AI."""
-
-    if not GENAI_API_KEY:
-        logging.error("Google Gemini API Key is missing. Cannot generate AI report.")
-        return "AI Report generation failed due to missing API key."
-    if tranche_summary is None or macro_impact_summary is None:
-        return "No loans available under this category"
-
-    genai.configure(api_key=GENAI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    prompt = f"""
-    Imagine yourself as a bank manager and generate a structured loan securitization report:
-    {tranche_summary}
-    {macro_impact_summary}
-    Just have the following sections:
-    Securitization Type,Underlying Assets,Investor Selection Criteria,
-    I. Tranche Allocation Summary
-    II. Macroeconomic Impact Analysis
-    III.  Discussion of Findings
-    IV. Conclusion
-    V. Disclaimer
-    Also explain the financial terms used in the report in a structured manner.
-    """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        logging.error(f"Error generating AI report: {e}")
-        return "AI Report generation failed."
+    """Generate AI-powered report using the configured report backend (Google Gemini by default).
 
+    Accepts either the structured summaries or their pre-rendered text.
+    """
+    if isinstance(tranche_summary, dict):
+        tranche_summary = format_tranche_summary(tranche_summary)
+    if isinstance(macro_impact_summary, dict):
+        macro_impact_summary = format_macro_impact(macro_impact_summary)
+    return generate_report(tranche_summary, macro_impact_summary)
@@ -0,0 +1,181 @@
+"""Synthetic loan generator.
+
+Produces realistic loans matching the `Loan` model at any scale, for load
+testing and scale benchmarks of allocation and risk scoring. Generation is
+fully vectorized with NumPy and reproducible: the same seed and chunk size
+always give the same loans.
+
+Rows are driven by a latent creditworthiness factor, so the usual
+relationships hold: higher credit scores come with higher incomes, lower
+debt-to-income ratios, lower utilization, fewer defaults and lower risk
+scores. Columns follow the Kaggle "Financial Risk for Loan Approval" order
+(the data the risk model was trained on); ratios use the Loan model's
+integer-percent convention.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Column order of the Kaggle dataset
+KAGGLE_COLUMNS = [
+    "ApplicationDate", "Age", "AnnualIncome", "CreditScore", "EmploymentStatus", "EducationLevel",
+    "Experience", "LoanAmount", "LoanDuration", "MaritalStatus", "NumberOfDependents",
+    "HomeOwnershipStatus", "MonthlyDebtPayments", "CreditCardUtilizationRate", "NumberOfOpenCreditLines",
+    "NumberOfCreditInquiries", "DebtToIncomeRatio", "BankruptcyHistory", "LoanPurpose",
+    "PreviousLoanDefaults", "PaymentHistory", "LengthOfCreditHistory", "SavingsAccountBalance",
+    "CheckingAccountBalance", "TotalAssets", "TotalLiabilities", "MonthlyIncome",
+    "UtilityBillsPaymentHistory", "JobTenure", "NetWorth", "BaseInterestRate", "InterestRate",
+    "MonthlyLoanPayment", "TotalDebtToIncomeRatio", "LoanApproved", "RiskScore",
+]
+
+# Category mixes: (values, probabilities)
+EMPLOYMENT_STATUS = (["Employed", "Self-Employed", "Unemployed"], [0.76, 0.15, 0.09])
+EDUCATION_LEVEL = (["High School", "Associate", "Bachelor", "Master", "Doctorate"], [0.30, 0.20, 0.30, 0.15, 0.05])
+MARITAL_STATUS = (["Married", "Single", "Divorced", "Widowed"], [0.50, 0.30, 0.15, 0.05])
+HOME_OWNERSHIP = (["Mortgage", "Rent", "Own", "Other"], [0.40, 0.35, 0.20, 0.05])
+LOAN_PURPOSE = (["Home", "Debt Consolidation", "Auto", "Education", "Other"], [0.25, 0.30, 0.20, 0.10, 0.15])
+LOAN_DURATIONS = ([12, 24, 36, 48, 60, 72, 84, 96, 108, 120], [0.10, 0.15, 0.25, 0.15, 0.15, 0.07, 0.05, 0.03, 0.03, 0.02])
+EDUCATION_INCOME_PREMIUM = np.array([0.0, 0.08, 0.20, 0.32, 0.45])
+
+START_DATE = np.datetime64("2018-01-01")
+END_DATE = np.datetime64("2024-12-31")
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _choice(rng, options, size):
+    values, probabilities = options
+    return rng.choice(np.array(values, dtype=object), size=size, p=probabilities)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def generate_chunk(rng: np.random.Generator, size: int) -> pd.DataFrame:
+    """Generate `size` loans with the given random generator.
+
+    Returns:
+        pd.DataFrame: Loans with KAGGLE_COLUMNS, typed as in the Loan model
+    """
+    z = rng.standard_normal(size)  # latent creditworthiness
+
+    age = np.clip(rng.normal(41, 12, size), 18, 80).astype(np.int64)
+    experience = np.clip(age - 18 - rng.integers(0, 6, size), 0, None)
+    education_index = rng.choice(len(EDUCATION_LEVEL[0]), size=size, p=EDUCATION_LEVEL[1])
+    education = np.array(EDUCATION_LEVEL[0], dtype=object)[education_index]
+    employment = _choice(rng, EMPLOYMENT_STATUS, size)
+    unemployed = employment == "Unemployed"
+
+    log_income = (np.log(52_000) + 0.25 * z + EDUCATION_INCOME_PREMIUM[education_index]
+                  + 0.008 * experience + rng.normal(0, 0.35, size))
+    annual_income = np.exp(log_income) * np.where(unemployed, 0.35, 1.0)
+    annual_income = np.clip(annual_income, 12_000, 600_000).astype(np.int64)
+    monthly_income = np.maximum(annual_income // 12, 1)
+
+    credit_score = np.clip(np.rint(680 + 55 * z + rng.normal(0, 25, size)), 300, 850).astype(np.int64)
+    credit_history = np.clip(np.minimum(age - 18, rng.integers(1, 31, size)), 1, None)
+    open_lines = rng.poisson(3 + 0.5 * np.clip(z, -2, 2) + 0.02 * credit_history)
+    inquiries = rng.poisson(np.clip(1.0 - 0.4 * z, 0.1, None))
+    utilization = np.clip(0.30 - 0.12 * z + rng.normal(0, 0.12, size), 0.0, 1.0).round(4)
+    bankruptcy = (rng.random(size) < _sigmoid(-3.6 - 1.2 * z)).astype(np.int64)
+    defaults = (rng.random(size) < _sigmoid(-2.6 - 1.0 * z)).astype(np.int64)
+    payment_history = np.clip(rng.poisson(24 + 3 * np.clip(z, -3, 3)), 0, None)
+    utility_history = np.clip(0.85 + 0.08 * z + rng.normal(0, 0.06, size), 0.0, 1.0).round(4)
+
+    loan_amount = np.clip(annual_income * np.exp(rng.normal(np.log(0.30), 0.5, size)), 1_000, 400_000)
+    loan_amount = (np.rint(loan_amount / 100) * 100).astype(np.int64)
+    duration = rng.choice(np.array(LOAN_DURATIONS[0]), size=size, p=LOAN_DURATIONS[1])
+
+    base_rate = np.clip(0.03 + 0.22 * (850 - credit_score) / 550 + rng.normal(0, 0.01, size), 0.02, 0.35)
+    interest_rate = np.clip(base_rate + 0.0005 * duration + 0.01 * defaults, 0.02, 0.40)
+    monthly_rate = interest_rate / 12
+    monthly_payment = loan_amount * monthly_rate / (1 - (1 + monthly_rate) ** (-duration))
+
+    monthly_debt = monthly_income * np.clip(0.12 - 0.04 * z + rng.normal(0, 0.04, size), 0.0, 0.9)
+    dti = np.clip(np.rint(monthly_debt / monthly_income * 100), 0, 100).astype(np.int64)
+    total_dti = np.clip(np.rint((monthly_debt + monthly_payment) / monthly_income * 100), 0, 200).astype(np.int64)
+
+    savings = (annual_income * np.exp(rng.normal(np.log(0.10), 0.8, size) + 0.2 * z)).astype(np.int64)
+    checking = (annual_income * np.exp(rng.normal(np.log(0.04), 0.7, size))).astype(np.int64)
+    total_assets = (savings + checking + annual_income * np.exp(rng.normal(np.log(1.2), 0.7, size) + 0.1 * z)).astype(np.int64)
+    total_liabilities = (loan_amount + annual_income * np.exp(rng.normal(np.log(0.4), 0.8, size) - 0.2 * z)).astype(np.int64)
+    net_worth = np.maximum(total_assets - total_liabilities, 0)
+    job_tenure = np.where(unemployed, 0, np.minimum(experience, rng.poisson(5, size)))
+
+    marital = _choice(rng, MARITAL_STATUS, size)
+    dependents = np.clip(rng.poisson(np.where(marital == "Married", 1.6, 0.6)), 0, 6)
+    home = _choice(rng, HOME_OWNERSHIP, size)
+    purpose = _choice(rng, LOAN_PURPOSE, size)
+
+    days = int((END_DATE - START_DATE) / np.timedelta64(1, "D")) + 1
+    application_date = (START_DATE + rng.integers(0, days, size).astype("timedelta64[D]")).astype(str)
+
+    risk_score = np.clip(np.rint(
+        50 - 9 * z + 0.15 * (total_dti - 35) + 8 * bankruptcy + 6 * defaults
+        + 10 * utilization + 4 * unemployed + rng.normal(0, 3, size)
+    ), 0, 100).astype(np.int64)
+    approved = ((risk_score < 50) & (total_dti < 60) & (bankruptcy == 0)).astype(np.int64)
+
+    frame = pd.DataFrame({
+        "ApplicationDate": application_date,
+        "Age": age,
+        "AnnualIncome": annual_income,
+        "CreditScore": credit_score,
+        "EmploymentStatus": employment,
+        "EducationLevel": education,
+        "Experience": experience,
+        "LoanAmount": loan_amount,
+        "LoanDuration": duration,
+        "MaritalStatus": marital,
+        "NumberOfDependents": dependents,
+        "HomeOwnershipStatus": home,
+        "MonthlyDebtPayments": np.rint(monthly_debt).astype(np.int64),
+        "CreditCardUtilizationRate": utilization,
+        "NumberOfOpenCreditLines": open_lines,
+        "NumberOfCreditInquiries": inquiries,
+        "DebtToIncomeRatio": dti,
+        "BankruptcyHistory": bankruptcy,
+        "LoanPurpose": purpose,
+        "PreviousLoanDefaults": defaults,
+        "PaymentHistory": payment_history,
+        "LengthOfCreditHistory": credit_history,
+        "SavingsAccountBalance": savings,
+        "CheckingAccountBalance": checking,
+        "TotalAssets": total_assets,
+        "TotalLiabilities": total_liabilities,
+        "MonthlyIncome": monthly_income,
+        "UtilityBillsPaymentHistory": utility_history,
+        "JobTenure": job_tenure,
+        "NetWorth": net_worth,
+        "BaseInterestRate": base_rate.round(4),
+        "InterestRate": interest_rate.round(4),
+        "MonthlyLoanPayment": np.rint(monthly_payment).astype(np.int64),
+        "TotalDebtToIncomeRatio": total_dti,
+        "LoanApproved": approved,
+        "RiskScore": risk_score,
+    })
+    return frame[KAGGLE_COLUMNS]
+
+
+def generate_loans(rows: int, seed: int = 42, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield synthetic loans as DataFrames of at most chunk_size rows.
+
+    Each chunk has its own generator derived from (seed, chunk index), so chunks
+    are independent and the output for a given seed and chunk size is fixed.
+
+    Args:
+        rows: Total number of loans
+        seed: Random seed
+        chunk_size: Rows per DataFrame
+
+    Yields:
+        pd.DataFrame: Loans with KAGGLE_COLUMNS
+    """
+    for index, start in enumerate(range(0, rows, chunk_size)):
+        rng = np.random.default_rng([seed, index])
+        yield generate_chunk(rng, min(chunk_size, rows - start))
+
+
+def generate_loan_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Generate all loans in one DataFrame (convenient for in-memory benchmarks)."""
+    return pd.concat(list(generate_loans(rows, seed)), ignore_index=True)
@@ -1,11 +1,12 @@
 """Loan Data Models for Loan Management System.
 
 This module contains Pydantic models for loan data validation and serialization,
-including database storage format (Loan) and API input validation (LoanInput).
+including database storage format (Loan), API input validation (LoanInput)
+and the request bodies of the bulk update and delete endpoints.
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, create_model, field_validator
+from typing import Any, Dict, List, Optional
 from bson import ObjectId
 
 class PyObjectId(str):
@@ -158,4 +159,65 @@ class LoanInput(BaseModel):
                 "BankruptcyHistory": 0,
                 "EmploymentStatus": "Employed"
             }
-        }
\ No newline at end of file
+        }
+
+def _reject_null(cls, value, info: ValidationInfo):
+    """Refuse an explicit null for a field every loan must have."""
+    if value is None:
+        raise ValueError(f"{info.field_name} is required on a loan and cannot be null")
+    return value
+
+# Partial loan update: every Loan field, made optional; only the fields that are
+# set are written. Unknown fields are rejected so a typo cannot silently add a new
+# attribute to thousands of loans, and fields required on Loan cannot be set to null.
+LoanPatch = create_model(
+    "LoanPatch",
+    __config__=ConfigDict(extra="forbid", json_schema_extra={"example": {"RiskScore": 40, "LoanApproved": 1}}),
+    __doc__="Partial loan update: only the fields that are set are written.",
+    __validators__={
+        "reject_null": field_validator(
+            *(name for name, field in Loan.model_fields.items() if field.is_required()), mode="after"
+        )(_reject_null),
+    },
+    **{
+        name: (Optional[field.annotation], None)
+        for name, field in Loan.model_fields.items()
+        if name != "id"
+    },
+)
+
+class LoanBulkUpdateItem(BaseModel):
+    """One patch applied to a set of loans selected by ids and/or a filter.
+
+    The filter maps loan fields to a value (equality) or to an operator object,
+    e.g. {"CreditScore": {"gte": 700}, "EmploymentStatus": "Employed"}.
+    """
+    ids: Optional[List[str]] = None
+    filter: Optional[Dict[str, Any]] = None
+    patch: LoanPatch
+
+class LoanBulkUpdate(BaseModel):
+    """Request body for bulk loan updates."""
+    updates: List[LoanBulkUpdateItem]
+
+    class Config:
+        """Pydantic model configuration."""
+        json_schema_extra = {
+            "example": {
+                "updates": [
+                    {"ids": ["65ff3d7f36e9f8a7a2d3a1b1"], "patch": {"RiskScore": 40}},
+                    {"filter": {"CreditScore": {"lt": 500}}, "patch": {"LoanApproved": 0}}
+                ]
+            }
+        }
+
+class LoanBulkDelete(BaseModel):
+    """Request body for bulk loan deletion: loan ids and/or a filter."""
+    ids: Optional[List[str]] = None
+    filter: Optional[Dict[str, Any]] = None
+
+    class Config:
+        """Pydantic model configuration."""
+        json_schema_extra = {
+            "example": {"ids": ["65ff3d7f36e9f8a7a2d3a1b1", "65ff3d7f36e9f8a7a2d3a1b2"]}
+        }
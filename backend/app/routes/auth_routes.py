@@ -8,32 +8,46 @@ This module contains FastAPI routes for user authentication including:
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
 from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 import logging
 from app.models.user import User
-from app.config.database import get_database
-from app.services.email_service import send_verification_email
+from app.config.database import get_async_database
+from app.services.email_service import verification_email
+from app.services.email_outbox import enqueue_email
+from app.services.executor import ExecutorSaturated
 from app.services.auth_service import (
     create_access_token,
-    verify_password,
+    verify_and_update,
     get_password_hash,
-    verify_token
+    verify_token,
+    password_pool
 )
+from app.services.current_user import invalidate_user
 
 # Initialize FastAPI router
 router = APIRouter(tags=["Authentication"])
 
-# Database connection setup
-db = get_database()
+# Database connection setup (Motor, so queries don't block the event loop)
+db = get_async_database()
 user_collection = db["users"]
 
-# OAuth2 authentication scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Seconds clients are asked to wait when the password pool is full
+PASSWORD_RETRY_AFTER_SECONDS = 1
+
+
+def password_pool_busy(e: ExecutorSaturated) -> HTTPException:
+    """429 response for a full password hashing pool."""
+    logging.warning(str(e))
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many authentication requests, please retry shortly.",
+        headers={"Retry-After": str(PASSWORD_RETRY_AFTER_SECONDS)},
+    )
 
 @router.get("/test-db", summary="Test database connection")
-def test_db() -> dict:
+async def test_db() -> dict:
     """Test database connectivity by counting user documents.
     
     Returns:
@@ -46,13 +60,13 @@ def test_db() -> dict:
         {"message": "Database connection successful. Users count: 5"}
     """
     try:
-        count = user_collection.count_documents({})
+        count = await user_collection.count_documents({})
         return {"message": f"Database connection successful. Users count: {count}"}
     except Exception as e:
         return {"error": str(e)}
 
 @router.post("/register", status_code=status.HTTP_201_CREATED, summary="Register new user")
-def register(user: User) -> dict:
+async def register(user: User) -> dict:
     """Register a new user with email verification.
     
     Args:
@@ -64,39 +78,45 @@ def register(user: User) -> dict:
     Raises:
         HTTPException: 
             - 400 if email already registered
+            - 429 if the password hashing pool is full
             - 500 if registration fails
             
     Flow:
         1. Hashes password
         2. Generates verification token
         3. Stores user in database
-        4. Sends verification email
-        5. Rolls back on email failure
+        4. Queues the verification email in the outbox (sent in the background)
+        5. Rolls back if the email cannot be queued
     """
     try:
         user_dict = user.dict(by_alias=True, exclude={"id"})
-        user_dict["password"] = get_password_hash(user_dict["password"])
+        # bcrypt is CPU-bound; hash in the password pool
+        user_dict["password"] = await password_pool.run(get_password_hash, user_dict["password"])
         user_dict["verification_token"] = create_access_token(data={"sub": user_dict["email"]})
 
-        result = user_collection.insert_one(user_dict)
+        result = await user_collection.insert_one(user_dict)
 
         if result.inserted_id:
             try:
-                send_verification_email(user_dict["email"], user_dict["verification_token"])
+                subject, body = verification_email(user_dict["verification_token"])
+                await enqueue_email(db, user_dict["email"], subject, body,
+                                    dedupe_key=f"verification:{result.inserted_id}")
                 return {"message": "User registered successfully. Please check your email to verify your account."}
             except Exception as e:
-                user_collection.delete_one({"_id": result.inserted_id})
-                logging.error(f"Failed to send verification email: {str(e)}")
+                await user_collection.delete_one({"_id": result.inserted_id})
+                logging.error(f"Failed to queue verification email: {str(e)}")
                 raise HTTPException(status_code=500, detail="User registration failed due to email error")
 
     except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Email already registered")
+    except ExecutorSaturated as e:
+        raise password_pool_busy(e)
     except Exception as e:
         logging.error(f"Error registering user: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.post("/login", summary="Authenticate user")
-def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
+async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
     """Authenticate user and return JWT access token.
     
     Args:
@@ -113,12 +133,27 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
         HTTPException:
             - 400 for invalid credentials
             - 400 for unverified email
+            - 429 if the password hashing pool is full
+
+    A hash made with another bcrypt cost is replaced by a rehash of the password.
     """
-    user = user_collection.find_one({"email": form_data.username})
+    user = await user_collection.find_one({"email": form_data.username})
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
 
-    if not user or not verify_password(form_data.password, user["password"]):
+    try:
+        verified, new_hash = await password_pool.run(verify_and_update, form_data.password, user["password"])
+    except ExecutorSaturated as e:
+        raise password_pool_busy(e)
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
+    if new_hash:
+        # Conditional on the old hash so a concurrent password change is not overwritten
+        await user_collection.update_one(
+            {"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}}
+        )
+
     if not user.get("is_verified", False):
         raise HTTPException(status_code=400, detail="Email not verified")
 
@@ -134,7 +169,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
     }
 
 @router.get("/verify-email", summary="Verify email address")
-def verify_email(token: str) -> dict:
+async def verify_email(token: str) -> dict:
     """Verify user's email using JWT verification token.
     
     Args:
@@ -153,7 +188,7 @@ def verify_email(token: str) -> dict:
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    user = user_collection.find_one({"email": email})
+    user = await user_collection.find_one({"email": email})
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -161,7 +196,8 @@ def verify_email(token: str) -> dict:
     if user.get("is_verified", False):
         return {"message": "Email already verified"}
 
-    result = user_collection.update_one({"email": email}, {"$set": {"is_verified": True}})
+    result = await user_collection.update_one({"email": email}, {"$set": {"is_verified": True}})
+    invalidate_user(email=email)
 
     if result.modified_count == 1:
         return {"message": "Email verified successfully"}
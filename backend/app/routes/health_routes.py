@@ -0,0 +1,120 @@
+"""Health and readiness API Routes.
+
+This module contains FastAPI routes used by load balancers and operators:
+- Liveness check
+- Readiness check that pings MongoDB
+- Connection pool settings and statistics for pool sizing
+- Allocation and password process pool queue depth
+- Delivery reports of recent macro alerts and the CPI check's state and run timings
+- Anomaly engine state per indicator and recent anomalies
+"""
+
+import time
+import logging
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from app.config.database import get_async_database, get_pool_settings, pool_stats
+from app.services.allocation_worker import allocation_pool
+from app.services.auth_service import password_pool
+from app.services.alert_fanout import recent_alerts
+from app.services.notifications import CPI_STATE_COLLECTION, CPI_STATE_ID
+from app.services.anomaly import EVENTS_COLLECTION, STATE_COLLECTION
+
+router = APIRouter(tags=["Health"])
+
+
+@router.get("/live", summary="Liveness check")
+async def live() -> dict:
+    """Report that the process is up and serving requests.
+
+    Returns:
+        dict: {"status": "ok"}
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready", summary="Readiness check")
+async def ready():
+    """Report whether the service can reach MongoDB.
+
+    Pings the database through the same async client used by the routes, so the
+    check also exercises the connection pool.
+
+    Returns:
+        JSONResponse: 200 with ping latency when MongoDB answers, 503 otherwise
+    """
+    start = time.perf_counter()
+    try:
+        await get_async_database().client.admin.command("ping")
+    except Exception as e:
+        logging.error(f"Readiness check failed: {str(e)}")
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": str(e)})
+
+    return {"status": "ready", "database_ping_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+@router.get("/pool", summary="Connection pool statistics")
+async def pool() -> dict:
+    """Return the connection pool settings and live statistics of this process.
+
+    Returns:
+        dict: Dictionary containing:
+            - settings: Effective pool configuration
+            - clients: Statistics for the sync and async clients (checked out,
+              checkout wait times, connection churn)
+    """
+    return {
+        "settings": get_pool_settings(),
+        "clients": {name: listener.snapshot() for name, listener in pool_stats.items()},
+    }
+
+
+@router.get("/executors", summary="Process pool statistics")
+async def executors() -> dict:
+    """Return the size and current queue depth of the CPU-bound process pools.
+
+    Returns:
+        dict: Statistics keyed by pool name
+    """
+    return {pool.name: pool.stats() for pool in (allocation_pool, password_pool)}
+
+
+@router.get("/alerts", summary="Macro alert delivery reports")
+async def alerts(limit: int = Query(10, ge=1, le=100)) -> dict:
+    """Return the delivery reports of the latest macro alerts, newest first.
+
+    Returns:
+        dict: alerts, each with recipients, batches, sent and failed counts,
+            delivery_seconds and throughput_per_second (once finished)
+    """
+    return {"alerts": await recent_alerts(get_async_database(), limit)}
+
+
+@router.get("/cpi", summary="CPI check state and run timings")
+async def cpi_check() -> dict:
+    """Return the CPI check's last observation and its recent runs (outcome and timings).
+
+    Returns:
+        dict: last_date, last_value, previous_value, percentage_change, last_fetch_at
+            and runs (newest last); empty before the first run
+    """
+    state = await get_async_database()[CPI_STATE_COLLECTION].find_one(
+        {"_id": CPI_STATE_ID}, {"_id": 0, "etag": 0, "last_modified": 0, "content_hash": 0}
+    )
+    return state or {}
+
+
+@router.get("/anomalies", summary="Anomaly engine state and recent anomalies")
+async def anomalies(limit: int = Query(20, ge=1, le=200)) -> dict:
+    """Return each indicator's rolling statistics and the latest anomalies, newest first.
+
+    Returns:
+        dict: indicators (count, mean, std, last_date, last_value) and events
+    """
+    db = get_async_database()
+    indicators = {}
+    async for state in db[STATE_COLLECTION].find({}):
+        name = state.pop("_id")
+        indicators[name] = {**state, "std": state.get("var", 0) ** 0.5}
+    events = await db[EVENTS_COLLECTION].find({}, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return {"indicators": indicators, "events": events}
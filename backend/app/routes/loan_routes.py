@@ -1,13 +1,44 @@
 """Loan Management API Routes.
 
 This module contains FastAPI routes for CRUD operations on loan records,
-including creation, retrieval, updating, and deletion of loan data.
+including creation, retrieval, updating, and deletion of loan data,
+streaming bulk ingestion of NDJSON or CSV loan tapes, bulk updates and
+deletes, keyset-paginated listing and streaming export of loans, and a
+change feed. Loan writes maintain a version (exposed as an ETag for If-Match
+conditional updates), updated_at and a collection-wide change_seq.
 """
 
 import logging
-from fastapi import APIRouter, HTTPException
-from app.models.loan import Loan, LoanInput
-from app.config.database import get_database
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.models.loan import Loan, LoanInput, LoanBulkUpdate, LoanBulkDelete
+from app.services import loan_events
+from app.services.loan_ingest import LoanIngestError, ingest_loans, resolve_format
+from app.services.loan_bulk import bulk_update_loans, bulk_delete_loans
+from app.services.loan_reservations import release_deleted_loans
+from app.services.loan_query import LoanQueryError, build_range_filter, build_projection, parse_cursor
+from app.services.loan_export import (
+    EXPORT_FORMATS,
+    LOAN_PAGE_DEFAULT_LIMIT,
+    LOAN_PAGE_MAX_LIMIT,
+    list_loans_page,
+    stream_export,
+)
+from app.services.loan_versioning import (
+    LoanVersionError,
+    fetch_changes,
+    make_etag,
+    parse_if_match,
+    record_tombstones,
+    reserve_change_seqs,
+    stamp_new_loan,
+    version_condition,
+    versioned_update,
+)
+from app.config.database import get_async_database
+from app.services.current_user import get_current_user
+from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
 from bson import ObjectId, errors
 
@@ -15,10 +46,10 @@ from bson import ObjectId, errors
 logging.basicConfig(level=logging.INFO)
 
 # Initialize FastAPI router
-router = APIRouter(tags=["Loan Management"])
+router = APIRouter(tags=["Loan Management"], dependencies=[Depends(get_current_user)])
 
-# Database connection setup
-db = get_database()
+# Database connection setup (Motor, so queries don't block the event loop)
+db = get_async_database()
 loan_collection = db["loans"]
 
 def validate_object_id(loan_id: str) -> ObjectId:
@@ -69,8 +100,10 @@ async def create_loan(loan: LoanInput) -> dict:
     try:
         loan_dict = loan.dict(by_alias=True, exclude={"id"})  # Fix `_id` handling
         logging.info(f" Received Loan Data: {loan_dict}")
+        stamp_new_loan(loan_dict, await reserve_change_seqs(db))
 
-        result = loan_collection.insert_one(loan_dict)
+        result = await loan_collection.insert_one(loan_dict)
+        loan_events.publish("insert", 1, [str(result.inserted_id)])
         return {"id": str(result.inserted_id)}
 
     except DuplicateKeyError as e:
@@ -82,12 +115,190 @@ async def create_loan(loan: LoanInput) -> dict:
         logging.error(f"Error creating loan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@router.post("/loans/bulk", summary="Bulk-ingest loans from NDJSON or CSV")
+async def bulk_ingest_loans(request: Request, format: Optional[str] = None) -> dict:
+    """Insert many loans from a streamed NDJSON or CSV request body.
+
+    The body is read incrementally, validated in columnar batches and inserted
+    with unordered bulk writes. Invalid rows are skipped and reported; they do not
+    stop the rest of the upload.
+
+    Args:
+        request: Incoming request whose body holds one loan per line (NDJSON) or a
+            CSV file with a header row
+        format: "ndjson" or "csv"; defaults to the Content-Type (NDJSON if unknown)
+
+    Returns:
+        dict: Ingestion report with received/inserted/failed counts, per-line
+            errors and throughput
+
+    Raises:
+        HTTPException:
+            - 400 for an unsupported format or an incomplete CSV header
+    """
+    try:
+        fmt = resolve_format(format, request.headers.get("content-type"))
+        report = await ingest_loans(loan_collection, request.stream(), fmt)
+    except LoanIngestError as e:
+        logging.warning(f"Bulk ingest rejected: {e.message}")
+        raise HTTPException(status_code=400, detail=e.message)
+
+    loan_events.publish("insert", report["inserted"])
+    return report
+
+@router.patch("/loans/bulk", summary="Bulk-update loans")
+async def bulk_update(request: LoanBulkUpdate) -> dict:
+    """Apply patches to many loans selected by ids and/or filter expressions.
+
+    All updates are sent as unordered bulk writes in chunks, and one change
+    notification is published for the whole request.
+
+    Args:
+        request: LoanBulkUpdate with a list of {ids, filter, patch} updates
+
+    Returns:
+        dict: matched, modified and failed counts with per-update errors
+
+    Raises:
+        HTTPException:
+            - 400 for an update without ids or filter, an invalid filter or an empty patch
+    """
+    try:
+        return await bulk_update_loans(loan_collection, request.updates)
+    except LoanQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/loans/bulk/delete", summary="Bulk-delete loans")
+async def bulk_delete(request: LoanBulkDelete) -> dict:
+    """Delete many loans selected by ids and/or a filter expression.
+
+    Args:
+        request: LoanBulkDelete with ids and/or filter
+
+    Returns:
+        dict: deleted and failed counts with per-id errors
+
+    Raises:
+        HTTPException:
+            - 400 when neither ids nor a non-empty filter is given, or the filter is invalid
+    """
+    try:
+        return await bulk_delete_loans(loan_collection, request.ids, request.filter)
+    except LoanQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/loans", summary="List loans")
+async def list_loans(
+    request: Request,
+    after: Optional[str] = None,
+    limit: int = Query(LOAN_PAGE_DEFAULT_LIMIT, ge=1, le=LOAN_PAGE_MAX_LIMIT),
+    fields: Optional[str] = None,
+) -> dict:
+    """List loans in `_id` order, one keyset page at a time.
+
+    Range filters are passed as `min_<field>`/`max_<field>` query parameters on
+    any numeric loan field, e.g. `?min_CreditScore=700&max_LoanAmount=20000`.
+
+    Args:
+        request: Incoming request (read for the min_/max_ range parameters)
+        after: next_cursor value from the previous page; omit for the first page
+        limit: Page size
+        fields: Comma-separated loan fields to return (all fields by default)
+
+    Returns:
+        dict: loans on this page and next_cursor (None on the last page)
+
+    Raises:
+        HTTPException:
+            - 400 for an invalid cursor, unknown fields or invalid range filters
+    """
+    try:
+        query = build_range_filter(request.query_params)
+        projection = build_projection(fields)
+        cursor = parse_cursor(after)
+    except LoanQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await list_loans_page(loan_collection, query, projection, cursor, limit)
+
+@router.get("/loans/export", summary="Export loans as NDJSON, CSV or Parquet")
+async def export_loans(request: Request, format: str = "ndjson", fields: Optional[str] = None):
+    """Stream every matching loan as NDJSON, CSV or Parquet.
+
+    The collection is read with one cursor in fixed-size batches and each batch
+    is encoded and sent as soon as it arrives, so memory use does not grow with
+    the number of loans. Accepts the same `fields` and `min_`/`max_` filters as
+    the listing endpoint.
+
+    Args:
+        request: Incoming request (read for the min_/max_ range parameters)
+        format: "ndjson", "csv" or "parquet"
+        fields: Comma-separated loan fields to export (all fields by default)
+
+    Returns:
+        StreamingResponse: The export as an attachment
+
+    Raises:
+        HTTPException:
+            - 400 for an unsupported format, unknown fields, invalid range filters
+              or parquet without pyarrow installed
+    """
+    try:
+        query = build_range_filter(request.query_params)
+        projection = build_projection(fields)
+        body = await stream_export(loan_collection, query, projection, format)
+    except LoanQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="loans.{format}"'},
+    )
+
+@router.get("/loans/changes", summary="Loan change feed")
+async def loan_changes(
+    since: int = Query(0, ge=0),
+    after_id: Optional[str] = None,
+    limit: int = Query(LOAN_PAGE_DEFAULT_LIMIT, ge=1, le=LOAN_PAGE_MAX_LIMIT),
+    fields: Optional[str] = None,
+) -> dict:
+    """Return loans created, updated or deleted after a change feed position.
+
+    Consumers start with since=0 and pass back next_since and next_after_id from
+    each response to fetch the following changes. Deleted loans appear as
+    tombstones with deleted=true. Changes younger than
+    LOAN_CHANGE_FEED_SETTLE_SECONDS are only returned once they settle, so a
+    consumer never skips a write that committed after a later one.
+
+    Args:
+        since: change_seq of the last change already processed
+        after_id: Loan id of the last change already processed (from next_after_id)
+        limit: Maximum number of changes to return
+        fields: Comma-separated loan fields to include for changed loans
+
+    Returns:
+        dict: changes, next_since, next_after_id and has_more
+
+    Raises:
+        HTTPException:
+            - 400 for an invalid after_id or unknown fields
+    """
+    try:
+        projection = build_projection(fields)
+        return await fetch_changes(db, since, after_id, limit, projection)
+    except (LoanQueryError, LoanVersionError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/loans/{loan_id}", summary="Get loan by ID")
-async def read_loan(loan_id: str) -> dict:
+async def read_loan(loan_id: str, response: Response) -> dict:
     """Retrieve a single loan by its ID.
     
+    The response carries the loan's version as its ETag header.
+
     Args:
         loan_id: The ID of the loan to retrieve
+        response: Response used to set the ETag header
         
     Returns:
         dict: Complete loan document with _id as string
@@ -102,62 +313,89 @@ async def read_loan(loan_id: str) -> dict:
         logging.info(f"Reading loan with ID: {loan_id}")
         object_id = validate_object_id(loan_id)  # Validate loan_id before conversion
 
-        loan = loan_collection.find_one({"_id": object_id})
+        loan = await loan_collection.find_one({"_id": object_id})
         if loan:
             logging.info(f"Loan found: {loan}")
+            response.headers["ETag"] = make_etag(loan.get("version"))
             return fix_id(loan)
 
         logging.info(f"Loan with ID: {loan_id} not found")
         raise HTTPException(status_code=404, detail="Loan not found")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error reading loan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @router.put("/loans/{loan_id}", summary="Update loan details")
-async def update_loan(loan_id: str, loan: Loan) -> dict:
+async def update_loan(loan_id: str, loan: Loan, response: Response,
+                      if_match: Optional[str] = Header(default=None)) -> dict:
     """Update an existing loan record.
+
+    The update and the version bump happen atomically in one find_one_and_update.
+    When an If-Match header is sent, the update only applies if the loan is still
+    at that version (ETag from a previous read or update).
     
     Args:
         loan_id: The ID of the loan to update
         loan: Loan object containing updated fields
+        response: Response used to set the new ETag header
+        if_match: Optional ETag the loan must still have
         
     Returns:
-        dict: Success/status message
+        dict: Success message and the loan's new version
         
     Raises:
         HTTPException:
-            - 400 for invalid ID format
+            - 400 for invalid ID format or a malformed If-Match header
             - 404 if loan not found
+            - 412 if the loan has changed since the If-Match version
             - 500 for other server errors
     """
     try:
         logging.info(f"Updating loan with ID: {loan_id}")
 
-        # Validate loan_id before conversion
+        # Validate loan_id and the precondition before touching the database
         object_id = validate_object_id(loan_id)
-
-        # Check if the loan exists before updating
-        existing_loan = loan_collection.find_one({"_id": object_id})
-        if not existing_loan:
-            logging.warning(f"Loan with ID: {loan_id} not found")
-            raise HTTPException(status_code=404, detail="Loan not found")
+        try:
+            expected_version = parse_if_match(if_match)
+        except LoanVersionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         # Convert loan data, excluding unset fields
         updated_loan = loan.dict(exclude_unset=True)
         logging.info(f"Updated loan data: {updated_loan}")
 
-        # Perform the update operation
-        result = loan_collection.update_one({"_id": object_id}, {"$set": updated_loan})
+        query = {"_id": object_id}
+        if expected_version is not None:
+            query.update(version_condition(expected_version))
+
+        # Only a loan that can be updated takes a change number; then apply the
+        # update and bump the version in a single round trip
+        result = None
+        if await loan_collection.count_documents(query, limit=1):
+            result = await loan_collection.find_one_and_update(
+                query,
+                versioned_update(updated_loan, await reserve_change_seqs(db)),
+                projection={"version": 1},
+                return_document=ReturnDocument.AFTER,
+            )
 
-        if result.modified_count > 0:
-            logging.info(f"Loan with ID: {loan_id} updated successfully")
-            return {"msg": "Loan updated successfully"}
+        if result is None:
+            if expected_version is not None and await loan_collection.count_documents({"_id": object_id}, limit=1):
+                logging.info(f"Loan with ID: {loan_id} no longer matches version {expected_version}")
+                raise HTTPException(status_code=412, detail="Loan has been modified since it was read")
+            logging.warning(f"Loan with ID: {loan_id} not found")
+            raise HTTPException(status_code=404, detail="Loan not found")
 
-        # Handle the case where no modifications were made
-        logging.info(f"Loan with ID: {loan_id} exists but no changes were detected")
-        return {"msg": "No changes made to the loan"}
+        logging.info(f"Loan with ID: {loan_id} updated successfully to version {result['version']}")
+        loan_events.publish("update", 1, [loan_id])
+        response.headers["ETag"] = make_etag(result["version"])
+        return {"msg": "Loan updated successfully", "version": result["version"]}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error updating loan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -182,14 +420,19 @@ async def delete_loan(loan_id: str) -> dict:
         logging.info(f"Deleting loan with ID: {loan_id}")
         object_id = validate_object_id(loan_id)  # Validate loan_id before conversion
 
-        result = loan_collection.delete_one({"_id": object_id})
+        result = await loan_collection.delete_one({"_id": object_id})
         if result.deleted_count > 0:
             logging.info(f"Loan with ID: {loan_id} deleted successfully")
+            await record_tombstones(db, [object_id], await reserve_change_seqs(db))
+            await release_deleted_loans(db, [object_id])
+            loan_events.publish("delete", 1, [loan_id])
             return {"msg": "Loan deleted successfully"}
 
         logging.warning(f"Loan with ID: {loan_id} not found")
         raise HTTPException(status_code=404, detail="Loan not found")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error deleting loan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
\ No newline at end of file
@@ -1,18 +1,41 @@
 """FastAPI router for loan tranche allocation and reporting.
 
 This module provides endpoints for allocating loans into different risk tranches
-and generating AI-powered financial reports based on the allocations.
+and generating AI-powered financial reports based on the allocations, either as a
+single JSON response or streamed as Server-Sent Events.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
 import pandas as pd
 from app.config.database import get_database
+from app.services.current_user import get_current_user
 from app.services.pool_service import allocate_tranches
-from app.ml.risk_model import load_ml_risk_scores, get_updated_dataset, get_risk_score
-from app.ml.analysis import generate_ai_report, summarize_tranche_allocation, analyze_macro_impact, process_loan_data
+from app.ml.risk_model import get_updated_dataset, get_risk_score
+from app.services.executor import ExecutorSaturated
+from app.services.loan_reservations import find_unreserved_loans
+from app.services.allocation_worker import (
+    STATIC_TRANCHE_INFO,
+    AllocationError,
+    allocation_pool,
+    score_and_allocate,
+)
+from app.ml.analysis import (
+    summarize_tranche_allocation,
+    analyze_macro_impact,
+    compute_tranche_statistics,
+    format_tranche_summary,
+    format_macro_impact,
+    fetch_macro_indicators,
+    process_loan_data,
+)
+from app.services.report_service import ReportGenerationError, get_report_backend, stream_report, format_sse
+from app.services.report_service import generate_report as render_report
 import logging
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(get_current_user)])
 
 # Get the loan database and its loans collection.
 loan_db = get_database()
@@ -20,12 +43,13 @@ loans_collection = loan_db["loans"]
 MODEL_PKL = 'loan_risk_model.pkl'
 
 @router.post("/allocate")
-def allocate_tranches_endpoint(criterion: str, suboption: str, investor_budget: float):
+async def allocate_tranches_endpoint(criterion: str, suboption: str, investor_budget: float):
     """Allocate loans into tranches based on criteria and budget.
 
     This endpoint takes allocation criteria and investor budget, processes loan data,
     calculates risk scores, and allocates loans into appropriate tranches (Senior,
-    Mezzanine, Subordinated, Equity).
+    Mezzanine, Subordinated, Equity). Scoring and allocation run in the allocation
+    process pool so they do not hold up other requests served by this worker.
 
     Args:
         criterion (str): Primary criterion for loan selection (e.g., 'Risk', 'Return')
@@ -40,88 +64,46 @@ def allocate_tranches_endpoint(criterion: str, suboption: str, investor_budget:
     Raises:
         HTTPException: 404 if no loans found or data is empty
         HTTPException: 500 if risk score prediction fails
+        HTTPException: 503 if the allocation pool is saturated
     """
-    # Fetch all loans from the loans collection.
-    loans = list(loans_collection.find({}))
-    if not loans:
-        raise HTTPException(status_code=404, detail="No loans found in the loan database.")
-
-    # Convert MongoDB records into a pandas DataFrame.
-    df = pd.DataFrame(loans)
-    if df.empty:
-        raise HTTPException(status_code=404, detail="Loan data is empty after conversion.")
-
-    df = df.drop(columns=["investor_id", "status", "tranche_type"], errors='ignore')
-    predictions = load_ml_risk_scores(df)
-    if predictions is None:
-        raise HTTPException(status_code=500, detail="Risk score predictions failed.")
-    df = get_updated_dataset(df, predictions)
-
-    logging.info(f"DataFrame columns after update: {df.columns.tolist()}")
-    tranches = allocate_tranches(df, criterion, suboption, investor_budget)
-    if tranches is None or all(tranche_df.empty for tranche_df in tranches.values()):
+    try:
+        tranches = await allocation_pool.run(score_and_allocate, criterion, suboption, investor_budget)
+    except ExecutorSaturated as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=503, detail="Allocation service is busy, please retry shortly.")
+    except AllocationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if not tranches:
         return {
             "message": "No loans available for the selected criteria and budget.",
             "tranche_details": []
         }
 
-    # Define static tranche information.
-    static_tranche_info = {
-        "Senior Tranche": {
-            "Risk": "Lowest Risk",
-            "Return": "Lowest Return",
-            "Payment Priority": "First to be paid"
-        },
-        "Mezzanine Tranche": {
-            "Risk": "Moderate Risk",
-            "Return": "Moderate Return",
-            "Payment Priority": "Paid after senior tranche"
-        },
-        "Subordinated Tranche": {
-            "Risk": "High Risk",
-            "Return": "High Return",
-            "Payment Priority": "Paid after mezzanine"
-        },
-        "Equity Tranche": {
-            "Risk": "Highest Risk",
-            "Return": "Highest Return",
-            "Payment Priority": "Last to be paid (if anything is left)"
-        }
-    }
-    
     tranche_details = []
-    for tranche_key in static_tranche_info.keys():
-        df_tranche = tranches.get(tranche_key, pd.DataFrame())
-        loans_allocated = len(df_tranche) if not df_tranche.empty else 0
-        budget_spent = float(df_tranche['LoanAmount'].sum()) if not df_tranche.empty and 'LoanAmount' in df_tranche.columns else 0.0
-        loan_ids = [str(oid) for oid in df_tranche['_id'].tolist()] if not df_tranche.empty and '_id' in df_tranche.columns else []
-        
-        weighted_risk = (df_tranche['RiskScore'] * df_tranche['LoanAmount']).sum() / df_tranche['LoanAmount'].sum() if not df_tranche.empty and 'RiskScore' in df_tranche.columns and 'LoanAmount' in df_tranche.columns else None
-        
-        info = static_tranche_info[tranche_key]
+    for tranche_key, summary in tranches.items():
+        info = STATIC_TRANCHE_INFO[tranche_key]
         tranche_details.append({
             "tranche_name": tranche_key,
             "risk_category": info["Risk"],
             "return_category": info["Return"],
             "payment_priority": info["Payment Priority"],
-            "loans_allocated": loans_allocated,
-            "budget_spent": budget_spent,
+            "loans_allocated": summary["loans_allocated"],
+            "budget_spent": summary["budget_spent"],
             "investor_budget": investor_budget,
-            "loans": loan_ids,
-            "average_risk": weighted_risk
+            "loans": summary["loans"],
+            "average_risk": summary["average_risk"]
         })
-    
+
     return {
         "message": "Tranches allocated and stored successfully.",
         "tranche_details": tranche_details
     }
 
-@router.get("/generate_report")
-def generate_report(criterion: str, suboption: str, investor_budget: float):
-    """Generate AI-powered financial report for tranche allocations.
+def build_report_summaries(criterion: str, suboption: str, investor_budget: float):
+    """Run the allocation pipeline and summarize it for report generation.
 
-    Creates a comprehensive report analyzing the tranche allocations, including
-    risk assessment, return projections, and macroeconomic impact analysis.
+    Like /allocate, only loans not reserved by a checked-out tranche are considered.
 
     Args:
         criterion (str): Primary criterion for loan selection
@@ -129,14 +111,17 @@ def generate_report(criterion: str, suboption: str, investor_budget: float):
         investor_budget (float): Total available budget for investment
 
     Returns:
-        dict: Dictionary containing the AI-generated report
+        tuple: (tranche_summary, macro_impact_summary) structured statistics, either
+            of which may be None when no loans match the selection
 
     Raises:
         HTTPException: 404 if no loans found or data is empty
         HTTPException: 500 if risk score prediction fails
     """
-    loans = list(loans_collection.find({}))
+    loans = find_unreserved_loans(loan_db)
     if not loans:
+        if loans_collection.count_documents({}, limit=1):
+            raise HTTPException(status_code=404, detail="No unreserved loans available for allocation.")
         raise HTTPException(status_code=404, detail="No loans found in the loan database.")
 
     df = pd.DataFrame(loans)
@@ -150,12 +135,102 @@ def generate_report(criterion: str, suboption: str, investor_budget: float):
     df = get_updated_dataset(df, predictions)
 
     logging.info(f"columns in df are {df.columns}")
-    loan_data = process_loan_data(df)
+    macro_data = fetch_macro_indicators()
+    loan_data = process_loan_data(df, macro_data=macro_data)
     logging.info(f"columns in loan_data are {loan_data.columns}")
     
     selected_loans_per_tranche = allocate_tranches(loan_data, criterion, suboption, investor_budget)
-    tranche_summary = summarize_tranche_allocation(selected_loans_per_tranche, criterion, suboption)
-    macro_impact_summary = analyze_macro_impact(selected_loans_per_tranche, loan_data)
-    ai_report = generate_ai_report(tranche_summary, macro_impact_summary)
+    stats = compute_tranche_statistics(selected_loans_per_tranche, macro_data)
+    tranche_summary = summarize_tranche_allocation(selected_loans_per_tranche, criterion, suboption, stats)
+    macro_impact_summary = analyze_macro_impact(selected_loans_per_tranche, macro_data, stats)
+    return tranche_summary, macro_impact_summary
+
+
+def resolve_report_backend(backend: Optional[str]):
+    """Return the requested report backend or raise a 400 for unknown names."""
+    try:
+        return get_report_backend(backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/generate_report")
+def generate_report(criterion: str, suboption: str, investor_budget: float, backend: Optional[str] = None):
+    """Generate AI-powered financial report for tranche allocations.
+
+    Creates a comprehensive report analyzing the tranche allocations, including
+    risk assessment, return projections, and macroeconomic impact analysis.
+    Reports for identical allocations are served from the report cache.
+
+    Args:
+        criterion (str): Primary criterion for loan selection
+        suboption (str): Sub-criterion refining the selection
+        investor_budget (float): Total available budget for investment
+        backend (str, optional): Report backend name ('gemini' or 'template')
+
+    Returns:
+        dict: Dictionary containing:
+            - report: The AI-generated report
+            - statistics: Structured tranche allocation and macro impact statistics
+
+    Raises:
+        HTTPException: 400 if the backend name is unknown
+        HTTPException: 404 if no loans found or data is empty
+        HTTPException: 500 if risk score prediction fails
+    """
+    report_backend = resolve_report_backend(backend)
+    tranche_summary, macro_impact_summary = build_report_summaries(criterion, suboption, investor_budget)
+    ai_report = render_report(format_tranche_summary(tranche_summary), format_macro_impact(macro_impact_summary), report_backend)
     
-    return {"report": ai_report}
\ No newline at end of file
+    return {
+        "report": ai_report,
+        "statistics": {"allocation": tranche_summary, "macro_impact": macro_impact_summary},
+    }
+
+
+@router.get("/generate_report/stream")
+def stream_generated_report(criterion: str, suboption: str, investor_budget: float, backend: Optional[str] = None):
+    """Stream the financial report as Server-Sent Events.
+
+    Runs the same pipeline as /generate_report, sends the structured statistics
+    as a `statistics` event, then sends the report as a sequence of `data:` events
+    while the backend is still producing it, followed by a final `end` event. If
+    generation fails, possibly mid-report, an `error` event carrying the message
+    ends the stream instead of `end`; the text received so far is incomplete.
+
+    Only report generation is streamed: the full allocation (scoring) and the
+    macroeconomic data fetch still run before the first byte is sent.
+
+    Args:
+        criterion (str): Primary criterion for loan selection
+        suboption (str): Sub-criterion refining the selection
+        investor_budget (float): Total available budget for investment
+        backend (str, optional): Report backend name ('gemini' or 'template')
+
+    Returns:
+        StreamingResponse: text/event-stream response with the report chunks
+
+    Raises:
+        HTTPException: 400 if the backend name is unknown
+        HTTPException: 404 if no loans found or data is empty
+        HTTPException: 500 if risk score prediction fails
+    """
+    report_backend = resolve_report_backend(backend)
+    tranche_summary, macro_impact_summary = build_report_summaries(criterion, suboption, investor_budget)
+
+    def event_stream():
+        statistics = {"allocation": tranche_summary, "macro_impact": macro_impact_summary}
+        yield format_sse(json.dumps(statistics), event="statistics")
+        try:
+            for chunk in stream_report(format_tranche_summary(tranche_summary), format_macro_impact(macro_impact_summary), report_backend):
+                yield format_sse(chunk)
+        except ReportGenerationError as e:
+            yield format_sse(e.message, event="error")
+            return
+        yield format_sse("", event="end")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,31 +2,60 @@
 
 This module provides endpoints for managing loan tranches including:
 - Uploading/checking out tranches
-- Viewing available tranches
+- Viewing available tranches and marketplace statistics
 - Purchasing tranches
-- Retrieving tranche details
-- Managing user-specific tranches
+- Retrieving tranche details, composition and loans
+- Deleting tranches
+- Managing user-specific tranches and portfolio summaries
 """
 
-from fastapi import APIRouter, HTTPException, Query
-from pymongo.collection import Collection
+from fastapi import APIRouter, Depends, HTTPException, Query
+from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId
 import logging
-from typing import List
+from typing import List, Optional
+from fastapi.responses import JSONResponse, ORJSONResponse
 from app.models.tranche import Tranche
-from app.config.database import get_database
-
-router = APIRouter()
-database = get_database()
-tranche_collection: Collection = database["tranches"]
-user_collection: Collection = database["users"]
+from app.config.database import get_async_database
+from app.services.current_user import get_current_user
+from app.services.tranche_listing import (
+    TRANCHE_PAGE_DEFAULT_LIMIT,
+    TRANCHE_PAGE_MAX_LIMIT,
+    TrancheQueryError,
+    build_tranche_filter,
+    list_available_tranches,
+    parse_tranche_cursor,
+)
+from app.services.loan_query import LoanQueryError, build_projection
+from app.services.marketplace_stats import get_marketplace_stats
+from app.services.portfolio_service import get_portfolio
+from app.services.tranche_detail import (
+    TRANCHE_LOANS_PAGE_DEFAULT_LIMIT,
+    TRANCHE_LOANS_PAGE_MAX_LIMIT,
+    TrancheDetailError,
+    get_tranche_composition,
+    get_tranche_loans_page,
+)
+from app.services.tranche_service import TrancheError, checkout_tranches, delete_tranche, purchase_tranche
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+database = get_async_database()
+tranche_collection: AsyncIOMotorCollection = database["tranches"]
+user_collection: AsyncIOMotorCollection = database["users"]
+
+try:
+    import orjson  # noqa: F401
+    ListingResponse = ORJSONResponse
+except ImportError:  # orjson is optional; fall back to the standard encoder
+    ListingResponse = JSONResponse
 
 @router.post("/checkout")
 async def upload_tranches(tranches: List[Tranche]):
     """Upload or update multiple tranches in the system.
 
     This endpoint handles both creation of new tranches and updates to existing ones.
-    For new tranches, it also updates the associated investor's tranche list.
+    All tranches are written with one bulk write, and each investor's tranche list
+    is updated once for all of their tranches (see tranche_service).
 
     Args:
         tranches (List[Tranche]): List of Tranche objects to upload/update
@@ -35,73 +64,105 @@ async def upload_tranches(tranches: List[Tranche]):
         dict: Dictionary containing:
             - message: Success message
             - uploaded_count: Number of tranches processed
+            - tranche_ids: IDs of the tranches, in request order
 
     Raises:
+        HTTPException: 409 if a loan already belongs to another tranche
         HTTPException: 500 if there's any database operation error
     """
     try:
-        for tranche in tranches:
-            tranche_dict = tranche.dict(by_alias=True)
-
-            if tranche_dict.get("_id"):
-                tranche_dict["_id"] = ObjectId(tranche_dict["_id"])
-            else:
-                tranche_dict.pop("_id", None) 
-            
-            if tranche_dict.get("investor_id"):
-                tranche_dict["investor_id"] = ObjectId(tranche_dict["investor_id"])
-            
-            tranche_dict["loans"] = [ObjectId(loan) for loan in tranche_dict["loans"]]
-
-            if "_id" in tranche_dict:
-                tranche_collection.update_one(
-                    {"_id": tranche_dict["_id"]},
-                    {"$set": tranche_dict},
-                    upsert=True
-                )
-            else:
-                result = tranche_collection.insert_one(tranche_dict)
-                inserted_tranche_id = result.inserted_id
-
-                if tranche_dict.get("investor_id"):
-                    user_collection.update_one(
-                        {"_id": ObjectId(tranche_dict["investor_id"])},
-                        {"$addToSet": {"tranches": inserted_tranche_id}}
-                    )
-
-        return {"message": "Tranches uploaded successfully", "uploaded_count": len(tranches)}
+        result = await checkout_tranches(database, [tranche.dict(by_alias=True) for tranche in tranches])
+        return {
+            "message": "Tranches uploaded successfully",
+            "uploaded_count": len(tranches),
+            "tranche_ids": result["tranche_ids"],
+        }
 
+    except TrancheError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logging.error(f"Error uploading tranches: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/available", response_model=List[Tranche])
-async def get_available_tranches():
-    """Retrieve all tranches not currently owned by any investor.
+@router.get("/available")
+async def get_available_tranches(
+    after: Optional[str] = None,
+    limit: int = Query(TRANCHE_PAGE_DEFAULT_LIMIT, ge=1, le=TRANCHE_PAGE_MAX_LIMIT),
+    risk_category: Optional[str] = None,
+    criteria: Optional[str] = None,
+    suboption: Optional[str] = None,
+    min_budget: Optional[float] = None,
+    max_budget: Optional[float] = None,
+    include_loans: bool = False,
+):
+    """Retrieve tranches not currently owned by any investor, one page at a time.
+
+    Tranches are returned in `_id` order. When more tranches follow, the
+    `X-Next-Cursor` response header holds the value to pass as `after` for the
+    next page. Loan id lists are only included with `include_loans=true`;
+    every tranche carries its `loan_count`.
+
+    Args:
+        after: X-Next-Cursor value from the previous page; omit for the first page
+        limit: Page size
+        risk_category: Only tranches of this risk category
+        criteria: Only tranches allocated with this criterion
+        suboption: Only tranches allocated with this suboption
+        min_budget: Minimum budget spent
+        max_budget: Maximum budget spent
+        include_loans: Include each tranche's loan ids
 
     Returns:
-        List[Tranche]: List of available tranche objects
+        ORJSONResponse: List of available tranche objects
 
     Raises:
+        HTTPException: 400 for an invalid cursor or budget range
         HTTPException: 500 if there's a database error
     """
     try:
-        tranches = list(tranche_collection.find({"investor_id": None}))
-
-        for tranche in tranches:
-            tranche["_id"] = str(tranche["_id"])
-            tranche["loans"] = [str(loan) for loan in tranche.get("loans", [])]
-
-        return tranches
+        query = build_tranche_filter(risk_category, criteria, suboption, min_budget, max_budget)
+        cursor = parse_tranche_cursor(after)
+    except TrancheQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    try:
+        tranches, next_cursor = await list_available_tranches(tranche_collection, query, cursor, limit, include_loans)
     except Exception as e:
         logging.error(f"Error retrieving available tranches: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve available tranches")
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ListingResponse(content=tranches, headers=headers)
     
+@router.get("/stats")
+async def get_marketplace_stats_endpoint():
+    """Retrieve tranche counts, budget spent and average risk per risk category.
+
+    Served from a statistics document maintained incrementally by checkout and
+    purchase, so the cost does not depend on the number of tranches.
+
+    Returns:
+        dict: Dictionary containing:
+            - by_risk_category: available / sold count, budget_spent and
+              average_risk for each risk category
+            - updated_at / reconciled_at: last incremental update and last full rebuild
+
+    Raises:
+        HTTPException: 500 if there's a database error
+    """
+    try:
+        return await get_marketplace_stats(database)
+    except Exception as e:
+        logging.error(f"Error retrieving marketplace stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve marketplace statistics")
+
 @router.post("/buy-tranche")
 async def buy_tranche(tranche_id: str, investor_id: str):
     """Purchase an available tranche for a specific investor.
 
+    The tranche is claimed atomically, so concurrent buyers cannot both win
+    (see tranche_service.purchase_tranche).
+
     Args:
         tranche_id (str): ID of the tranche to purchase
         investor_id (str): ID of the purchasing investor
@@ -113,24 +174,13 @@ async def buy_tranche(tranche_id: str, investor_id: str):
             - investor_id: Investor ID
 
     Raises:
-        HTTPException: 404 if tranche not available
+        HTTPException: 400 for invalid IDs
+        HTTPException: 404 if the tranche or investor does not exist
+        HTTPException: 409 if the tranche is already sold
         HTTPException: 500 if purchase operation fails
     """
     try:
-        tranche = tranche_collection.find_one({"_id": ObjectId(tranche_id), "investor_id": None})
-        
-        if not tranche:
-            raise HTTPException(status_code=404, detail="Tranche not available for purchase")
-
-        tranche_collection.update_one(
-            {"_id": ObjectId(tranche_id)},
-            {"$set": {"investor_id": ObjectId(investor_id)}}
-        )
-        
-        user_collection.update_one(
-            {"_id": ObjectId(investor_id)},
-            {"$addToSet": {"tranches": ObjectId(tranche_id)}}
-        )
+        await purchase_tranche(database, tranche_id, investor_id)
 
         return {
             "message": "Tranche purchased successfully",
@@ -138,6 +188,8 @@ async def buy_tranche(tranche_id: str, investor_id: str):
             "investor_id": investor_id
         }
 
+    except TrancheError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logging.error(f"Error purchasing tranche: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to purchase tranche")
@@ -157,7 +209,7 @@ async def get_tranche_details(tranche_id: str):
         HTTPException: 500 if retrieval fails
     """
     try:
-        tranche = tranche_collection.find_one({"_id": ObjectId(tranche_id)})
+        tranche = await tranche_collection.find_one({"_id": ObjectId(tranche_id)})
 
         if not tranche:
             raise HTTPException(status_code=404, detail="Tranche not found")
@@ -173,6 +225,122 @@ async def get_tranche_details(tranche_id: str):
         logging.error(f"Error fetching tranche details: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch tranche details")
 
+@router.delete("/tranche")
+async def delete_tranche_endpoint(tranche_id: str):
+    """Delete a tranche and release its loans for allocation.
+
+    Args:
+        tranche_id (str): ID of the tranche to delete
+
+    Returns:
+        dict: Success message and the deleted tranche ID
+
+    Raises:
+        HTTPException: 400 for an invalid tranche ID
+        HTTPException: 404 if tranche not found
+        HTTPException: 500 if deletion fails
+    """
+    try:
+        await delete_tranche(database, tranche_id)
+        return {"message": "Tranche deleted successfully", "tranche_id": tranche_id}
+    except TrancheError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logging.error(f"Error deleting tranche: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete tranche")
+
+@router.get("/tranche/composition")
+async def get_tranche_composition_endpoint(tranche_id: str):
+    """Summarize a tranche's loans: amount-weighted risk, histograms and employment mix.
+
+    Computed by one aggregation on the server and cached until the tranche or
+    any loan changes, so the frontend never needs to fetch loans one by one.
+
+    Args:
+        tranche_id (str): ID of the tranche
+
+    Returns:
+        dict: loan_count, loans_found, total_amount, weighted_risk,
+            credit_score_histogram, duration_histogram and employment_mix
+
+    Raises:
+        HTTPException: 400 for an invalid tranche ID
+        HTTPException: 404 if tranche not found
+        HTTPException: 500 if the aggregation fails
+    """
+    try:
+        return await get_tranche_composition(database, tranche_id)
+    except TrancheDetailError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logging.error(f"Error computing tranche composition: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute tranche composition")
+
+@router.get("/tranche/loans")
+async def get_tranche_loans(
+    tranche_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(TRANCHE_LOANS_PAGE_DEFAULT_LIMIT, ge=1, le=TRANCHE_LOANS_PAGE_MAX_LIMIT),
+    fields: Optional[str] = None,
+):
+    """Expand a page of a tranche's loans in one request.
+
+    Args:
+        tranche_id (str): ID of the tranche
+        offset: Position in the tranche's loan list to start at
+        limit: Page size
+        fields: Comma-separated loan fields to return (all fields by default)
+
+    Returns:
+        dict: loans, missing (ids no longer in the loan database), loan_count,
+            offset and next_offset (None on the last page)
+
+    Raises:
+        HTTPException: 400 for an invalid tranche ID or unknown fields
+        HTTPException: 404 if tranche not found
+        HTTPException: 500 if retrieval fails
+    """
+    try:
+        projection = build_projection(fields)
+    except LoanQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await get_tranche_loans_page(database, tranche_id, offset, limit, projection)
+    except TrancheDetailError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logging.error(f"Error fetching tranche loans: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch tranche loans")
+
+@router.get("/portfolio")
+async def get_investor_portfolio(investor_id: str = Query(..., title="Investor ID")):
+    """Retrieve an investor's portfolio summary in one query.
+
+    Returns one entry per owned tranche (budgets, average risk, loan count and
+    categories) plus the portfolio totals, read from the precomputed summary
+    maintained by checkout and purchase.
+
+    Args:
+        investor_id (str): ID of the investor
+
+    Returns:
+        dict: Dictionary containing:
+            - tranches: Per-tranche entries
+            - totals: tranche_count, investor_budget, budget_spent, loan_count
+              and amount-weighted risk
+
+    Raises:
+        HTTPException: 400 for invalid investor ID format
+        HTTPException: 500 for database errors
+    """
+    if not ObjectId.is_valid(investor_id):
+        raise HTTPException(status_code=400, detail="Invalid Investor ID format")
+    try:
+        return await get_portfolio(database, investor_id)
+    except Exception as e:
+        logging.error(f"Error fetching investor portfolio: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve investor portfolio")
+
 @router.get("/user-tranches")
 async def get_user_tranches(user_id: str = Query(..., title="User ID")):
     """Retrieve all tranche IDs associated with a specific user.
@@ -193,7 +361,7 @@ async def get_user_tranches(user_id: str = Query(..., title="User ID")):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid User ID format")
 
-        user = user_collection.find_one({"_id": ObjectId(user_id)})
+        user = await user_collection.find_one({"_id": ObjectId(user_id)})
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
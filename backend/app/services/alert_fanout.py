@@ -0,0 +1,182 @@
+"""Macro alert fan-out to investors.
+
+A CPI spike alert goes to every verified investor holding at least one
+tranche. `start_alert_fanout`:
+- reads the affected investors from `users` in one pass (the `tranches`
+  relation, projected to the few fields the message needs),
+- renders every message up front from one template,
+- records the alert in `macro_alerts` and splits the recipients into batches
+  of ALERT_BATCH_SIZE,
+- starts a Celery chord: one `send_alert_batch` subtask per batch, sending over
+  its own pool of persistent SMTP connections (see email_outbox.SMTPPool), rate
+  limited per worker with ALERT_BATCH_RATE_LIMIT, and `finalize_alert` once all
+  batches are done.
+
+Each batch adds its sent/failed counts to the alert document as it finishes;
+`finalize_alert` records the total delivery time and throughput, which
+/health/alerts reports per alert. A batch never raises: an error (SMTP pool,
+database) is returned as failed counts with the error, so the chord callback
+always runs and an alert with failed batches ends as "failed" instead of
+staying "sending".
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from celery import chord
+from app.services.beat_scheduler import celery_app
+from app.services.email_outbox import SMTPPool, build_message
+from app.services.loan_versioning import utc_now
+
+logger = logging.getLogger(__name__)
+
+ALERTS_COLLECTION = "macro_alerts"
+
+# Fan-out settings
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", 200))
+ALERT_SMTP_CONNECTIONS = int(os.getenv("ALERT_SMTP_CONNECTIONS", 2))
+ALERT_BATCH_RATE_LIMIT = os.getenv("ALERT_BATCH_RATE_LIMIT", "30/m")  # Celery rate limit, per worker
+ALERT_MAX_FAILED_RECIPIENTS = 1000  # failed addresses kept on the alert document
+
+# Investors an alert is sent to
+INVESTOR_FILTER = {"is_verified": True, "tranches.0": {"$exists": True}}
+INVESTOR_PROJECTION = {"_id": 0, "email": 1, "full_name": 1, "tranche_count": {"$size": "$tranches"}}
+
+
+def affected_investors(db) -> list:
+    """Return email, full_name and tranche_count of every investor holding tranches (PyMongo database)."""
+    return list(db["users"].find(INVESTOR_FILTER, INVESTOR_PROJECTION))
+
+
+def render_messages(alert_id: str, investors: list, subject: str, body_template: str) -> list:
+    """Render one message per investor.
+
+    Args:
+        alert_id: Alert the messages belong to (part of each message id)
+        investors: Documents from affected_investors
+        subject: Subject line shared by every message
+        body_template: str.format template; may use {full_name} and {tranche_count}
+
+    Returns:
+        list: Outbox-style message documents (_id, to, subject, body)
+    """
+    return [
+        {
+            "_id": f"{alert_id}.{index}",
+            "to": investor["email"],
+            "subject": subject,
+            "body": body_template.format(full_name=investor.get("full_name") or "Investor",
+                                         tranche_count=investor.get("tranche_count", 0)),
+        }
+        for index, investor in enumerate(investors)
+    ]
+
+
+def start_alert_fanout(db, kind: str, subject: str, body_template: str, details: dict) -> dict:
+    """Record an alert and fan its messages out to Celery subtasks.
+
+    Args:
+        db: PyMongo database
+        kind: Alert type, e.g. "cpi_spike"
+        subject: Subject line
+        body_template: Message template (see render_messages)
+        details: Alert values stored with the alert (e.g. latest and previous CPI)
+
+    Returns:
+        dict: alert_id, recipients and batches
+    """
+    alert_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    messages = render_messages(alert_id, affected_investors(db), subject, body_template)
+    batches = [messages[i:i + ALERT_BATCH_SIZE] for i in range(0, len(messages), ALERT_BATCH_SIZE)]
+    db[ALERTS_COLLECTION].insert_one({
+        "_id": alert_id,
+        "kind": kind,
+        "details": details,
+        "recipients": len(messages),
+        "batches": len(batches),
+        "sent": 0,
+        "failed": 0,
+        "status": "sending" if batches else "done",
+        "prepare_seconds": time.perf_counter() - started,
+        "started_at": utc_now(),
+    })
+    if batches:
+        chord(
+            celery_app.signature("app.services.celery_worker.send_alert_batch", args=(alert_id, batch))
+            for batch in batches
+        )(celery_app.signature("app.services.celery_worker.finalize_alert", args=(alert_id,)))
+    logger.info(f"Alert {alert_id} ({kind}): {len(messages)} recipient(s) in {len(batches)} batch(es)")
+    return {"alert_id": alert_id, "recipients": len(messages), "batches": len(batches)}
+
+
+async def send_messages(messages: list, connections: int) -> list:
+    """Send messages concurrently over a new pool of `connections`; returns one error (or None) per message."""
+    pool = SMTPPool(connections)
+    try:
+        return await asyncio.gather(*(pool.send(build_message(m)) for m in messages), return_exceptions=True)
+    finally:
+        await pool.close()
+
+
+def send_batch(db, alert_id: str, messages: list, connections: int = ALERT_SMTP_CONNECTIONS) -> dict:
+    """Send one batch over pooled SMTP connections and add its counts to the alert.
+
+    Returns:
+        dict: sent, failed and seconds for this batch, plus error if the whole batch failed
+    """
+    started = time.perf_counter()
+    batch_error = None
+    try:
+        errors = asyncio.run(send_messages(messages, connections))
+    except Exception as e:
+        logger.error(f"Alert {alert_id} batch of {len(messages)} failed: {e}")
+        batch_error = e
+        errors = [e] * len(messages)
+    failed = [message["to"] for message, error in zip(messages, errors) if error is not None]
+    for message, error in zip(messages, errors):
+        if error is not None:
+            logger.warning(f"Alert {alert_id} email to {message['to']} failed: {error}")
+    result = {"sent": len(messages) - len(failed), "failed": len(failed), "seconds": time.perf_counter() - started}
+    if batch_error is not None:
+        result["error"] = str(batch_error)
+    update = {"$inc": {"sent": result["sent"], "failed": result["failed"]}}
+    if failed:
+        update["$push"] = {"failed_recipients": {"$each": failed, "$slice": ALERT_MAX_FAILED_RECIPIENTS}}
+    db[ALERTS_COLLECTION].update_one({"_id": alert_id}, update)
+    return result
+
+
+def finalize_alert(db, alert_id: str, batch_results: list) -> dict:
+    """Record an alert's delivery time and throughput once every batch has finished.
+
+    Returns:
+        dict: The alert's delivery report
+    """
+    alert = db[ALERTS_COLLECTION].find_one({"_id": alert_id}, {"started_at": 1, "recipients": 1})
+    finished = utc_now()
+    started = alert["started_at"]
+    if started.tzinfo is None:
+        finished = finished.replace(tzinfo=None)
+    seconds = (finished - started).total_seconds()
+    sent = sum(result["sent"] for result in batch_results)
+    batch_errors = [result["error"] for result in batch_results if result.get("error")]
+    report = {
+        "status": "failed" if batch_errors else "done",
+        "batch_errors": batch_errors[:ALERT_MAX_FAILED_RECIPIENTS],
+        "finished_at": finished,
+        "delivery_seconds": seconds,
+        "throughput_per_second": sent / seconds if seconds > 0 else None,
+        "slowest_batch_seconds": max((result["seconds"] for result in batch_results), default=0),
+    }
+    db[ALERTS_COLLECTION].update_one({"_id": alert_id}, {"$set": report})
+    logger.info(f"Alert {alert_id} delivered to {sent}/{alert['recipients']} investor(s) in {seconds:.1f}s")
+    return {"alert_id": alert_id, "sent": sent, **report}
+
+
+async def recent_alerts(db, limit: int = 10) -> list:
+    """Return the delivery reports of the latest alerts (Motor database)."""
+    cursor = db[ALERTS_COLLECTION].find({}, {"failed_recipients": 0}).sort("started_at", -1).limit(limit)
+    return [{"alert_id": alert.pop("_id"), **alert} async for alert in cursor]
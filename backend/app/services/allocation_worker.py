@@ -0,0 +1,165 @@
+"""Allocation jobs executed in the allocation process pool.
+
+Each worker process preloads the risk model and the allocation thresholds once,
+in `init_allocation_worker`. A job then reads the loans straight from MongoDB
+with the worker's own client (skipping loans already reserved by a checked-out
+tranche, see loan_reservations), scores them, runs `allocate_tranches` and returns
+only the compact per-tranche results. No DataFrame is ever pickled between the
+API process and the worker.
+"""
+
+import os
+import logging
+import pandas as pd
+from app.config.database import get_database
+from app.ml.risk_model import MODEL_FILE, load_model, preprocess_data, load_ml_risk_scores
+from app.services.pool_service import allocate_tranches, get_thresholds
+from app.services.executor import BoundedProcessPool
+from app.services.loan_reservations import find_unreserved_loans
+
+logger = logging.getLogger(__name__)
+
+# Pool settings
+ALLOCATION_WORKERS = int(os.getenv("ALLOCATION_WORKERS", 2))  # 0 runs allocation in-process
+ALLOCATION_MAX_PENDING = int(os.getenv("ALLOCATION_MAX_PENDING", 8))
+ALLOCATION_START_METHOD = os.getenv("ALLOCATION_START_METHOD", "spawn")
+
+# Risk model preloaded by the worker initializer
+_model = None
+
+# Static tranche information, in the order tranches are reported.
+STATIC_TRANCHE_INFO = {
+    "Senior Tranche": {
+        "Risk": "Lowest Risk",
+        "Return": "Lowest Return",
+        "Payment Priority": "First to be paid"
+    },
+    "Mezzanine Tranche": {
+        "Risk": "Moderate Risk",
+        "Return": "Moderate Return",
+        "Payment Priority": "Paid after senior tranche"
+    },
+    "Subordinated Tranche": {
+        "Risk": "High Risk",
+        "Return": "High Return",
+        "Payment Priority": "Paid after mezzanine"
+    },
+    "Equity Tranche": {
+        "Risk": "Highest Risk",
+        "Return": "Highest Return",
+        "Payment Priority": "Last to be paid (if anything is left)"
+    }
+}
+
+
+class AllocationError(Exception):
+    """Allocation failure carrying the HTTP status and detail to report.
+
+    Arguments are kept in `args` so the exception survives pickling back to the API process.
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def init_allocation_worker() -> None:
+    """Preload the risk model and allocation thresholds in the current process."""
+    global _model
+    _model = load_model(MODEL_FILE)
+    get_thresholds()
+    logger.info(f"Allocation worker {os.getpid()} ready (model loaded: {_model is not None}).")
+
+
+def predict_risk_scores(df: pd.DataFrame):
+    """Predict risk scores with the preloaded model, training one if none was found.
+
+    Returns:
+        numpy.ndarray | None: Predictions aligned with df, or None on failure
+    """
+    global _model
+    if _model is None:
+        predictions = load_ml_risk_scores(df)
+        _model = load_model(MODEL_FILE)
+        return predictions
+    try:
+        features = df.drop(columns=["RiskScore", "_id"], errors="ignore")
+        return _model.predict(preprocess_data(features))
+    except Exception as e:
+        logger.error(f"Risk score prediction failed: {e}", exc_info=True)
+        return None
+
+
+def fetch_loans_frame() -> pd.DataFrame:
+    """Load the loans not reserved by any tranche into a DataFrame ready for scoring."""
+    db = get_database()
+    loans = find_unreserved_loans(db)
+    if not loans:
+        if db["loans"].count_documents({}, limit=1):
+            raise AllocationError(404, "No unreserved loans available for allocation.")
+        raise AllocationError(404, "No loans found in the loan database.")
+
+    df = pd.DataFrame(loans)
+    if df.empty:
+        raise AllocationError(404, "Loan data is empty after conversion.")
+    return df.drop(columns=["investor_id", "status", "tranche_type"], errors='ignore')
+
+
+def summarize_tranche(df_tranche: pd.DataFrame) -> dict:
+    """Reduce a tranche's selected loans to the fields returned by the API."""
+    if df_tranche.empty:
+        return {"loans_allocated": 0, "budget_spent": 0.0, "loans": [], "average_risk": None}
+
+    budget_spent = float(df_tranche['LoanAmount'].sum()) if 'LoanAmount' in df_tranche.columns else 0.0
+    loan_ids = [str(oid) for oid in df_tranche['_id'].tolist()] if '_id' in df_tranche.columns else []
+    weighted_risk = None
+    if 'RiskScore' in df_tranche.columns and 'LoanAmount' in df_tranche.columns:
+        weighted_risk = float((df_tranche['RiskScore'] * df_tranche['LoanAmount']).sum() / df_tranche['LoanAmount'].sum())
+    return {
+        "loans_allocated": len(df_tranche),
+        "budget_spent": budget_spent,
+        "loans": loan_ids,
+        "average_risk": weighted_risk,
+    }
+
+
+def score_and_allocate(criterion: str, suboption: str, investor_budget: float) -> dict:
+    """Fetch, score and allocate loans into tranches.
+
+    Args:
+        criterion: Primary criterion for loan selection
+        suboption: Sub-criterion refining the selection
+        investor_budget: Total available budget for investment
+
+    Returns:
+        dict: Mapping of tranche name to its summary (see summarize_tranche);
+            empty if no loans match the criteria and budget
+
+    Raises:
+        AllocationError: 404 if there are no loans, 500 if scoring fails
+    """
+    df = fetch_loans_frame()
+    predictions = predict_risk_scores(df)
+    if predictions is None or len(predictions) != len(df):
+        raise AllocationError(500, "Risk score predictions failed.")
+    df['Predicted_RiskScore'] = predictions
+
+    tranches = allocate_tranches(df, criterion, suboption, investor_budget)
+    if tranches is None or all(tranche_df.empty for tranche_df in tranches.values()):
+        return {}
+
+    return {
+        tranche_key: summarize_tranche(tranches.get(tranche_key, pd.DataFrame()))
+        for tranche_key in STATIC_TRANCHE_INFO
+    }
+
+
+# Shared allocation pool, started and stopped with the FastAPI app
+allocation_pool = BoundedProcessPool(
+    "allocation",
+    max_workers=ALLOCATION_WORKERS,
+    max_pending=ALLOCATION_MAX_PENDING,
+    initializer=init_allocation_worker,
+    start_method=ALLOCATION_START_METHOD,
+)
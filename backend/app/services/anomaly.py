@@ -0,0 +1,310 @@
+"""Streaming anomaly detection over macroeconomic indicators.
+
+Each indicator (VIX, ^TNX and ^IRX closes from Yahoo Finance, as used by
+app.ml.analysis, and monthly CPI from the CPI check) keeps a constant-size
+state that is updated once per new observation:
+- an exponentially weighted mean and variance (EWMA, smoothing `alpha`),
+- the z-score of the new value against the EWMA statistics before the update,
+- the rate of change from the previous observation, in percent.
+
+A rule per indicator fires an alert when |z| or |rate of change| exceeds its
+threshold (optionally only upwards or downwards), once the indicator has seen
+`min_observations` points. Default rules can be overridden with ANOMALY_RULES
+(a JSON object keyed by indicator name).
+
+States live in `anomaly_state` (one document per indicator) and fired alerts in
+`anomaly_events`. The `detect_market_anomalies` Celery task runs the engine on
+the beat schedule (ANOMALY_CHECK_SECONDS). A new indicator is first warmed up
+on ANOMALY_BACKFILL_PERIOD of history without alerting.
+
+The engine replays history offline with an in-memory state, e.g. to tune rules:
+
+    python -m app.services.anomaly replay --ticker ^VIX --period 10y
+    python -m app.services.anomaly replay --csv vix.csv --indicator VIX --date-column Date --value-column Close
+"""
+
+import os
+import json
+import math
+import logging
+import argparse
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.services.loan_versioning import utc_now
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "anomaly_state"
+EVENTS_COLLECTION = "anomaly_events"
+
+# Engine settings
+ANOMALY_FETCH_PERIOD = os.getenv("ANOMALY_FETCH_PERIOD", "1mo")  # Yahoo history read per run
+ANOMALY_BACKFILL_PERIOD = os.getenv("ANOMALY_BACKFILL_PERIOD", "2y")  # warm-up history for a new indicator
+ANOMALY_NOTIFY_INVESTORS = os.getenv("ANOMALY_NOTIFY_INVESTORS", "false").lower() == "true"
+
+# Yahoo Finance tickers of the market indicators
+TICKERS = {"VIX": "^VIX", "TNX": "^TNX", "IRX": "^IRX"}
+
+DEFAULT_RULES = {
+    "VIX": {"alpha": 0.1, "z_threshold": 3.0, "roc_threshold": 25.0, "direction": "up", "min_observations": 30},
+    "TNX": {"alpha": 0.05, "z_threshold": 3.5, "roc_threshold": 8.0, "direction": "both", "min_observations": 30},
+    "IRX": {"alpha": 0.05, "z_threshold": 3.5, "roc_threshold": 15.0, "direction": "both", "min_observations": 30},
+    "CPI": {"alpha": 0.2, "z_threshold": 3.0, "roc_threshold": 0.5, "direction": "up", "min_observations": 12},
+}
+
+
+def load_rules(overrides: Optional[str] = None) -> dict:
+    """Default rules updated with a JSON object of per-indicator overrides (ANOMALY_RULES)."""
+    rules = {name: dict(rule) for name, rule in DEFAULT_RULES.items()}
+    for name, rule in json.loads(overrides or os.getenv("ANOMALY_RULES") or "{}").items():
+        rules.setdefault(name, dict(DEFAULT_RULES["VIX"])).update(rule)
+    return rules
+
+
+def new_state() -> dict:
+    return {"count": 0, "mean": None, "var": 0.0, "last_date": None, "last_value": None}
+
+
+def update_state(state: dict, value: float, alpha: float) -> dict:
+    """Fold one observation into an indicator state, in place, in O(1).
+
+    Returns:
+        dict: z (against the statistics before the update; None while the
+            variance is zero) and roc (percent change from the previous value; None
+            for the first value or after a zero)
+    """
+    previous, mean, var = state["last_value"], state["mean"], state["var"]
+    z = (value - mean) / math.sqrt(var) if mean is not None and var > 0 else None
+    roc = (value - previous) / abs(previous) * 100 if previous else None
+
+    if mean is None:
+        state["mean"], state["var"] = value, 0.0
+    else:
+        diff = value - mean
+        increment = alpha * diff
+        state["mean"] = mean + increment
+        state["var"] = (1 - alpha) * (var + diff * increment)
+    state["count"] += 1
+    state["last_value"] = value
+    return {"z": z, "roc": roc}
+
+
+def _exceeds(metric: Optional[float], threshold: Optional[float], direction: str) -> bool:
+    if metric is None or threshold is None:
+        return False
+    if direction == "up":
+        return metric > threshold
+    if direction == "down":
+        return metric < -threshold
+    return abs(metric) > threshold
+
+
+def evaluate(metrics: dict, rule: dict, count: int) -> list:
+    """Return the names of the rule checks ("z_score", "rate_of_change") an observation triggers."""
+    if count <= rule.get("min_observations", 0):
+        return []
+    direction = rule.get("direction", "both")
+    fired = []
+    if _exceeds(metrics["z"], rule.get("z_threshold"), direction):
+        fired.append("z_score")
+    if _exceeds(metrics["roc"], rule.get("roc_threshold"), direction):
+        fired.append("rate_of_change")
+    return fired
+
+
+def process_observations(indicator: str, state: dict, observations: Iterable, rule: dict,
+                         alert: bool = True) -> list:
+    """Fold observations newer than the state's last date into it and collect alerts.
+
+    Args:
+        indicator: Indicator name
+        state: Indicator state (updated in place)
+        observations: (date string, value) pairs, oldest first
+        rule: The indicator's rule
+        alert: False to only warm the state up (backfill)
+
+    Returns:
+        list: Alert events
+    """
+    events = []
+    for date, value in observations:
+        if state["last_date"] is not None and date <= state["last_date"]:
+            continue
+        if value is None or not math.isfinite(value):
+            continue
+        metrics = update_state(state, float(value), rule["alpha"])
+        state["last_date"] = date
+        fired = evaluate(metrics, rule, state["count"]) if alert else []
+        if fired:
+            events.append({"indicator": indicator, "date": date, "value": float(value),
+                           "z": metrics["z"], "roc": metrics["roc"], "rules": fired})
+    return events
+
+
+def fetch_ticker_history(ticker: str, period: str) -> list:
+    """Final daily closes of a Yahoo Finance ticker as (date string, close) pairs, oldest first.
+
+    The row dated today in the exchange's time zone is dropped: during the session
+    it holds the live, unfinished bar, and once a date is folded in it is never
+    revisited. Today's close is picked up by the first run on a later day.
+    """
+    import pandas as pd
+    import yfinance as yf
+
+    history = yf.Ticker(ticker).history(period=period)
+    history = history[history.index < pd.Timestamp.now(tz=history.index.tz).normalize()]
+    return [(index.strftime("%Y-%m-%d"), float(close)) for index, close in history["Close"].dropna().items()]
+
+
+def _store_events(db, events: list) -> None:
+    if events:
+        db[EVENTS_COLLECTION].bulk_write(
+            [UpdateOne({"_id": f"{event['indicator']}:{event['date']}"},
+                       {"$setOnInsert": {**event, "created_at": utc_now()}}, upsert=True)
+             for event in events],
+            ordered=False,
+        )
+
+
+def run_indicator(db, indicator: str, observations: list, rule: dict, alert: bool = True) -> dict:
+    """Update one indicator's stored state with new observations and record its alerts.
+
+    The state write is conditional on the state not having moved since it was
+    read, so overlapping runs cannot apply the same observations twice.
+
+    Returns:
+        dict: new_points and events
+    """
+    stored = db[STATE_COLLECTION].find_one({"_id": indicator})
+    state = {key: (stored or new_state()).get(key, default) for key, default in new_state().items()}
+    before = state["count"]
+    events = process_observations(indicator, state, observations, rule, alert=alert)
+    if state["count"] == before:
+        return {"new_points": 0, "events": []}
+
+    try:
+        result = db[STATE_COLLECTION].update_one(
+            {"_id": indicator, "count": before},
+            {"$set": {**state, "updated_at": utc_now()}},
+            upsert=stored is None,
+        )
+        changed = stored is not None and result.matched_count == 0
+    except DuplicateKeyError:  # two first runs: the other one created the state
+        changed = True
+    if changed:
+        logger.info(f"Anomaly state of {indicator} changed concurrently; skipping this run.")
+        return {"new_points": 0, "events": []}
+    _store_events(db, events)
+    return {"new_points": state["count"] - before, "events": events}
+
+
+def _notify(db, events: list) -> None:
+    """Send the alerts fired by a run to investors (ANOMALY_NOTIFY_INVESTORS)."""
+    from app.services.alert_fanout import start_alert_fanout
+
+    # Event lines are literal text inside the str.format template
+    lines = "\n".join(
+        f"- {e['indicator']} on {e['date']}: {e['value']:g} ({', '.join(e['rules'])})" for e in events
+    ).replace("{", "{{").replace("}", "}}")
+    body_template = (
+        "Dear {full_name},\n\nABSecure detected unusual moves in market indicators:\n"
+        f"{lines}\n\nThey may affect the {{tranche_count}} tranche(s) you hold."
+    )
+    start_alert_fanout(db, "market_anomaly", "Market Anomaly Alert", body_template, {"events": events})
+
+
+def detect_anomalies(db, rules: Optional[dict] = None) -> dict:
+    """Run the engine over the latest market data (the Celery task's body).
+
+    Returns:
+        dict: Per indicator, new_points and the alerts fired (or an error)
+    """
+    rules = rules or load_rules()
+    report, fired = {}, []
+    for indicator, ticker in TICKERS.items():
+        try:
+            warm = db[STATE_COLLECTION].count_documents({"_id": indicator}, limit=1) > 0
+            observations = fetch_ticker_history(ticker, ANOMALY_FETCH_PERIOD if warm else ANOMALY_BACKFILL_PERIOD)
+            result = run_indicator(db, indicator, observations, rules[indicator], alert=warm)
+        except Exception as e:
+            logger.error(f"Anomaly check of {indicator} failed: {e}")
+            report[indicator] = {"error": str(e)}
+            continue
+        fired.extend(result["events"])
+        report[indicator] = {"new_points": result["new_points"], "alerts": len(result["events"])}
+    for event in fired:
+        logger.warning(f"Anomaly: {event}")
+    if fired and ANOMALY_NOTIFY_INVESTORS:
+        _notify(db, fired)
+    return report
+
+
+def record_cpi(db, points: list, alert: bool = True) -> list:
+    """Feed new CPI observations from the CPI check into the engine; returns the alerts fired.
+
+    Args:
+        db: PyMongo database
+        points: (date string, value) pairs, oldest first
+        alert: False to only warm the state up (the CPI check's first run)
+    """
+    events = run_indicator(db, "CPI", points, load_rules()["CPI"], alert=alert)["events"]
+    for event in events:
+        logger.warning(f"Anomaly: {event}")
+    return events
+
+
+def replay(indicator: str, observations: list, rule: dict) -> dict:
+    """Run the engine over a history in memory (no database).
+
+    Returns:
+        dict: observations processed, final state and every alert fired
+    """
+    state = new_state()
+    events = process_observations(indicator, state, observations, rule)
+    return {"observations": state["count"], "state": state, "events": events}
+
+
+def _read_csv(path: str, date_column: str, value_column: str) -> list:
+    import pandas as pd
+
+    frame = pd.read_csv(path, usecols=[date_column, value_column]).dropna()
+    dates = pd.to_datetime(frame[date_column], utc=True).dt.strftime("%Y-%m-%d")
+    return sorted(zip(dates, frame[value_column].astype(float)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay the anomaly engine over historical data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="Replay a ticker's history or a CSV file")
+    source = replay_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ticker", help="Yahoo Finance ticker, e.g. ^VIX")
+    source.add_argument("--csv", help="CSV file with a date and a value column")
+    replay_parser.add_argument("--indicator", help="Rule to use (default: derived from the ticker)")
+    replay_parser.add_argument("--period", default="10y", help="Yahoo history period for --ticker")
+    replay_parser.add_argument("--date-column", default="date")
+    replay_parser.add_argument("--value-column", default="value")
+    replay_parser.add_argument("--rules", help="JSON rule overrides, as in ANOMALY_RULES")
+    args = parser.parse_args()
+
+    ticker_names = {ticker: name for name, ticker in TICKERS.items()}
+    indicator = args.indicator or ticker_names.get(args.ticker) or "VIX"
+    rules = load_rules(args.rules)
+    if indicator not in rules:
+        parser.error(f"No rule for indicator {indicator}; pass one with --rules")
+    observations = (fetch_ticker_history(args.ticker, args.period) if args.ticker
+                    else _read_csv(args.csv, args.date_column, args.value_column))
+
+    result = replay(indicator, observations, rules[indicator])
+    for event in result["events"]:
+        z = f"{event['z']:.2f}" if event["z"] is not None else "-"
+        roc = f"{event['roc']:.2f}%" if event["roc"] is not None else "-"
+        print(f"{event['date']}  {indicator}={event['value']:g}  z={z}  roc={roc}  {','.join(event['rules'])}")
+    state = result["state"]
+    print(f"\n{result['observations']} observation(s), {len(result['events'])} alert(s); "
+          f"final mean={state['mean']:.4g} std={math.sqrt(state['var']):.4g}" if result["observations"]
+          else "No observations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,12 @@
 
 This module provides functions for password hashing/verification and JWT token
 creation/verification. It handles all security-related operations for the application.
+
+bcrypt is deliberately slow (BCRYPT_ROUNDS sets the cost), so routes run hashing
+and verification in `password_pool`, a bounded process pool: a login storm then
+queues there, up to PASSWORD_MAX_PENDING jobs, instead of occupying the API's
+threadpool, and further requests are rejected rather than stalling others.
+Hashes made with a different cost are upgraded by `verify_and_update` on login.
 """
 
 from datetime import datetime, timedelta
@@ -9,6 +15,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
 from app.services.email_service import send_verification_email
+from app.services.executor import BoundedProcessPool
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,8 +26,20 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes with any other cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Password hashing pool settings
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))  # 0 hashes in the API process's threadpool
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 32))
+PASSWORD_START_METHOD = os.getenv("PASSWORD_START_METHOD", "spawn")
 
 
 def get_password_hash(password: str) -> str:
@@ -48,6 +67,19 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update(plain_password: str, hashed_password: str) -> tuple:
+    """Verify a password and rehash it if the stored hash uses another cost.
+
+    Args:
+        plain_password (str): The plain text password to verify
+        hashed_password (str): The stored hashed password
+
+    Returns:
+        tuple: (True if passwords match, new hash to store or None)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def create_access_token(data: dict) -> str:
     """Create a JWT access token with expiration.
 
@@ -80,4 +112,13 @@ def verify_token(token: str) -> str | None:
             return None
         return email
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+# Shared password hashing pool, started and stopped with the FastAPI app
+password_pool = BoundedProcessPool(
+    "password",
+    max_workers=PASSWORD_WORKERS,
+    max_pending=PASSWORD_MAX_PENDING,
+    start_method=PASSWORD_START_METHOD,
+)
@@ -31,6 +31,14 @@ celery_app.conf.beat_schedule = {
         "task": "app.services.celery_worker.check_cpi_spike",  # Fully-qualified task name
         "schedule": 600.0,  # Every 10 minutes (in seconds)
     },
+    "reconcile-marketplace-stats": {
+        "task": "app.services.celery_worker.reconcile_marketplace_stats",
+        "schedule": float(os.getenv("MARKETPLACE_STATS_RECONCILE_SECONDS", 3600)),
+    },
+    "detect-market-anomalies": {
+        "task": "app.services.celery_worker.detect_market_anomalies",
+        "schedule": float(os.getenv("ANOMALY_CHECK_SECONDS", 3600)),
+    },
 }
 
 # Set timezone for scheduled tasks
@@ -1,11 +1,13 @@
 """Celery task for monitoring macroeconomic indicators.
 
 This module contains the Celery task that periodically checks for significant
-changes in macroeconomic indicators like CPI (Consumer Price Index).
+changes in macroeconomic indicators like CPI (Consumer Price Index), and the
+subtasks fanning an alert out to investors (see app.services.alert_fanout).
 """
 
 from app.services.beat_scheduler import celery_app  # Import the existing Celery instance
 from app.services.notifications import process_macro_alert
+from app.services.alert_fanout import ALERT_BATCH_RATE_LIMIT
 
 @celery_app.task
 def check_cpi_spike() -> str:
@@ -28,4 +30,63 @@ def check_cpi_spike() -> str:
         return result
     except Exception as e:
         print(f"Error in check_cpi_spike: {e}")
-        return "Error"
\ No newline at end of file
+        return "Error"
+
+@celery_app.task
+def reconcile_marketplace_stats() -> dict:
+    """Periodic task rebuilding the marketplace statistics from the tranches collection.
+
+    The statistics are maintained with $inc deltas on every checkout and
+    purchase; this task corrects any drift those deltas accumulated.
+
+    Returns:
+        dict: The drift found per risk category and state (empty when none)
+    """
+    from app.config.database import get_database
+    from app.services.marketplace_stats import reconcile_stats
+
+    return {"drift": reconcile_stats(get_database())["drift"]}
+
+@celery_app.task(rate_limit=ALERT_BATCH_RATE_LIMIT)
+def send_alert_batch(alert_id: str, messages: list) -> dict:
+    """Send one batch of an alert's messages over pooled SMTP connections.
+
+    Errors are returned rather than raised, so the chord's finalize_alert
+    callback still runs and can mark the alert failed.
+
+    Returns:
+        dict: sent, failed and seconds for the batch, plus error if the batch failed
+    """
+    from app.config.database import get_database
+    from app.services.alert_fanout import send_batch
+
+    try:
+        return send_batch(get_database(), alert_id, messages)
+    except Exception as e:
+        print(f"Error in send_alert_batch for alert {alert_id}: {e}")
+        return {"sent": 0, "failed": len(messages), "seconds": 0.0, "error": str(e)}
+
+@celery_app.task
+def finalize_alert(batch_results: list, alert_id: str) -> dict:
+    """Chord callback recording an alert's delivery time and throughput.
+
+    Args:
+        batch_results: Results of every send_alert_batch subtask
+        alert_id: ID of the alert
+    """
+    from app.config.database import get_database
+    from app.services.alert_fanout import finalize_alert as record_delivery
+
+    return record_delivery(get_database(), alert_id, batch_results)
+
+@celery_app.task
+def detect_market_anomalies() -> dict:
+    """Periodic task folding new VIX, ^TNX and ^IRX closes into the anomaly engine.
+
+    Returns:
+        dict: Per indicator, the new observations processed and alerts fired
+    """
+    from app.config.database import get_database
+    from app.services.anomaly import detect_anomalies
+
+    return detect_anomalies(get_database())
@@ -0,0 +1,136 @@
+"""Authenticated-user resolution for protected routes.
+
+`get_current_user` is a FastAPI dependency resolving the bearer token of a
+request to its user document. Doing that from scratch costs a JWT decode and
+a `users.find_one` per request, so both steps are cached in-process:
+- decoded tokens (token -> email and expiry), never used past the expiry,
+- user documents (email -> user, without password and verification token).
+
+Both caches are size-bounded with a short TTL. Writes that change what a
+protected route may rely on (email verification, tranches added to or removed
+from a user) call `invalidate_user`; other API workers keep their copy until
+the TTL expires, which bounds staleness to AUTH_USER_CACHE_TTL_SECONDS.
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Optional
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt
+from app.config.database import get_async_database
+from app.services.auth_service import verify_token
+
+logger = logging.getLogger(__name__)
+
+# Cache settings
+AUTH_TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", 300))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", 30))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+# User fields never kept in the cache or handed to routes
+USER_PROJECTION = {"password": 0, "verification_token": 0}
+
+# OAuth2 authentication scheme (tokens are issued by POST /auth/login)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+
+class UserCache:
+    """Thread-safe TTL caches of decoded tokens and user documents."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_MAX_ENTRIES,
+                 token_ttl: int = AUTH_TOKEN_CACHE_TTL_SECONDS, user_ttl: int = AUTH_USER_CACHE_TTL_SECONDS):
+        self._tokens = TTLCache(maxsize=maxsize, ttl=token_ttl)
+        self._users = TTLCache(maxsize=maxsize, ttl=user_ttl)
+        self._emails = {}  # user id -> email, to invalidate by id
+        self._lock = threading.Lock()
+
+    def get_email(self, token: str) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(token)
+        if entry is None:
+            return None
+        email, expires_at = entry
+        return email if expires_at > time.time() else None
+
+    def set_email(self, token: str, email: str, expires_at: float) -> None:
+        with self._lock:
+            self._tokens[token] = (email, expires_at)
+
+    def get_user(self, email: str) -> Optional[dict]:
+        with self._lock:
+            return self._users.get(email)
+
+    def set_user(self, user: dict) -> None:
+        with self._lock:
+            self._users[user["email"]] = user
+            self._emails[user["_id"]] = user["email"]
+            if len(self._emails) > 2 * self._users.maxsize:
+                self._emails = {user["_id"]: user["email"] for user in self._users.values()}
+
+    def invalidate(self, email: Optional[str] = None, user_id=None) -> None:
+        with self._lock:
+            if email is None and user_id is not None:
+                email = self._emails.pop(user_id, None)
+            if email is not None:
+                self._users.pop(email, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+            self._emails.clear()
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(email: Optional[str] = None, user_id=None) -> None:
+    """Drop a user's cached document after a write that changes it (by email or ObjectId)."""
+    user_cache.invalidate(email=email, user_id=user_id)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def resolve_token(token: str) -> Optional[str]:
+    """Return the email a token was issued for, or None if it is invalid or expired."""
+    email = user_cache.get_email(token)
+    if email is not None:
+        return email
+    email = verify_token(token)
+    if email is not None:
+        user_cache.set_email(token, email, float(jwt.get_unverified_claims(token).get("exp", 0)))
+    return email
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """Resolve the request's bearer token to the (verified) user document.
+
+    Returns:
+        dict: The user, without password and verification token
+
+    Raises:
+        HTTPException: 401 for a missing, invalid or expired token or an unknown
+            user, 403 if the user's email is not verified
+    """
+    email = resolve_token(token)
+    if email is None:
+        raise _unauthorized("Invalid or expired token")
+
+    user = user_cache.get_user(email)
+    if user is None:
+        user = await get_async_database()["users"].find_one({"email": email}, USER_PROJECTION)
+        if user is None:
+            raise _unauthorized("User not found")
+        user_cache.set_user(user)
+
+    if not user.get("is_verified", False):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email not verified")
+    return user
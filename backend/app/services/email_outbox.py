@@ -0,0 +1,300 @@
+"""Email outbox with pooled SMTP delivery.
+
+Requests never talk to the SMTP server. `enqueue_email` stores the message in
+the `email_outbox` collection and wakes the outbox worker, so registration
+costs one insert. Delivery is done by `OutboxWorker`, an asyncio task:
+- it claims up to EMAIL_BATCH_SIZE due messages at a time (a lease, so several
+  API workers or a standalone worker can drain the same outbox safely),
+- sends them over EMAIL_SMTP_CONNECTIONS persistent aiosmtplib connections,
+  which stay open (logged in, after STARTTLS) across batches until idle for
+  EMAIL_SMTP_IDLE_SECONDS,
+- marks each message sent, or schedules a retry with exponential backoff; after
+  EMAIL_MAX_ATTEMPTS attempts (or a permanent SMTP rejection) it is marked failed.
+
+Messages are deduplicated by `_id`: callers pass a key (e.g. one per user
+registration) and enqueueing the same key again is a no-op. The key is also the
+Message-ID, so a message re-sent after a crash between sending and marking it
+sent can be recognized by receivers.
+
+The worker runs inside the API (EMAIL_OUTBOX_WORKER=true) or on its own:
+
+    python -m app.services.email_outbox
+
+For local testing point SMTP_SERVER/SMTP_PORT at a debugging server, e.g.
+`python -m aiosmtpd -n -l localhost:1025` with SMTP_STARTTLS=false and no EMAIL_PASSWORD.
+"""
+
+import os
+import re
+import uuid
+import asyncio
+import logging
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Optional
+import aiosmtplib
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.services.email_service import EMAIL_ADDRESS, EMAIL_PASSWORD, SMTP_PORT, SMTP_SERVER, SMTP_STARTTLS
+from app.services.loan_versioning import utc_now
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "email_outbox"
+
+# Worker settings
+EMAIL_OUTBOX_WORKER = os.getenv("EMAIL_OUTBOX_WORKER", "true").lower() == "true"
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_SMTP_CONNECTIONS = int(os.getenv("EMAIL_SMTP_CONNECTIONS", 2))
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", 60))
+EMAIL_SMTP_TIMEOUT_SECONDS = float(os.getenv("EMAIL_SMTP_TIMEOUT_SECONDS", 30))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", 5))
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", 120))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", 30))
+
+# SMTP refusals that will not succeed on a retry when the reply is 5xx (4xx is transient)
+_PERMANENT_ERRORS = (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused, aiosmtplib.SMTPDataError)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Whether an SMTP error is a permanent (5xx) refusal; all refused recipients must be 5xx."""
+    if not isinstance(error, _PERMANENT_ERRORS):
+        return False
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(refused.code >= 500 for refused in error.recipients)
+    return error.code >= 500
+
+
+async def enqueue_email(db, to: str, subject: str, body: str, dedupe_key: Optional[str] = None) -> bool:
+    """Queue an email for delivery.
+
+    Args:
+        db: Motor database
+        to: Recipient address
+        subject: Subject line
+        body: Plain-text body
+        dedupe_key: Outbox id; a message with the same key is only queued once
+
+    Returns:
+        bool: True if queued, False if a message with this key already exists
+    """
+    now = utc_now()
+    try:
+        await db[OUTBOX_COLLECTION].insert_one({
+            "_id": dedupe_key or uuid.uuid4().hex,
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    except DuplicateKeyError:
+        return False
+    outbox_worker.wake()
+    return True
+
+
+def _due_filter(now) -> dict:
+    """Pending messages that are due, and messages whose sender's lease expired."""
+    return {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "lease_until": {"$lte": now}},
+    ]}
+
+
+async def claim_batch(db, limit: int = EMAIL_BATCH_SIZE) -> list:
+    """Lease up to `limit` due messages to this worker and return them."""
+    now = utc_now()
+    candidates = await db[OUTBOX_COLLECTION].find(_due_filter(now), {"_id": 1}).limit(limit).to_list(length=limit)
+    if not candidates:
+        return []
+    claim = uuid.uuid4().hex
+    await db[OUTBOX_COLLECTION].update_many(
+        {"$and": [{"_id": {"$in": [c["_id"] for c in candidates]}}, _due_filter(now)]},
+        {"$set": {"status": "sending", "claim": claim, "lease_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)}},
+    )
+    return await db[OUTBOX_COLLECTION].find({"claim": claim, "status": "sending"}).to_list(length=limit)
+
+
+def build_message(document: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = EMAIL_ADDRESS
+    message["To"] = document["to"]
+    message["Subject"] = document["subject"]
+    message["Message-ID"] = make_msgid(idstring=re.sub(r"[^A-Za-z0-9.]", ".", str(document["_id"])))
+    message.set_content(document["body"])
+    return message
+
+
+class SMTPPool:
+    """A fixed number of persistent aiosmtplib connections, reconnected on demand."""
+
+    def __init__(self, size: int = EMAIL_SMTP_CONNECTIONS):
+        self.size = size
+        self._idle = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(None)  # slot without a connection yet
+        self.connects = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        start_tls = {"true": True, "false": False}.get(SMTP_STARTTLS)  # None: when offered
+        client = aiosmtplib.SMTP(
+            hostname=SMTP_SERVER, port=SMTP_PORT, start_tls=start_tls, timeout=EMAIL_SMTP_TIMEOUT_SECONDS,
+            username=EMAIL_ADDRESS if EMAIL_PASSWORD else None, password=EMAIL_PASSWORD or None,
+        )
+        await client.connect()
+        self.connects += 1
+        return client
+
+    async def send(self, message: EmailMessage) -> None:
+        """Send one message on a pooled connection; a connection that fails is dropped."""
+        client = await self._idle.get()
+        try:
+            if client is None or not client.is_connected:
+                client = await self._connect()
+            await client.send_message(message)
+        except Exception:
+            if client is not None:
+                client.close()
+            client = None
+            raise
+        finally:
+            self._idle.put_nowait(client)
+
+    async def close(self) -> None:
+        """Politely close every idle connection."""
+        for _ in range(self.size):
+            client = await self._idle.get()
+            if client is not None and client.is_connected:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
+            self._idle.put_nowait(None)
+
+
+def _result_update(document: dict, error: Optional[BaseException], now) -> tuple:
+    """Return the message's new status ("sent", "pending" for a retry, or "failed") and its update."""
+    match = {"_id": document["_id"], "claim": document["claim"]}
+    release = {"claim": "", "lease_until": ""}
+    attempts = document.get("attempts", 0) + 1
+    if error is None:
+        return "sent", UpdateOne(match, {"$set": {"status": "sent", "sent_at": now, "attempts": attempts},
+                                         "$unset": release})
+    if attempts >= EMAIL_MAX_ATTEMPTS or _is_permanent(error):
+        update = {"status": "failed"}
+    else:
+        update = {"status": "pending",
+                  "next_attempt_at": now + timedelta(seconds=EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))}
+    return update["status"], UpdateOne(
+        match, {"$set": {**update, "attempts": attempts, "last_error": str(error)[:500]}, "$unset": release}
+    )
+
+
+async def deliver_batch(db, pool: SMTPPool, documents: list) -> dict:
+    """Send a claimed batch concurrently over the pool and record the outcome of each message.
+
+    Returns:
+        dict: sent, retried and failed counts
+    """
+    errors = await asyncio.gather(*(pool.send(build_message(d)) for d in documents), return_exceptions=True)
+    now = utc_now()
+    operations, counts = [], {"sent": 0, "retried": 0, "failed": 0}
+    for document, error in zip(documents, errors):
+        status, operation = _result_update(document, error, now)
+        operations.append(operation)
+        counts["retried" if status == "pending" else status] += 1
+        if error is not None:
+            logger.warning(f"Email {document['_id']} to {document['to']} failed ({status}): {error}")
+    if operations:
+        await db[OUTBOX_COLLECTION].bulk_write(operations, ordered=False)
+    return counts
+
+
+async def drain_outbox(db, pool: SMTPPool) -> dict:
+    """Deliver batches until no message is due.
+
+    Returns:
+        dict: Total sent, retried and failed counts
+    """
+    totals = {"sent": 0, "retried": 0, "failed": 0}
+    while True:
+        documents = await claim_batch(db)
+        if not documents:
+            return totals
+        for key, value in (await deliver_batch(db, pool, documents)).items():
+            totals[key] += value
+
+
+class OutboxWorker:
+    """Background task draining the outbox when woken, and every EMAIL_POLL_SECONDS."""
+
+    def __init__(self):
+        self._task = None
+        self._wake = None
+        self.pool = None
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self, db=None) -> None:
+        """Start the worker on the running event loop."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self.pool = SMTPPool()
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            await self.pool.close()
+            self._task = self._wake = None
+
+    async def _run(self, db) -> None:
+        if db is None:
+            from app.config.database import get_async_database
+            db = get_async_database()
+        idle = 0.0
+        while True:
+            try:
+                totals = await drain_outbox(db, self.pool)
+                if any(totals.values()):
+                    logger.info(f"Email outbox delivered a batch: {totals}")
+                    idle = 0.0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Email outbox delivery failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                idle += EMAIL_POLL_SECONDS
+                if idle >= EMAIL_SMTP_IDLE_SECONDS:
+                    await self.pool.close()
+                    idle = 0.0
+            self._wake.clear()
+
+
+outbox_worker = OutboxWorker()
+
+
+async def _run_standalone() -> None:
+    outbox_worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await outbox_worker.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone())
@@ -1,7 +1,9 @@
 """Email service module for sending verification emails.
 
-This module handles the configuration and sending of verification emails
-using SMTP. It requires proper SMTP server configuration through environment variables.
+This module handles the configuration and content of verification emails. The
+API queues them in the email outbox (app.services.email_outbox), which delivers
+them over pooled SMTP connections; `send_verification_email` sends one directly.
+It requires proper SMTP server configuration through environment variables.
 """
 
 import smtplib
@@ -22,12 +24,22 @@ logger = logging.getLogger(__name__)
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")  # Default to Gmail SMTP
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))  # Default to 587 for TLS
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")  # may be empty for a local debugging server
+# STARTTLS: "true", "false", or "auto" (upgrade when the server offers it)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "auto").lower()
+VERIFICATION_LINK_BASE = os.getenv("VERIFICATION_LINK_BASE", "http://localhost:5173/verify")
 
 # Ensure required environment variables are set
-if not EMAIL_ADDRESS or not EMAIL_PASSWORD or not SMTP_SERVER:
+if not EMAIL_ADDRESS or not SMTP_SERVER:
     raise ValueError("Missing required email configuration. Check your .env file.")
 
+
+def verification_email(token: str) -> tuple:
+    """Return the (subject, body) of the verification email for a token."""
+    verification_link = f"{VERIFICATION_LINK_BASE}?token={token}"
+    return "Verify Your Email", f"Please verify your email by clicking the following link:\n\n{verification_link}"
+
+
 def send_verification_email(email: str, token: str) -> None:
     """Send an email verification link to the specified email address.
 
@@ -48,9 +60,7 @@ def send_verification_email(email: str, token: str) -> None:
     Note:
         The function logs success or failure information using the module's logger.
     """
-    subject = "Verify Your Email"
-    verification_link = f"http://localhost:5173/verify?token={token}"
-    body = f"Please verify your email by clicking the following link:\n\n{verification_link}"
+    subject, body = verification_email(token)
 
     msg = MIMEMultipart()
     msg["From"] = EMAIL_ADDRESS
@@ -60,8 +70,11 @@ def send_verification_email(email: str, token: str) -> None:
 
     try:
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+            server.ehlo()
+            if SMTP_STARTTLS == "true" or (SMTP_STARTTLS == "auto" and server.has_extn("starttls")):
+                server.starttls()
+            if EMAIL_PASSWORD:
+                server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
             server.sendmail(EMAIL_ADDRESS, email, msg.as_string())
         logger.info(f"Verification email sent successfully to {email}.")
     except Exception as e:
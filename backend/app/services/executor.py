@@ -0,0 +1,148 @@
+"""Bounded process pools for CPU-bound request work.
+
+This module provides a small wrapper around ProcessPoolExecutor that:
+- pre-warms every worker process at startup (running its initializer once),
+- limits how many jobs may be queued or running, rejecting new work when full,
+- lets async routes await results without blocking the event loop.
+
+Keeping CPU-heavy work in separate processes means it no longer competes for the
+GIL with the cheap CRUD requests served by the API worker.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long start() waits for every worker to come up
+WARM_UP_TIMEOUT_SECONDS = 120
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already holds its maximum number of pending jobs."""
+
+
+def _warm_up(hold: float) -> int:
+    """Warm-up job: keeps the worker busy for `hold` seconds and returns its pid."""
+    time.sleep(hold)
+    return os.getpid()
+
+
+class BoundedProcessPool:
+    """Process pool with a queue-depth limit and explicit start-up/shutdown.
+
+    With `max_workers=0` jobs run in the API process's threadpool instead, which
+    keeps development and single-process deployments simple.
+
+    Args:
+        name: Pool name used in logs and errors
+        max_workers: Number of worker processes (0 runs jobs in-process)
+        max_pending: Maximum number of queued plus running jobs
+        initializer: Optional callable run once in every worker (and once in-process
+            when max_workers is 0) to preload models or configuration
+        start_method: multiprocessing start method ("spawn", "forkserver" or "fork")
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, initializer=None,
+                 start_method: str = "spawn"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self.start_method = start_method
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        """Create the worker processes and wait until each one is initialized (blocking)."""
+        with self._start_lock:
+            if self._started:
+                return
+            if self.max_workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=self.initializer,
+                )
+                # Submitting one job per worker while none is idle makes the pool spawn them all now;
+                # keep submitting until every worker has finished its initializer and answered.
+                pids = set()
+                deadline = time.monotonic() + WARM_UP_TIMEOUT_SECONDS
+                while len(pids) < self.max_workers and time.monotonic() < deadline:
+                    jobs = [self._executor.submit(_warm_up, 0.05) for _ in range(self.max_workers)]
+                    pids.update(job.result() for job in jobs)
+                logger.info(f"Process pool '{self.name}' warmed up with {len(pids)} of {self.max_workers} worker(s).")
+            elif self.initializer is not None:
+                self.initializer()
+                logger.info(f"Process pool '{self.name}' running in-process (no workers).")
+            self._started = True
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling jobs that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._started = False
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorSaturated(f"Process pool '{self.name}' is full ({self.max_pending} pending jobs).")
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` in the pool and await its result.
+
+        Args:
+            fn: Module-level (picklable) function to run
+            *args: Picklable positional arguments
+
+        Returns:
+            The function's return value.
+
+        Raises:
+            ExecutorSaturated: If the pool already holds max_pending jobs
+            Exception: Whatever the job raised
+        """
+        if not self._started:
+            # Used before the startup hook (benchmarks, Celery): warm up off the event loop
+            await run_in_threadpool(self.start)
+        self._acquire()
+        if self._executor is None:
+            try:
+                # The threadpool call completes even if the awaiting request is cancelled
+                return await run_in_threadpool(fn, *args)
+            finally:
+                self._release()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # A cancelled request does not stop a running job: release when the job itself is done
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """Return the pool's size and current queue depth."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "started": self._started,
+            }
@@ -0,0 +1,219 @@
+"""Bulk loan update and delete service.
+
+Many-loan changes are expressed as `UpdateMany`/`DeleteMany` operations
+(ids are grouped into `$in` lists) and sent with unordered `bulk_write`
+calls in chunks, instead of one or two round trips per loan. One change
+notification is published per request, listing only the loans that were
+actually modified or removed.
+
+Updates bump each loan's version fields (one change number per operation);
+deletes record tombstones for the loans they actually removed so the change
+feed reports them, and release those loans' tranche reservations.
+"""
+
+import os
+import logging
+from pymongo import DeleteMany, UpdateMany
+from pymongo.errors import BulkWriteError
+from app.services import loan_events
+from app.services.loan_reservations import release_deleted_loans
+from app.services.loan_query import LoanQueryError, build_loan_filter, parse_object_ids
+from app.services.loan_versioning import record_tombstones, reserve_change_seqs, utc_now, versioned_update
+
+logger = logging.getLogger(__name__)
+
+# Bulk operation settings
+LOAN_BULK_IDS_PER_OP = int(os.getenv("LOAN_BULK_IDS_PER_OP", 1000))  # ids in one $in clause
+LOAN_BULK_OPS_PER_WRITE = int(os.getenv("LOAN_BULK_OPS_PER_WRITE", 500))  # operations per bulk_write call
+
+
+def build_selectors(ids, filter_spec) -> tuple:
+    """Turn ids and/or a filter expression into MongoDB selectors.
+
+    Ids are chunked into `$in` clauses; when both ids and a filter are given,
+    a loan must match both.
+
+    Returns:
+        tuple: (list of selector dicts, list of invalid id strings)
+
+    Raises:
+        LoanQueryError: If neither ids nor a non-empty filter is given, or the filter is invalid
+    """
+    query = build_loan_filter(filter_spec)
+    if ids is None:
+        if not query:
+            raise LoanQueryError("Provide loan ids or a non-empty filter.")
+        return [query], []
+
+    object_ids, invalid = parse_object_ids(ids)
+    selectors = [
+        {**query, "_id": {"$in": object_ids[start:start + LOAN_BULK_IDS_PER_OP]}}
+        for start in range(0, len(object_ids), LOAN_BULK_IDS_PER_OP)
+    ]
+    return selectors, invalid
+
+
+async def _execute(collection, operations: list, labels: list, totals: dict) -> list:
+    """Run operations with unordered bulk_write calls, accumulating counts and errors.
+
+    Returns:
+        list: (start, end, removed) per bulk_write call, for operations[start:end];
+            removed is None when the call failed without a result
+    """
+    results = []
+    for start in range(0, len(operations), LOAN_BULK_OPS_PER_WRITE):
+        chunk = operations[start:start + LOAN_BULK_OPS_PER_WRITE]
+        try:
+            result = await collection.bulk_write(chunk, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get("writeErrors", []):
+                totals["failed"] += 1
+                totals["errors"].append({**labels[start + error["index"]], "error": error.get("errmsg")})
+        except Exception as e:
+            logger.error(f"bulk_write of {len(chunk)} loan operations failed: {str(e)}")
+            totals["failed"] += len(chunk)
+            totals["errors"].extend({**label, "error": str(e)} for label in labels[start:start + len(chunk)])
+            results.append((start, start + len(chunk), None))
+            continue
+        totals["matched"] += details.get("nMatched", 0)
+        totals["modified"] += details.get("nModified", 0)
+        totals["deleted"] += details.get("nRemoved", 0)
+        results.append((start, start + len(chunk), details.get("nRemoved", 0)))
+    return results
+
+
+def _invalid_id_errors(invalid: list, label: dict) -> list:
+    return [{**label, "id": loan_id, "error": "Invalid loan ID format"} for loan_id in invalid]
+
+
+async def bulk_update_loans(collection, updates: list) -> dict:
+    """Apply many patches with chunked, unordered bulk writes.
+
+    Args:
+        collection: Motor loans collection
+        updates: LoanBulkUpdateItem objects (ids and/or filter plus a patch)
+
+    Returns:
+        dict: matched, modified and failed counts (invalid ids plus operations
+            the server rejected) and the corresponding errors
+
+    Raises:
+        LoanQueryError: If an update has no selector, an invalid filter or an empty patch
+    """
+    selected, labels = [], []
+    totals = {"matched": 0, "modified": 0, "deleted": 0, "failed": 0, "errors": []}
+    by_filter = False
+    for index, item in enumerate(updates):
+        patch = item.patch.dict(exclude_unset=True)
+        if not patch:
+            raise LoanQueryError(f"Update {index} has an empty patch.")
+        selectors, invalid = build_selectors(item.ids, item.filter)
+        totals["failed"] += len(invalid)
+        totals["errors"].extend(_invalid_id_errors(invalid, {"update": index}))
+        for selector in selectors:
+            selected.append((selector, patch))
+            labels.append({"update": index})
+        if item.ids is None:
+            by_filter = True
+
+    operations = []
+    if selected:
+        first_seq = await reserve_change_seqs(collection.database, len(selected))
+        now = utc_now()
+        operations = [
+            UpdateMany(selector, versioned_update(patch, first_seq + offset, now))
+            for offset, (selector, patch) in enumerate(selected)
+        ]
+    await _execute(collection, operations, labels, totals)
+    logger.info(f"Bulk update: {totals['matched']} matched, {totals['modified']} modified, {totals['failed']} failed")
+    changed_ids = None
+    if totals["modified"] and not by_filter:
+        changed_ids = await _changed_ids(collection, first_seq, len(selected))
+    loan_events.publish("update", totals["modified"], changed_ids)
+    totals.pop("deleted")
+    return totals
+
+
+async def _changed_ids(collection, first_seq: int, count: int) -> list:
+    """Return the ids of loans stamped with one of the request's change numbers.
+
+    Every modified loan carries the change_seq of its operation, so the loans
+    still holding one of first_seq .. first_seq + count - 1 are exactly the ones
+    this request changed (minus any a later write has already re-stamped and
+    published). The lookup is served by the change feed index.
+    """
+    query = {"change_seq": {"$gte": first_seq, "$lt": first_seq + count}}
+    return [str(loan["_id"]) async for loan in collection.find(query, {"_id": 1})]
+
+
+async def _deleted_ids(collection, id_chunks: list, results: list) -> list:
+    """Return the ids the delete operations actually removed.
+
+    A bulk_write that removed every loan it targeted needs no further read; after
+    a partial or failed one, the loans still present are looked up and left out.
+    """
+    deleted = []
+    for start, end, removed in results:
+        ids = [loan_id for chunk in id_chunks[start:end] for loan_id in chunk]
+        if removed == len(ids):
+            deleted.extend(ids)
+        elif removed != 0:
+            remaining = {loan["_id"] async for loan in collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+            deleted.extend(loan_id for loan_id in ids if loan_id not in remaining)
+    return deleted
+
+
+async def _delete_chunk(collection, chunk: list, totals: dict) -> list:
+    """Delete one chunk of loan ids, tombstone and release the ones removed, and return them."""
+    results = await _execute(collection, [DeleteMany({"_id": {"$in": chunk}})], [{}], totals)
+    deleted = await _deleted_ids(collection, [chunk], results)
+    if deleted:
+        await record_tombstones(collection.database, deleted,
+                                await reserve_change_seqs(collection.database, len(deleted)))
+        await release_deleted_loans(collection.database, deleted)
+    return deleted
+
+
+async def bulk_delete_loans(collection, ids=None, filter_spec=None) -> dict:
+    """Delete many loans with chunked, unordered bulk writes.
+
+    Args:
+        collection: Motor loans collection
+        ids: Loan id strings to delete
+        filter_spec: Filter expression selecting loans to delete
+
+    Returns:
+        dict: deleted and failed counts plus per-id errors
+
+    Raises:
+        LoanQueryError: If neither ids nor a non-empty filter is given, or the filter is invalid
+    """
+    selectors, invalid = build_selectors(ids, filter_spec)
+    totals = {"matched": 0, "modified": 0, "deleted": 0, "failed": len(invalid), "errors": _invalid_id_errors(invalid, {})}
+
+    # Resolve the selectors to ids one chunk at a time, so each deleted loan gets
+    # a tombstone without holding every matched id in memory. Filter deletes
+    # publish no id list (like filter updates); id deletes list what was removed.
+    deleted_count = 0
+    deleted_ids = None if ids is None else []
+    for selector in selectors:
+        chunk = []
+        async for loan in collection.find(selector, {"_id": 1}).batch_size(LOAN_BULK_IDS_PER_OP):
+            chunk.append(loan["_id"])
+            if len(chunk) == LOAN_BULK_IDS_PER_OP:
+                deleted = await _delete_chunk(collection, chunk, totals)
+                deleted_count += len(deleted)
+                if deleted_ids is not None:
+                    deleted_ids.extend(str(loan_id) for loan_id in deleted)
+                chunk = []
+        if chunk:
+            deleted = await _delete_chunk(collection, chunk, totals)
+            deleted_count += len(deleted)
+            if deleted_ids is not None:
+                deleted_ids.extend(str(loan_id) for loan_id in deleted)
+
+    logger.info(f"Bulk delete: {totals['deleted']} deleted, {totals['failed']} failed")
+    loan_events.publish("delete", deleted_count, deleted_ids)
+    return {"deleted": totals["deleted"], "failed": totals["failed"], "errors": totals["errors"]}
@@ -0,0 +1,59 @@
+"""In-process loan change notifications.
+
+Loan write paths publish one event per request (a single loan or a whole
+batch), and components holding data derived from loans subscribe to refresh
+it. Bulk endpoints therefore trigger one refresh per batch instead of one per
+loan.
+
+An event is a dict with:
+- action: "insert", "update" or "delete"
+- count: number of loans affected
+- loan_ids: list of affected loan id strings, or None when the batch was
+  selected by a filter and the ids are not known
+"""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback: Callable[[dict], None]) -> None:
+    """Register a callback invoked with every loan change event."""
+    with _subscribers_lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[dict], None]) -> None:
+    """Remove a previously registered callback."""
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(action: str, count: int, loan_ids: Optional[list] = None) -> None:
+    """Notify subscribers that loans changed.
+
+    Nothing is published when no loan was affected. A failing subscriber is
+    logged and does not prevent the others from running.
+
+    Args:
+        action: "insert", "update" or "delete"
+        count: Number of loans affected
+        loan_ids: Affected loan ids, if known
+    """
+    if count <= 0:
+        return
+    event = {"action": action, "count": count, "loan_ids": loan_ids}
+    with _subscribers_lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Loan change subscriber {callback!r} failed: {str(e)}")
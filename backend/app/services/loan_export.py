@@ -0,0 +1,262 @@
+"""Loan listing and streaming export service.
+
+This module reads the loans collection in `_id` order, either one keyset page
+at a time (for the listing API) or as a stream of fixed-size batches that are
+encoded to NDJSON, CSV or Parquet as they arrive. Only one batch is held in
+memory at a time, whatever the size of the collection.
+
+Parquet output needs the optional `pyarrow` dependency, imported lazily. Its
+column types come from the data actually stored, not from the Loan model.
+"""
+
+import os
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from bson import ObjectId
+from app.services.loan_query import LOAN_FIELDS, METADATA_FIELDS, LoanQueryError
+
+logger = logging.getLogger(__name__)
+
+# Listing and export settings
+LOAN_PAGE_DEFAULT_LIMIT = int(os.getenv("LOAN_PAGE_DEFAULT_LIMIT", 100))
+LOAN_PAGE_MAX_LIMIT = int(os.getenv("LOAN_PAGE_MAX_LIMIT", 1000))
+LOAN_EXPORT_BATCH_SIZE = int(os.getenv("LOAN_EXPORT_BATCH_SIZE", 5000))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _serialize(loan: dict) -> dict:
+    """Convert the loan's ObjectId to a string for output."""
+    if isinstance(loan.get("_id"), ObjectId):
+        loan["_id"] = str(loan["_id"])
+    return loan
+
+
+def _keyset_query(query: dict, after: Optional[ObjectId]) -> dict:
+    """Restrict a query to loans after the keyset cursor."""
+    if after is None:
+        return query
+    return {"$and": [query, {"_id": {"$gt": after}}]} if query else {"_id": {"$gt": after}}
+
+
+async def list_loans_page(collection, query: dict, projection: Optional[dict], after: Optional[ObjectId],
+                          limit: int) -> dict:
+    """Fetch one page of loans in `_id` order.
+
+    Args:
+        collection: Motor loans collection
+        query: MongoDB filter
+        projection: Optional projection
+        after: Cursor (last id of the previous page) or None for the first page
+        limit: Page size
+
+    Returns:
+        dict: loans (with string ids) and next_cursor (None on the last page)
+    """
+    cursor = collection.find(_keyset_query(query, after), projection).sort("_id", 1).limit(limit + 1)
+    loans = await cursor.to_list(length=limit + 1)
+    has_more = len(loans) > limit
+    loans = [_serialize(loan) for loan in loans[:limit]]
+    return {
+        "loans": loans,
+        "next_cursor": loans[-1]["_id"] if has_more else None,
+    }
+
+
+async def iter_loan_batches(collection, query: dict, projection: Optional[dict],
+                            batch_size: int = LOAN_EXPORT_BATCH_SIZE) -> AsyncIterator[list]:
+    """Yield lists of at most batch_size loans, read with a single cursor in `_id` order."""
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    async for loan in cursor:
+        batch.append(_serialize(loan))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_columns(projection: Optional[dict]) -> list:
+    """Return the output columns for CSV and Parquet exports."""
+    if projection:
+        return ["_id"] + [name for name in projection if name != "_id"]
+    return list(METADATA_FIELDS) + list(LOAN_FIELDS)
+
+
+async def _ndjson_stream(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(json.dumps(loan, default=str) + "\n" for loan in batch).encode("utf-8")
+
+
+async def _csv_stream(batches: AsyncIterator[list], columns: list) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes can be drained between writes.
+
+    Unlike a truncated BytesIO, `tell()` keeps counting every byte ever written,
+    which the Parquet writer relies on for the offsets in the file footer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# BSON types (as reported by $type) that each Parquet column type can hold without loss
+_INTEGER_TYPES = {"int", "long"}
+_NUMBER_TYPES = {"int", "long", "double", "decimal"}
+
+
+async def _stored_types(collection, query: dict, columns: list) -> dict:
+    """Return the set of BSON types stored in each column of the matching loans (one aggregation)."""
+    keys = {f"c{index}": name for index, name in enumerate(columns)}
+    pipeline = [
+        {"$match": query},
+        {"$project": {key: {"$type": f"${name}"} for key, name in keys.items()}},
+        {"$group": {"_id": None, **{key: {"$addToSet": f"${key}"} for key in keys}}},
+    ]
+    result = await collection.aggregate(pipeline).to_list(length=1)
+    types = result[0] if result else {}
+    return {name: set(types.get(key, [])) - {"missing", "null"} for key, name in keys.items()}
+
+
+def _parquet_column(declared, stored: set) -> tuple:
+    """Pick a column's Arrow type from the types actually stored, and the converter for its values.
+
+    Integer columns holding fractional values become float64, and columns mixing
+    kinds (e.g. strings in a numeric field) become strings, so no value is ever
+    truncated or rejected mid-stream.
+    """
+    import pyarrow as pa
+
+    if not stored:
+        stored = {{int: "int", float: "double", datetime: "date"}.get(declared, "string")}
+    if stored <= _INTEGER_TYPES:
+        return pa.int64(), int
+    if stored <= _NUMBER_TYPES:
+        return pa.float64(), float
+    if stored == {"date"}:
+        return pa.timestamp("ms"), None
+    if stored == {"bool"}:
+        return pa.bool_(), None
+    return pa.string(), str
+
+
+async def parquet_layout(collection, query: dict, columns: list) -> tuple:
+    """Infer the Parquet schema from the stored data before anything is streamed.
+
+    Costs one extra aggregation over the matching loans. Loans written with
+    other types while the export runs may still fail the stream.
+
+    Returns:
+        tuple: (pyarrow schema, {column: converter or None})
+    """
+    import pyarrow as pa
+
+    fields = {**METADATA_FIELDS, **LOAN_FIELDS}
+    stored = await _stored_types(collection, query, columns)
+    layout = {name: _parquet_column(fields.get(name), stored[name]) for name in columns}
+    schema = pa.schema([(name, arrow_type) for name, (arrow_type, _) in layout.items()])
+    return schema, {name: convert for name, (_, convert) in layout.items()}
+
+
+def _parquet_table(batch: list, schema, converters: dict):
+    """Build a row group, converting each value explicitly to its column's type."""
+    import pyarrow as pa
+
+    columns = {}
+    for name, convert in converters.items():
+        values = [loan.get(name) for loan in batch]
+        columns[name] = [None if value is None else convert(value) for value in values] if convert else values
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+async def _parquet_stream(batches: AsyncIterator[list], schema, converters: dict) -> AsyncIterator[bytes]:
+    """Write one Parquet row group per batch and yield the bytes produced so far."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        async for batch in batches:
+            writer.write_table(_parquet_table(batch, schema, converters))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+async def stream_export(collection, query: dict, projection: Optional[dict], fmt: str,
+                        batch_size: int = LOAN_EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Return an async byte stream exporting the matching loans.
+
+    For Parquet the column types are inferred from the stored data first (see
+    parquet_layout), so type problems surface before the response starts.
+
+    Args:
+        collection: Motor loans collection
+        query: MongoDB filter
+        projection: Optional projection
+        fmt: "ndjson", "csv" or "parquet"
+        batch_size: Loans read and encoded per batch
+
+    Returns:
+        AsyncIterator[bytes]: Encoded export, suitable for a StreamingResponse
+
+    Raises:
+        LoanQueryError: For an unknown format, or parquet without pyarrow installed
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise LoanQueryError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}.")
+
+    batches = iter_loan_batches(collection, query, projection, batch_size)
+    if fmt == "ndjson":
+        return _ndjson_stream(batches)
+    if fmt == "csv":
+        return _csv_stream(batches, export_columns(projection))
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise LoanQueryError("Parquet export requires the 'pyarrow' package.")
+    schema, converters = await parquet_layout(collection, query, export_columns(projection))
+    return _parquet_stream(batches, schema, converters)
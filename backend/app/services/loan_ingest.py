@@ -0,0 +1,350 @@
+"""Bulk loan ingestion service.
+
+This module streams NDJSON or CSV loan tapes into the loans collection:
+- the request body is read incrementally and split into lines (CSV records
+  may span lines inside quoted fields and are never split across batches),
+- lines are parsed and validated in columnar batches (one pandas pass per
+  column instead of one Pydantic model per row), in a worker thread,
+- valid rows are written with unordered `insert_many` in fixed-size chunks,
+  with a bounded number of inserts in flight so a slow database pauses
+  reading of the request body instead of buffering it in memory,
+- every rejected row is reported with its line number and reasons.
+"""
+
+import os
+import csv
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+import numpy as np
+import pandas as pd
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+from app.services.loan_query import LOAN_FIELDS, REQUIRED_FIELDS
+from app.services.loan_versioning import reserve_change_seqs, stamp_new_loan, utc_now
+
+logger = logging.getLogger(__name__)
+
+# Ingestion settings
+LOAN_INGEST_BATCH_SIZE = int(os.getenv("LOAN_INGEST_BATCH_SIZE", 5000))  # rows validated together
+LOAN_INGEST_CHUNK_SIZE = int(os.getenv("LOAN_INGEST_CHUNK_SIZE", 1000))  # documents per insert_many
+LOAN_INGEST_MAX_INFLIGHT = int(os.getenv("LOAN_INGEST_MAX_INFLIGHT", 4))  # concurrent insert_many calls
+LOAN_INGEST_MAX_ERRORS = int(os.getenv("LOAN_INGEST_MAX_ERRORS", 1000))  # row errors listed in the report
+
+FORMATS = ("ndjson", "csv")
+CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+    "application/csv": "csv",
+}
+
+
+class LoanIngestError(Exception):
+    """Raised when a bulk upload cannot be processed at all (bad format or header)."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def resolve_format(fmt: Optional[str], content_type: Optional[str]) -> str:
+    """Pick the upload format from an explicit value or the request Content-Type.
+
+    Raises:
+        LoanIngestError: If the format is unknown
+    """
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise LoanIngestError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+        return fmt
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return CONTENT_TYPES.get(media_type, "ndjson")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """Split a stream of byte chunks into numbered text lines.
+
+    Yields:
+        tuple: (line number starting at 1, line text without the line ending)
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.rstrip(b"\r").decode("utf-8-sig" if line_no == 1 else "utf-8")
+    if buffer:
+        line_no += 1
+        yield line_no, buffer.rstrip(b"\r").decode("utf-8-sig" if line_no == 1 else "utf-8")
+
+
+def _csv_lines(lines: list):
+    """Give csv.reader its input lines back with their line endings, so quoted newlines survive."""
+    return (text + "\n" for text in lines)
+
+
+def quote_open(text: str, open_before: bool) -> bool:
+    """Whether a quoted CSV field is still open after `text` (each '"' toggles; "" escapes cancel out)."""
+    return open_before != (text.count('"') % 2 == 1)
+
+
+def parse_csv_header(lines: list) -> list:
+    """Parse and check the CSV header record (its text lines).
+
+    Raises:
+        LoanIngestError: If required loan columns are missing
+    """
+    header = [column.strip() for column in next(csv.reader(_csv_lines(lines)), [])]
+    missing = [name for name in REQUIRED_FIELDS if name not in header]
+    if missing:
+        raise LoanIngestError(f"CSV header is missing required columns: {', '.join(missing)}")
+    return header
+
+
+def parse_rows(fmt: str, lines: list, header: Optional[list] = None) -> tuple:
+    """Parse raw lines into row dictionaries.
+
+    CSV lines are parsed by csv.reader as one stream, so a quoted field may
+    span lines; a record is reported under the number of its first line.
+
+    Args:
+        fmt: "ndjson" or "csv"
+        lines: List of (line number, text) tuples; for CSV, whole records only
+        header: CSV column names (CSV only)
+
+    Returns:
+        tuple: (line numbers, row dicts, {line number: [errors]} for unparseable lines)
+    """
+    line_numbers, rows, errors = [], [], {}
+    if fmt == "csv":
+        reader = csv.reader(_csv_lines([text for _, text in lines]))
+        while True:
+            first = reader.line_num  # lines consumed before this record
+            try:
+                values = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                errors[lines[first][0]] = [f"invalid CSV: {e}"]
+                continue
+            if not values:  # blank line
+                continue
+            line_no = lines[first][0]
+            if len(values) != len(header):
+                errors[line_no] = [f"expected {len(header)} columns, got {len(values)}"]
+                continue
+            line_numbers.append(line_no)
+            rows.append(dict(zip(header, values)))
+        return line_numbers, rows, errors
+
+    for line_no, text in lines:
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            errors[line_no] = [f"invalid JSON: {e}"]
+            continue
+        if not isinstance(row, dict):
+            errors[line_no] = ["expected a JSON object"]
+            continue
+        line_numbers.append(line_no)
+        rows.append(row)
+    return line_numbers, rows, errors
+
+
+def _column_values(series: pd.Series, field_type, required: bool, errors: dict, line_numbers: np.ndarray,
+                   name: str) -> list:
+    """Validate and convert one column, recording per-row errors.
+
+    Returns:
+        list: Python values for the column, None where the value is missing or invalid
+    """
+    def flag(mask, message):
+        for line_no in line_numbers[np.asarray(mask, dtype=bool)]:
+            errors.setdefault(int(line_no), []).append(f"{name}: {message}")
+
+    missing = series.isna() | series.isin([""])
+    if required:
+        flag(missing, "field required")
+
+    if field_type is str:
+        is_text = series.map(lambda value: isinstance(value, str))
+        flag(~missing & ~is_text, "must be a string")
+        return series.where(is_text & ~missing, None).tolist()
+
+    numeric = pd.to_numeric(series.where(~missing), errors="coerce")
+    flag(~missing & numeric.isna(), "must be a number")
+    if field_type is int:
+        flag(numeric.notna() & (numeric % 1 != 0), "must be an integer")
+        return [int(value) if value == value else None for value in numeric.tolist()]
+    return [value if value == value else None for value in numeric.tolist()]
+
+
+def validate_batch(fmt: str, lines: list, header: Optional[list] = None) -> tuple:
+    """Parse and validate a batch of lines column by column.
+
+    Unknown columns are ignored, as they are for the single-loan endpoint.
+
+    Args:
+        fmt: "ndjson" or "csv"
+        lines: List of (line number, text) tuples
+        header: CSV column names (CSV only)
+
+    Returns:
+        tuple: (documents, their line numbers, {line number: [errors]})
+    """
+    line_numbers, rows, errors = parse_rows(fmt, lines, header)
+    if not rows:
+        return [], [], errors
+
+    frame = pd.DataFrame.from_records(rows)
+    numbers = np.asarray(line_numbers)
+    columns = {}
+    for name, field_type in LOAN_FIELDS.items():
+        if name in frame.columns:
+            series = frame[name]
+        elif name in REQUIRED_FIELDS:
+            series = pd.Series([None] * len(frame), dtype=object)
+        else:
+            continue
+        columns[name] = _column_values(series, field_type, name in REQUIRED_FIELDS, errors, numbers, name)
+
+    names = list(columns)
+    documents, document_lines = [], []
+    for line_no, values in zip(line_numbers, zip(*columns.values())):
+        if line_no in errors:
+            continue
+        documents.append({name: value for name, value in zip(names, values) if value is not None})
+        document_lines.append(line_no)
+    return documents, document_lines, errors
+
+
+class IngestReport:
+    """Running totals and row errors for one bulk upload."""
+
+    def __init__(self, max_errors: int = LOAN_INGEST_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self._started = time.perf_counter()
+
+    def add_errors(self, row_errors: dict) -> None:
+        """Record rejected rows, keeping at most max_errors entries in the report."""
+        self.failed += len(row_errors)
+        for line_no in sorted(row_errors):
+            if len(self.errors) >= self.max_errors:
+                break
+            self.errors.append({"line": line_no, "errors": row_errors[line_no]})
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self._started
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.received / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+async def _insert_chunk(collection, documents: list, lines: list, report: IngestReport) -> None:
+    """Insert one chunk without ordering, recording rows the database rejected.
+
+    The chunk reserves one block of change numbers and every loan is stamped
+    with its version fields before the insert.
+    """
+    try:
+        first_seq = await reserve_change_seqs(collection.database, len(documents))
+        now = utc_now()
+        for offset, document in enumerate(documents):
+            stamp_new_loan(document, first_seq + offset, now)
+        result = await collection.insert_many(documents, ordered=False)
+        report.inserted += len(result.inserted_ids)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        report.inserted += e.details.get("nInserted", len(documents) - len(write_errors))
+        report.add_errors({lines[error["index"]]: [error.get("errmsg", "write failed")] for error in write_errors})
+    except Exception as e:
+        logger.error(f"Bulk insert of {len(documents)} loans failed: {str(e)}")
+        report.add_errors({line_no: [f"insert failed: {str(e)}"] for line_no in lines})
+
+
+async def ingest_loans(collection, chunks: AsyncIterator[bytes], fmt: str,
+                       batch_size: int = LOAN_INGEST_BATCH_SIZE,
+                       chunk_size: int = LOAN_INGEST_CHUNK_SIZE,
+                       max_inflight: int = LOAN_INGEST_MAX_INFLIGHT) -> dict:
+    """Stream NDJSON or CSV loans from `chunks` into `collection`.
+
+    Args:
+        collection: Motor collection to insert into
+        chunks: Async iterator over the raw request body
+        fmt: "ndjson" or "csv"
+        batch_size: Rows parsed and validated together
+        chunk_size: Documents per insert_many call
+        max_inflight: Maximum concurrent insert_many calls; reading pauses when reached
+
+    Returns:
+        dict: Ingestion report (see IngestReport.to_dict)
+
+    Raises:
+        LoanIngestError: If the CSV header is missing or incomplete
+    """
+    report = IngestReport()
+    slots = asyncio.Semaphore(max_inflight)
+    pending = set()
+    header = None
+    header_lines = []
+    in_quotes = False  # a quoted CSV field continues on the next line
+    batch = []
+
+    async def flush(lines: list) -> None:
+        documents, document_lines, row_errors = await run_in_threadpool(validate_batch, fmt, lines, header)
+        report.add_errors(row_errors)
+        for start in range(0, len(documents), chunk_size):
+            await slots.acquire()  # backpressure: wait for a free insert slot before reading on
+            task = asyncio.create_task(_insert_chunk(
+                collection, documents[start:start + chunk_size], document_lines[start:start + chunk_size], report
+            ))
+            pending.add(task)
+            task.add_done_callback(lambda done: (pending.discard(done), slots.release()))
+
+    try:
+        async for line_no, text in iter_lines(chunks):
+            if not in_quotes and not text.strip():
+                continue
+            if fmt == "csv":
+                record_start = not in_quotes
+                in_quotes = quote_open(text, in_quotes)
+                if header is None:
+                    header_lines.append(text)
+                    if not in_quotes:
+                        header = parse_csv_header(header_lines)
+                    continue
+                report.received += record_start
+            else:
+                report.received += 1
+            batch.append((line_no, text))
+            if len(batch) >= batch_size and not in_quotes:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+    finally:
+        if pending:
+            await asyncio.gather(*pending)
+
+    logger.info(
+        f"Bulk ingest finished: {report.inserted} inserted, {report.failed} failed "
+        f"of {report.received} rows"
+    )
+    return report.to_dict()
@@ -0,0 +1,177 @@
+"""Loan query helpers.
+
+This module derives the loan field schema from the Pydantic loan models and
+turns user-supplied filter expressions, `min_`/`max_` range parameters and
+field lists into MongoDB queries and projections. Only known loan fields and
+a fixed set of comparison operators are accepted, so requests can never
+inject arbitrary query operators such as `$where`.
+"""
+
+from datetime import datetime
+from typing import Optional, get_args
+from bson import ObjectId
+from app.models.loan import Loan, LoanInput
+
+
+class LoanQueryError(ValueError):
+    """Raised for filter expressions that reference unknown fields or operators."""
+
+
+def _field_type(annotation):
+    """Return the scalar type behind an annotation such as Optional[int]."""
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    return args[0] if args else annotation
+
+
+# Column schema derived from the loan models: required fields come from LoanInput,
+# optional analytics fields from Loan.
+REQUIRED_FIELDS = {name: _field_type(field.annotation) for name, field in LoanInput.model_fields.items()}
+OPTIONAL_FIELDS = {
+    name: _field_type(field.annotation)
+    for name, field in Loan.model_fields.items()
+    if name != "id" and name not in REQUIRED_FIELDS
+}
+LOAN_FIELDS = {**REQUIRED_FIELDS, **OPTIONAL_FIELDS}
+NUMERIC_FIELDS = [name for name, field_type in LOAN_FIELDS.items() if field_type in (int, float)]
+
+# Fields maintained by the API rather than supplied by clients
+METADATA_FIELDS = {"_id": str, "version": int, "updated_at": datetime, "change_seq": int}
+
+FILTER_OPERATORS = {
+    "eq": "$eq",
+    "ne": "$ne",
+    "gt": "$gt",
+    "gte": "$gte",
+    "lt": "$lt",
+    "lte": "$lte",
+    "in": "$in",
+    "nin": "$nin",
+}
+
+
+def _check_value(field: str, value):
+    """Check that a filter value matches the field's type."""
+    field_type = LOAN_FIELDS[field]
+    if value is None:
+        return value
+    if field_type is str:
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if not valid:
+        raise LoanQueryError(f"Invalid value for {field}: {value!r}")
+    return value
+
+
+def build_loan_filter(spec: Optional[dict]) -> dict:
+    """Translate a filter expression into a MongoDB query on the loans collection.
+
+    Args:
+        spec: Mapping of loan field to either a value (equality) or an object of
+            operators, e.g. {"CreditScore": {"gte": 700, "lt": 800}}. Supported
+            operators: eq, ne, gt, gte, lt, lte, in, nin.
+
+    Returns:
+        dict: MongoDB query
+
+    Raises:
+        LoanQueryError: For unknown fields, operators or mistyped values
+    """
+    query = {}
+    for field, condition in (spec or {}).items():
+        if field not in LOAN_FIELDS:
+            raise LoanQueryError(f"Unknown loan field: {field}")
+        if not isinstance(condition, dict):
+            query[field] = _check_value(field, condition)
+            continue
+
+        clauses = {}
+        for operator, value in condition.items():
+            if operator not in FILTER_OPERATORS:
+                raise LoanQueryError(f"Unsupported operator '{operator}' for {field}")
+            if operator in ("in", "nin"):
+                if not isinstance(value, list):
+                    raise LoanQueryError(f"'{operator}' for {field} expects a list")
+                value = [_check_value(field, item) for item in value]
+            else:
+                value = _check_value(field, value)
+            clauses[FILTER_OPERATORS[operator]] = value
+        query[field] = clauses
+    return query
+
+
+def parse_object_ids(ids: list) -> tuple:
+    """Split loan id strings into valid ObjectIds and invalid strings.
+
+    Returns:
+        tuple: (list of ObjectId, list of invalid id strings)
+    """
+    valid, invalid = [], []
+    for loan_id in ids:
+        if ObjectId.is_valid(loan_id):
+            valid.append(ObjectId(loan_id))
+        else:
+            invalid.append(loan_id)
+    return valid, invalid
+
+
+def build_range_filter(params) -> dict:
+    """Build range conditions from `min_<field>`/`max_<field>` query parameters.
+
+    Args:
+        params: Mapping of query parameter names to string values; parameters
+            without a min_/max_ prefix are ignored
+
+    Returns:
+        dict: MongoDB query with $gte/$lte conditions on numeric loan fields
+
+    Raises:
+        LoanQueryError: For ranges on unknown or non-numeric fields, or non-numeric bounds
+    """
+    query = {}
+    for name, raw in params.items():
+        prefix, _, field = name.partition("_")
+        if prefix not in ("min", "max") or not field:
+            continue
+        if field not in NUMERIC_FIELDS:
+            raise LoanQueryError(f"Range filters are only supported on numeric loan fields, not '{field}'")
+        try:
+            value = int(raw) if LOAN_FIELDS[field] is int else float(raw)
+        except ValueError:
+            raise LoanQueryError(f"Invalid value for {name}: {raw!r}")
+        query.setdefault(field, {})["$gte" if prefix == "min" else "$lte"] = value
+    return query
+
+
+def build_projection(fields: Optional[str]) -> Optional[dict]:
+    """Build a projection from a comma-separated list of loan fields.
+
+    Args:
+        fields: e.g. "LoanAmount,CreditScore"; None or empty returns whole documents
+
+    Returns:
+        dict | None: MongoDB projection (the _id is always included)
+
+    Raises:
+        LoanQueryError: For unknown fields
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if not names:
+        return None
+    unknown = [name for name in names if name not in LOAN_FIELDS and name not in METADATA_FIELDS]
+    if unknown:
+        raise LoanQueryError(f"Unknown loan field(s): {', '.join(unknown)}")
+    return {name: 1 for name in names}
+
+
+def parse_cursor(after: Optional[str]) -> Optional[ObjectId]:
+    """Parse a keyset pagination cursor (the last loan id of the previous page).
+
+    Raises:
+        LoanQueryError: If the cursor is not a valid loan id
+    """
+    if not after:
+        return None
+    if not ObjectId.is_valid(after):
+        raise LoanQueryError("Invalid pagination cursor")
+    return ObjectId(after)
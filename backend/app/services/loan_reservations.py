@@ -0,0 +1,244 @@
+"""Loan reservation index.
+
+A loan may belong to at most one tranche. Every loan placed in a checked-out
+tranche is reserved by a document in `loan_reservations` whose `_id` is the
+loan id, so the unique `_id` index enforces the rule and a claim costs one
+index lookup per loan, however many tranches exist:
+- `claim_loans` reserves all loans of a checkout with one unordered bulk
+  upsert; loans already reserved by the same tranche are a no-op, loans held
+  by another tranche fail with a duplicate key error and make the checkout fail,
+- `release_tranche_loans` drops a tranche's reservations (tranche deleted, or
+  loans removed from it by a re-checkout),
+- `release_deleted_loans` drops the reservations and tranche memberships of
+  deleted loans,
+- `find_unreserved_loans` lets allocation and reports skip reserved loans in
+  the query itself (a `$lookup` on the reservation `_id` index per loan),
+- `backfill_reservations` reserves the loans of tranches written before
+  reservations existed; it runs once at startup and can be re-run with
+
+    python -m app.services.loan_reservations backfill
+
+The exclusion is not free: allocation already reads every loan, and the
+`$lookup` adds one index probe per loan on the server (no reservation ids are
+shipped to the client). A reserved flag on loans would make it an index scan,
+at the cost of a second write per claim and release.
+"""
+
+import logging
+import argparse
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.services import portfolio_service
+from app.services.loan_versioning import VERSION_FIELDS, utc_now
+
+logger = logging.getLogger(__name__)
+
+RESERVATIONS_COLLECTION = "loan_reservations"
+DUPLICATE_KEY_ERROR = 11000
+BACKFILL_MARKER = {"_id": "loan_reservations_backfill"}  # in `counters`, once the backfill has run
+BACKFILL_BATCH_SIZE = 1000  # reservation upserts per bulk_write
+
+
+class LoanReservationConflict(Exception):
+    """Raised when loans are already reserved by another tranche (or twice in one checkout)."""
+
+    def __init__(self, loan_ids: list):
+        super().__init__(f"{len(loan_ids)} loan(s) already belong to another tranche")
+        self.loan_ids = loan_ids
+
+
+def _duplicates(claims: dict) -> list:
+    """Loans listed in more than one tranche of the same checkout."""
+    seen, duplicates = set(), []
+    for loan_ids in claims.values():
+        for loan_id in set(loan_ids):
+            if loan_id in seen:
+                duplicates.append(loan_id)
+            seen.add(loan_id)
+    return duplicates
+
+
+async def claim_loans(db, claims: dict, session=None) -> list:
+    """Reserve loans for tranches, all or nothing.
+
+    Args:
+        db: Motor database
+        claims: {tranche id: [loan ids]}
+        session: Optional session (transactional checkout)
+
+    Returns:
+        list: Loan ids newly reserved by this call (for release_claims on a later failure)
+
+    Raises:
+        LoanReservationConflict: If any loan is reserved by another tranche; the
+            reservations made by this call are released before raising
+    """
+    duplicates = _duplicates(claims)
+    if duplicates:
+        raise LoanReservationConflict([str(loan_id) for loan_id in duplicates])
+
+    now = utc_now()
+    pairs = [(tranche_id, loan_id) for tranche_id, loan_ids in claims.items() for loan_id in loan_ids]
+    operations = [
+        UpdateOne({"_id": loan_id, "tranche_id": tranche_id}, {"$setOnInsert": {"reserved_at": now}}, upsert=True)
+        for tranche_id, loan_id in pairs
+    ]
+    if not operations:
+        return []
+    try:
+        result = await db[RESERVATIONS_COLLECTION].bulk_write(operations, ordered=False, session=session)
+        return list(result.upserted_ids.values())
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        if session is None:
+            await release_claims(db, [upsert["_id"] for upsert in e.details.get("upserted", [])])
+        conflicts = [str(pairs[error["index"]][1]) for error in errors]
+        raise LoanReservationConflict(conflicts)
+
+
+async def release_claims(db, loan_ids: list) -> None:
+    """Undo reservations made by claim_loans (compensation after a failed checkout)."""
+    if loan_ids:
+        await db[RESERVATIONS_COLLECTION].delete_many({"_id": {"$in": loan_ids}})
+
+
+async def release_tranche_loans(db, tranche_id, keep: Optional[Iterable] = None, session=None) -> int:
+    """Release a tranche's reservations, except for the loans in `keep`.
+
+    Returns:
+        int: Number of reservations released
+    """
+    query = {"tranche_id": tranche_id}
+    if keep:
+        query["_id"] = {"$nin": list(keep)}
+    result = await db[RESERVATIONS_COLLECTION].delete_many(query, session=session)
+    return result.deleted_count
+
+
+async def release_deleted_loans(db, loan_ids: list) -> int:
+    """Release deleted loans: drop their reservations and remove them from their tranches.
+
+    The tranches are found through the reservations (the _id index). Each one
+    gets its `version` bumped, which keys the composition cache, and its
+    investor's portfolio summary is dropped so its loan count is rebuilt.
+
+    Returns:
+        int: Number of reservations released
+    """
+    if not loan_ids:
+        return 0
+    reservations = db[RESERVATIONS_COLLECTION].find({"_id": {"$in": loan_ids}}, {"tranche_id": 1})
+    tranche_ids = list({reservation["tranche_id"] async for reservation in reservations})
+    result = await db[RESERVATIONS_COLLECTION].delete_many({"_id": {"$in": loan_ids}})
+    if tranche_ids:
+        await db["tranches"].update_many(
+            {"_id": {"$in": tranche_ids}},
+            {"$pull": {"loans": {"$in": loan_ids}}, "$inc": {"version": 1}},
+        )
+        investors = db["tranches"].find({"_id": {"$in": tranche_ids}, "investor_id": {"$ne": None}},
+                                        {"investor_id": 1})
+        for investor_id in {tranche["investor_id"] async for tranche in investors}:
+            await portfolio_service.invalidate_portfolio(db, investor_id)
+    logger.info(f"Released {result.deleted_count} reservation(s) of deleted loans from {len(tranche_ids)} tranche(s)")
+    return result.deleted_count
+
+
+# Aggregation stages keeping only loans without a reservation; the $lookup is an
+# equality match on the reservations' _id, so each loan costs one index probe.
+UNRESERVED_LOANS_PIPELINE = [
+    {"$lookup": {"from": RESERVATIONS_COLLECTION, "localField": "_id", "foreignField": "_id", "as": "reserved"}},
+    {"$match": {"reserved": []}},
+    # version stamps are bookkeeping, not model features
+    {"$project": {"reserved": 0, **{field: 0 for field in VERSION_FIELDS}}},
+]
+
+
+def find_unreserved_loans(db) -> list:
+    """Return every loan not reserved by a tranche, without its version fields (PyMongo database)."""
+    return list(db["loans"].aggregate(UNRESERVED_LOANS_PIPELINE))
+
+
+def _write_backfill(db, pairs: list, report: dict) -> None:
+    """Upsert (tranche id, loan id) reservations; loans held by another tranche are reported."""
+    operations = [
+        UpdateOne({"_id": loan_id, "tranche_id": tranche_id}, {"$setOnInsert": {"reserved_at": utc_now()}}, upsert=True)
+        for tranche_id, loan_id in pairs
+    ]
+    try:
+        result = db[RESERVATIONS_COLLECTION].bulk_write(operations, ordered=False)
+        report["reserved"] += result.upserted_count
+        return
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        report["reserved"] += e.details.get("nUpserted", 0)
+    conflicts = [pairs[error["index"]] for error in errors]
+    owners = {
+        reservation["_id"]: reservation["tranche_id"]
+        for reservation in db[RESERVATIONS_COLLECTION].find({"_id": {"$in": [loan for _, loan in conflicts]}})
+    }
+    for tranche_id, loan_id in conflicts:
+        report["conflicts"].append({"loan_id": str(loan_id), "tranche_id": str(tranche_id),
+                                    "reserved_by": str(owners.get(loan_id))})
+
+
+def backfill_reservations(db, force: bool = False) -> Optional[dict]:
+    """Reserve every loan listed in an existing tranche (PyMongo database; idempotent).
+
+    Loans already reserved by their tranche are left alone. A loan listed in
+    more than one tranche stays with the tranche that reserved it first (in
+    tranche `_id` order) and is reported as a conflict to resolve by hand.
+
+    Args:
+        db: PyMongo database
+        force: Run even if the backfill already ran (the startup call does not)
+
+    Returns:
+        dict | None: tranches scanned, reservations created and conflicts; None if skipped
+    """
+    if not force and db["counters"].count_documents(BACKFILL_MARKER, limit=1):
+        return None
+    report = {"tranches": 0, "reserved": 0, "conflicts": []}
+    pairs = []
+    for tranche in db["tranches"].find({"loans.0": {"$exists": True}}, {"loans": 1}).sort("_id", 1):
+        report["tranches"] += 1
+        pairs.extend((tranche["_id"], loan_id) for loan_id in tranche["loans"])
+        if len(pairs) >= BACKFILL_BATCH_SIZE:
+            _write_backfill(db, pairs, report)
+            pairs = []
+    if pairs:
+        _write_backfill(db, pairs, report)
+    db["counters"].update_one(BACKFILL_MARKER, {"$set": {"ran_at": utc_now(), "conflicts": len(report["conflicts"])}},
+                              upsert=True)
+    log = logger.warning if report["conflicts"] else logger.info
+    log(f"Reservation backfill: {report['reserved']} reservation(s) created for {report['tranches']} tranche(s), "
+        f"{len(report['conflicts'])} conflict(s)")
+    for conflict in report["conflicts"]:
+        logger.warning(f"Loan {conflict['loan_id']} of tranche {conflict['tranche_id']} "
+                       f"is already reserved by tranche {conflict['reserved_by']}")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Loan reservation maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill", help="Reserve the loans of existing tranches and report conflicts")
+    parser.parse_args()
+
+    from app.config.database import get_database
+
+    report = backfill_reservations(get_database(), force=True)
+    print(f"{report['tranches']} tranche(s) scanned, {report['reserved']} reservation(s) created, "
+          f"{len(report['conflicts'])} conflict(s)")
+    for conflict in report["conflicts"]:
+        print(f"  loan {conflict['loan_id']}: tranche {conflict['tranche_id']}, "
+              f"reserved by {conflict['reserved_by']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
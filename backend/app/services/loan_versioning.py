@@ -0,0 +1,251 @@
+"""Loan versioning and change feed.
+
+Every loan write stamps three fields on the document:
+- version: per-loan revision, starting at 1 and incremented by each update;
+  exposed as the loan's ETag for If-Match conditional updates,
+- updated_at: UTC time of the last write,
+- change_seq: a collection-wide, monotonically increasing change number
+  taken from a counter document, used by the change feed.
+
+Deleted loans leave a tombstone (loan id plus the change_seq of the delete)
+in `loan_tombstones`, so incremental consumers also learn about deletions.
+The change feed returns loans and tombstones ordered by (change_seq, _id),
+both served by indexes on those fields.
+
+A change number is reserved before its write commits, so two concurrent
+writers can commit out of order: a reader may see seq N+1 while N is still in
+flight, and a cursor that moved past N+1 would never return N. The feed
+therefore only hands out changes older than LOAN_CHANGE_FEED_SETTLE_SECONDS
+(by updated_at / deleted_at) and stops at the first newer one. A write that
+takes longer than the margin to commit after reserving its number can still
+be missed; raise the margin for slow bulk writes.
+
+Loans written before versioning get a change_seq from `backfill_change_seqs`
+(run at startup), so a feed started at since=0 covers them too.
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = "counters"
+TOMBSTONES_COLLECTION = "loan_tombstones"
+CHANGE_COUNTER_ID = "loan_change_seq"
+VERSION_FIELDS = ("version", "updated_at", "change_seq")
+LOAN_CHANGE_FEED_SETTLE_SECONDS = float(os.getenv("LOAN_CHANGE_FEED_SETTLE_SECONDS", 5))
+CHANGE_SEQ_BACKFILL_BATCH_SIZE = 1000
+
+
+class LoanVersionError(ValueError):
+    """Raised for malformed If-Match headers or change feed cursors."""
+
+
+def utc_now() -> datetime:
+    """Return the current UTC time with millisecond precision (as stored by MongoDB)."""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+async def reserve_change_seqs(db, count: int = 1) -> int:
+    """Atomically reserve `count` consecutive change numbers.
+
+    Args:
+        db: Motor database
+        count: Number of change numbers needed
+
+    Returns:
+        int: First reserved change number (the block is first .. first + count - 1)
+    """
+    counter = await db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": CHANGE_COUNTER_ID},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+
+def reserve_change_seqs_sync(db, count: int = 1) -> int:
+    """Same as reserve_change_seqs, for a PyMongo database (command line loaders)."""
+    counter = db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": CHANGE_COUNTER_ID},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+
+def backfill_change_seqs(db) -> int:
+    """Give loans written before versioning a change_seq and updated_at (PyMongo database).
+
+    Idempotent: only loans without a change_seq are touched, and their version
+    is left unset so existing "0" ETags stay valid.
+
+    Returns:
+        int: Number of loans stamped
+    """
+    collection = db["loans"]
+    stamped = 0
+    while True:
+        ids = [loan["_id"] for loan in collection.find({"change_seq": {"$exists": False}}, {"_id": 1})
+               .limit(CHANGE_SEQ_BACKFILL_BATCH_SIZE)]
+        if not ids:
+            break
+        first_seq = reserve_change_seqs_sync(db, len(ids))
+        now = utc_now()
+        result = collection.bulk_write([
+            UpdateOne({"_id": loan_id, "change_seq": {"$exists": False}},
+                      {"$set": {"change_seq": first_seq + offset, "updated_at": now}})
+            for offset, loan_id in enumerate(ids)
+        ], ordered=False)
+        stamped += result.modified_count
+    if stamped:
+        logger.info(f"Assigned change numbers to {stamped} loan(s) written before versioning")
+    return stamped
+
+
+def stamp_new_loan(loan: dict, change_seq: int, now: Optional[datetime] = None) -> dict:
+    """Add the version fields to a loan about to be inserted."""
+    loan["version"] = 1
+    loan["updated_at"] = now or utc_now()
+    loan["change_seq"] = change_seq
+    return loan
+
+
+def versioned_update(patch: dict, change_seq: int, now: Optional[datetime] = None) -> dict:
+    """Build an update document that applies `patch` and bumps the version fields."""
+    return {
+        "$set": {**patch, "updated_at": now or utc_now(), "change_seq": change_seq},
+        "$inc": {"version": 1},
+    }
+
+
+def make_etag(version: Optional[int]) -> str:
+    """Format a loan version as a strong ETag (loans written before versioning are version 0)."""
+    return f'"{version or 0}"'
+
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    """Parse an If-Match header into the expected loan version.
+
+    Returns:
+        int | None: Expected version, or None when the header is absent or "*"
+
+    Raises:
+        LoanVersionError: If the header is not a single loan ETag
+    """
+    if header is None or header.strip() == "*":
+        return None
+    value = header.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        raise LoanVersionError(f"Invalid If-Match header: {header}")
+    return int(value)
+
+
+def version_condition(expected: int) -> dict:
+    """Query condition matching a loan at the expected version."""
+    if expected == 0:
+        return {"$or": [{"version": {"$exists": False}}, {"version": 0}]}
+    return {"version": expected}
+
+
+async def record_tombstones(db, loan_ids: list, first_seq: int, now: Optional[datetime] = None) -> None:
+    """Write (or refresh) tombstones for deleted loans, one change number each."""
+    if not loan_ids:
+        return
+    now = now or utc_now()
+    operations = [
+        UpdateOne(
+            {"_id": loan_id},
+            {"$set": {"change_seq": first_seq + offset, "deleted_at": now}},
+            upsert=True,
+        )
+        for offset, loan_id in enumerate(loan_ids)
+    ]
+    await db[TOMBSTONES_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def _feed_query(since: int, after_id: Optional[ObjectId]) -> dict:
+    """Select documents positioned after (since, after_id) in (change_seq, _id) order."""
+    if after_id is None:
+        return {"change_seq": {"$gt": since}}
+    return {"$or": [
+        {"change_seq": {"$gt": since}},
+        {"change_seq": since, "_id": {"$gt": after_id}},
+    ]}
+
+
+async def fetch_changes(db, since: int, after_id: Optional[str] = None, limit: int = 100,
+                        projection: Optional[dict] = None,
+                        settle_seconds: float = LOAN_CHANGE_FEED_SETTLE_SECONDS) -> dict:
+    """Return settled loan changes and deletions after a feed position.
+
+    Changes younger than settle_seconds are held back (see the module
+    docstring), so the page ends before the first one and has_more is False
+    until it settles.
+
+    Args:
+        db: Motor database
+        since: change_seq of the last change already processed (0 to start)
+        after_id: Loan id of the last change already processed, when a page ended
+            in the middle of a batch sharing one change_seq
+        limit: Maximum number of changes to return
+        projection: Optional projection for changed loans (version fields are always included)
+        settle_seconds: Age a change must reach before it is returned
+
+    Returns:
+        dict: changes (each with change_seq, loan_id, deleted and the loan) plus
+            the next_since / next_after_id position to resume from
+
+    Raises:
+        LoanVersionError: If after_id is not a valid loan id
+    """
+    if after_id is not None and not ObjectId.is_valid(after_id):
+        raise LoanVersionError("Invalid after_id")
+    query = _feed_query(since, ObjectId(after_id) if after_id else None)
+    if projection:
+        projection = {**projection, **{field: 1 for field in VERSION_FIELDS}}
+
+    sort = [("change_seq", ASCENDING), ("_id", ASCENDING)]
+    loans = await db["loans"].find(query, projection).sort(sort).limit(limit).to_list(length=limit)
+    tombstones = await db[TOMBSTONES_COLLECTION].find(query).sort(sort).limit(limit).to_list(length=limit)
+
+    merged = sorted(
+        [(loan["change_seq"], loan["_id"], loan, False) for loan in loans]
+        + [(tomb["change_seq"], tomb["_id"], tomb, True) for tomb in tombstones],
+        key=lambda item: (item[0], item[1]),
+    )[:limit]
+    settled_before = utc_now() - timedelta(seconds=settle_seconds)
+    for index, (_, _, document, deleted) in enumerate(merged):
+        written_at = document.get("deleted_at" if deleted else "updated_at")
+        if written_at is not None and written_at.replace(tzinfo=timezone.utc) > settled_before:
+            merged = merged[:index]
+            break
+    has_more = len(merged) == limit
+
+    changes = []
+    for change_seq, loan_id, document, deleted in merged:
+        if deleted:
+            changes.append({"change_seq": change_seq, "loan_id": str(loan_id), "deleted": True,
+                            "deleted_at": document.get("deleted_at"), "loan": None})
+        else:
+            document["_id"] = str(loan_id)
+            changes.append({"change_seq": change_seq, "loan_id": str(loan_id), "deleted": False, "loan": document})
+
+    last = merged[-1] if merged else None
+    return {
+        "changes": changes,
+        "next_since": last[0] if last else since,
+        "next_after_id": str(last[1]) if last else after_id,
+        "has_more": has_more,
+    }
+
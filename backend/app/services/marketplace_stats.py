@@ -0,0 +1,169 @@
+"""Materialized marketplace statistics.
+
+One document in `marketplace_stats` holds, per tranche risk category and split
+into available and sold tranches, the tranche count, total `budget_spent` and
+the sum of `average_risk` (averages are derived when read). It is kept current
+by tranche checkout and purchase with atomic `$inc` deltas, so serving it never
+scans the tranches collection.
+
+Deltas applied outside a transaction can drift if a write fails half way or
+two checkouts rewrite the same tranche concurrently; `reconcile_stats`
+recomputes the document from `tranches` and runs periodically as a Celery task.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+from app.services.loan_versioning import utc_now
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = "marketplace_stats"
+STATS_ID = "tranches"
+STATES = ("available", "sold")
+
+# Tranche fields needed to compute a delta
+STATS_PROJECTION = {"risk_category": 1, "budget_spent": 1, "average_risk": 1, "investor_id": 1}
+
+
+def _category_key(category: Optional[str]) -> str:
+    """Risk category as a safe field name."""
+    return (category or "Unknown").replace(".", "_").lstrip("$") or "Unknown"
+
+
+def stats_delta(tranche: dict, sign: int = 1, state: Optional[str] = None) -> dict:
+    """`$inc` delta adding (sign=1) or removing (sign=-1) a tranche from the statistics.
+
+    Args:
+        tranche: Tranche document with the STATS_PROJECTION fields
+        sign: 1 to add the tranche, -1 to remove it
+        state: "available" or "sold"; derived from investor_id when omitted
+    """
+    state = state or ("sold" if tranche.get("investor_id") else "available")
+    prefix = f"by_risk.{_category_key(tranche.get('risk_category'))}.{state}"
+    return {
+        f"{prefix}.count": sign,
+        f"{prefix}.budget_spent": sign * (tranche.get("budget_spent") or 0),
+        f"{prefix}.risk_total": sign * (tranche.get("average_risk") or 0),
+    }
+
+
+def merge_deltas(deltas: Iterable[dict]) -> dict:
+    """Sum several `$inc` deltas into one, dropping paths that cancel out."""
+    merged = defaultdict(int)
+    for delta in deltas:
+        for path, value in delta.items():
+            merged[path] += value
+    return {path: value for path, value in merged.items() if value}
+
+
+def checkout_delta(documents: list, previous: dict) -> dict:
+    """Delta for a checkout: new values of every tranche minus the previous values of rewritten ones.
+
+    Args:
+        documents: (document, is_new) pairs from tranche_service.build_tranche_documents
+        previous: {tranche id: stored tranche} for the tranches that already existed
+    """
+    deltas = []
+    for document, _ in documents:
+        deltas.append(stats_delta(document))
+        if document["_id"] in previous:
+            deltas.append(stats_delta(previous[document["_id"]], -1))
+    return merge_deltas(deltas)
+
+
+def purchase_delta(tranche: dict, sign: int = 1) -> dict:
+    """Delta moving a tranche from available to sold (sign=-1 moves it back)."""
+    return merge_deltas([stats_delta(tranche, -sign, "available"), stats_delta(tranche, sign, "sold")])
+
+
+async def apply_delta(db, delta: dict, session=None) -> None:
+    """Atomically apply a delta to the statistics document."""
+    if not delta:
+        return
+    await db[STATS_COLLECTION].update_one(
+        {"_id": STATS_ID}, {"$inc": delta, "$set": {"updated_at": utc_now()}}, upsert=True, session=session
+    )
+
+
+def format_stats(document: Optional[dict]) -> dict:
+    """Shape the statistics document into the API response, with derived averages."""
+    document = document or {}
+    categories = {}
+    for category, states in (document.get("by_risk") or {}).items():
+        categories[category] = {}
+        for state in STATES:
+            values = (states or {}).get(state) or {}
+            count = int(round(values.get("count", 0)))
+            categories[category][state] = {
+                "count": count,
+                "budget_spent": values.get("budget_spent", 0),
+                "average_risk": values.get("risk_total", 0) / count if count else None,
+            }
+    return {
+        "by_risk_category": categories,
+        "updated_at": document.get("updated_at"),
+        "reconciled_at": document.get("reconciled_at"),
+    }
+
+
+async def get_marketplace_stats(db) -> dict:
+    """Return the marketplace statistics (a single document read)."""
+    return format_stats(await db[STATS_COLLECTION].find_one({"_id": STATS_ID}))
+
+
+def compute_stats(db) -> dict:
+    """Recompute the `by_risk` statistics from the tranches collection (PyMongo database)."""
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "risk_category": "$risk_category",
+                "sold": {"$ne": [{"$ifNull": ["$investor_id", None]}, None]},
+            },
+            "count": {"$sum": 1},
+            "budget_spent": {"$sum": {"$ifNull": ["$budget_spent", 0]}},
+            "risk_total": {"$sum": {"$ifNull": ["$average_risk", 0]}},
+        }},
+    ]
+    by_risk = defaultdict(dict)
+    for row in db["tranches"].aggregate(pipeline):
+        state = "sold" if row["_id"]["sold"] else "available"
+        by_risk[_category_key(row["_id"].get("risk_category"))][state] = {
+            "count": row["count"], "budget_spent": row["budget_spent"], "risk_total": row["risk_total"],
+        }
+    return dict(by_risk)
+
+
+def _counts(by_risk: dict) -> dict:
+    return {
+        (category, state): int(round((values or {}).get("count", 0)))
+        for category, states in by_risk.items()
+        for state, values in (states or {}).items()
+    }
+
+
+def reconcile_stats(db) -> dict:
+    """Rebuild the statistics document from `tranches` and report any drift.
+
+    Args:
+        db: PyMongo database
+
+    Returns:
+        dict: drift (per category/state count differences found) and the rebuilt by_risk values
+    """
+    by_risk = compute_stats(db)
+    current = db[STATS_COLLECTION].find_one({"_id": STATS_ID}) or {}
+    expected, stored = _counts(by_risk), _counts(current.get("by_risk") or {})
+    drift = {
+        f"{category}.{state}": stored.get((category, state), 0) - count
+        for (category, state), count in {**{key: 0 for key in stored}, **expected}.items()
+        if stored.get((category, state), 0) != count
+    }
+    if drift:
+        logger.warning(f"Marketplace statistics drift corrected: {drift}")
+
+    now = utc_now()
+    db[STATS_COLLECTION].replace_one(
+        {"_id": STATS_ID}, {"by_risk": by_risk, "updated_at": now, "reconciled_at": now}, upsert=True
+    )
+    return {"drift": drift, "by_risk": by_risk}
@@ -2,15 +2,29 @@
 
 This module provides functionality to monitor Consumer Price Index (CPI) data,
 detect significant spikes, and send email alerts when thresholds are exceeded.
-It integrates with Alpha Vantage API for data and SMTP for notifications.
+It integrates with Alpha Vantage API for data; spike alerts are fanned out to
+every investor holding tranches (app.services.alert_fanout).
+
+CPI is published monthly while the check runs every few minutes, so the check
+is incremental. A state document in `macro_state` keeps the last observation
+seen, the response validators and a short history of run timings:
+- a run within CPI_MIN_FETCH_INTERVAL_SECONDS of the last fetch returns at once,
+- fetches are conditional (If-None-Match / If-Modified-Since when the API sent
+  validators) and an unchanged body (same hash) is not parsed at all,
+- only observations newer than the stored one are converted and compared,
+- the new observation is claimed with a write conditional on the previous
+  last_date before anomalies are recorded or investors alerted, so overlapping
+  runs cannot both alert on the same spike.
 """
 
 import requests
-import smtplib
-from email.mime.text import MIMEText
-import pandas as pd
 import os
-import requests
+import time
+import hashlib
+import logging
+from datetime import timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from dotenv import load_dotenv
@@ -18,109 +32,197 @@ load_dotenv()
 
 # Load environment variables (or use default values)
 ALPHAVANTAGE_API_KEY = os.getenv("ALPHAVANTAGE_API_KEY", "demo")
-SMTP_SENDER = os.getenv("SMTP_SENDER", "your_email@gmail.com")
-SMTP_RECEIVER = os.getenv("SMTP_RECEIVER", "receiver_email@example.com")
-SMTP_APP_PASSWORD = os.getenv("SMTP_APP_PASSWORD", "your_app_password")
 SPIKE_THRESHOLD_PERCENT = float(os.getenv("SPIKE_THRESHOLD_PERCENT", "0.1"))
+CPI_MIN_FETCH_INTERVAL_SECONDS = int(os.getenv("CPI_MIN_FETCH_INTERVAL_SECONDS", 3600))
 
-def fetch_cpi_data() -> list:
-    """Fetch CPI data from Alpha Vantage API.
+CPI_URL = "https://www.alphavantage.co/query"
+CPI_STATE_COLLECTION = "macro_state"
+CPI_STATE_ID = "cpi"
+CPI_RUN_HISTORY = 50  # run timings kept on the state document
 
-    Returns:
-        list: List of dictionaries containing CPI data points (date and value)
-              Returns empty list on error.
-    """
-    url = f"https://www.alphavantage.co/query?function=CPI&interval=monthly&apikey={ALPHAVANTAGE_API_KEY}"
+logger = logging.getLogger(__name__)
 
+def _cpi_session() -> requests.Session:
     session = requests.Session()
     retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
     session.mount("https://", HTTPAdapter(max_retries=retries))
+    return session
+
+
+# Reused across runs so the HTTPS connection is kept alive
+_session = _cpi_session()
 
-    try:
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("data", [])
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching CPI data: {e}")
-        return []
 
-def detect_cpi_spike(cpi_data: list, threshold_percent: float = SPIKE_THRESHOLD_PERCENT) -> tuple:
-    """Analyze CPI data for significant spikes.
+def fetch_cpi_update(state: dict) -> dict:
+    """Fetch the CPI series unless it is known to be unchanged.
 
     Args:
-        cpi_data: List of CPI data points (dicts with 'date' and 'value')
-        threshold_percent: Percentage change threshold to consider a spike
+        state: The stored CPI state ({} on the first run)
 
     Returns:
-        tuple: (spike_detected: bool, latest_value: float, 
-                previous_value: float, percentage_change: float)
+        dict: outcome ("not_modified", "unchanged", "ok" or "error"), and for "ok"
+            data (observations as returned by the API), etag, last_modified and content_hash
     """
-    if not cpi_data or len(cpi_data) < 2:
-        return False, None, None, None
-
-    df = pd.DataFrame(cpi_data)
-    df['date'] = pd.to_datetime(df['date'])
-    df['value'] = df['value'].astype(float)
-    df = df.sort_values(by='date')
-
-    latest_value = df.iloc[-1]['value']
-    previous_value = df.iloc[-2]['value']
-
-    if previous_value == 0:
-        return False, latest_value, previous_value, 0.0
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    params = {"function": "CPI", "interval": "monthly", "apikey": ALPHAVANTAGE_API_KEY}
+    try:
+        response = _session.get(CPI_URL, params=params, headers=headers, timeout=10)
+        if response.status_code == 304:
+            return {"outcome": "not_modified"}
+        response.raise_for_status()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if content_hash == state.get("content_hash"):
+            return {"outcome": "unchanged"}
+        return {
+            "outcome": "ok",
+            "data": response.json().get("data", []),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+        }
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Error fetching CPI data: {e}")
+        return {"outcome": "error"}
+
+
+def new_observations(cpi_data: list, last_date: str = None) -> list:
+    """Return the observations newer than `last_date` as (date, value) pairs, oldest first.
+
+    Dates are ISO strings, so they compare as text; only new points are converted.
+    """
+    points = []
+    for point in cpi_data:
+        date = point.get("date")
+        if not date or (last_date and date <= last_date):
+            continue
+        try:
+            points.append((date, float(point["value"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    points.sort()
+    return points
+
+
+def _record_run(db, run: dict, update: dict = None) -> None:
+    """Save the run's timings, and the new state fields if any."""
+    change = {"$push": {"runs": {"$each": [run], "$slice": -CPI_RUN_HISTORY}}}
+    if update:
+        change["$set"] = update
+    db[CPI_STATE_COLLECTION].update_one({"_id": CPI_STATE_ID}, change, upsert=True)
+
+
+def _claim_observation(db, state: dict, update: dict) -> bool:
+    """Advance the state to a new observation unless another run already did."""
+    try:
+        claimed = db[CPI_STATE_COLLECTION].find_one_and_update(
+            {"_id": CPI_STATE_ID, "last_date": state.get("last_date")},
+            {"$set": update},
+            projection={"_id": 1},
+            upsert=not state,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:  # two first runs: the other one created the state
+        return False
+    return claimed is not None
 
-    percentage_change = ((latest_value - previous_value) / previous_value) * 100
-    spike_detected = percentage_change > threshold_percent
-    return spike_detected, latest_value, previous_value, percentage_change
 
-def send_email_notification(subject: str, body: str) -> None:
-    """Send email notification via SMTP.
+def process_macro_alert(db=None) -> str:
+    """Orchestrate the complete CPI monitoring workflow, incrementally.
 
     Args:
-        subject: Email subject line
-        body: Email message content
-    """
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = SMTP_SENDER
-    msg["To"] = SMTP_RECEIVER
-
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(SMTP_SENDER, SMTP_APP_PASSWORD)
-            server.sendmail(SMTP_SENDER, SMTP_RECEIVER, msg.as_string())
-        print("Email sent successfully!")
-    except Exception as e:
-        print("Failed to send email:", e)
-
-def process_macro_alert() -> str:
-    """Orchestrate the complete CPI monitoring workflow.
+        db: PyMongo database holding the CPI state (defaults to get_database())
 
     Returns:
         str: Status message indicating:
+             - "Skipped" if the series was fetched less than CPI_MIN_FETCH_INTERVAL_SECONDS ago,
+               or a concurrent run already processed the new observation
              - "No data" if API call failed
-             - "Spike detected and email sent" if alert triggered
+             - "No new CPI data" if nothing was published since the last run
+             - "Spike detected; alert ... queued for N investor(s)" if alert triggered
              - "No spike detected" otherwise
     """
-    cpi_data = fetch_cpi_data()
-    if not cpi_data:
-        print("No CPI data retrieved. Exiting.")
-        return "No data"
+    from app.config.database import get_database
+    from app.services.loan_versioning import utc_now
+
+    db = db if db is not None else get_database()
+    started = time.perf_counter()
+    now = utc_now()
+    state = db[CPI_STATE_COLLECTION].find_one({"_id": CPI_STATE_ID}, {"runs": 0}) or {}
+    run = {"at": now, "new_points": 0}
+
+    def finish(outcome: str, message: str, update: dict = None) -> str:
+        run.update(outcome=outcome, total_ms=(time.perf_counter() - started) * 1000)
+        _record_run(db, run, update)
+        logger.info(f"CPI check: {message} ({run['total_ms']:.1f} ms)")
+        return message
+
+    last_fetch_at = state.get("last_fetch_at")
+    if last_fetch_at is not None:
+        if last_fetch_at.tzinfo is None:
+            last_fetch_at = last_fetch_at.replace(tzinfo=now.tzinfo)
+        if now - last_fetch_at < timedelta(seconds=CPI_MIN_FETCH_INTERVAL_SECONDS):
+            return finish("skipped", "Skipped: CPI fetched recently.")
+
+    fetch_started = time.perf_counter()
+    update = fetch_cpi_update(state)
+    run["fetch_ms"] = (time.perf_counter() - fetch_started) * 1000
+    if update["outcome"] == "error":
+        return finish("error", "No data")
+    if update["outcome"] != "ok":
+        return finish(update["outcome"], "No new CPI data.", {"last_fetch_at": now})
+
+    if not update["data"]:  # e.g. a rate limit notice instead of the series
+        return finish("error", "No data")
+
+    parse_started = time.perf_counter()
+    points = new_observations(update["data"], state.get("last_date"))
+    run["parse_ms"] = (time.perf_counter() - parse_started) * 1000
+    run["new_points"] = len(points)
+    fetched = {"last_fetch_at": now, "etag": update["etag"], "last_modified": update["last_modified"],
+               "content_hash": update["content_hash"]}
+    if not points:
+        return finish("unchanged", "No new CPI data.", fetched)
+
+    series = ([(state["last_date"], state["last_value"])] if state.get("last_date") else []) + points
+    latest_date, latest = series[-1]
+    fetched.update(last_date=latest_date, last_value=latest)
+    previous = series[-2][1] if len(series) > 1 else None
+    change = ((latest - previous) / previous) * 100 if previous else 0.0
+    if previous is not None:
+        fetched.update(previous_value=previous, percentage_change=change)
+    if not _claim_observation(db, state, fetched):
+        return finish("skipped", "Skipped: CPI processed by a concurrent run.")
+
+    try:
+        from app.services.anomaly import record_cpi
+
+        run["anomalies"] = len(record_cpi(db, points, alert=bool(state.get("last_date"))))
+    except Exception as e:
+        logger.error(f"CPI anomaly update failed: {e}")
+
+    if previous is None:
+        return finish("initialized", "No spike detected.")
+    if change > SPIKE_THRESHOLD_PERCENT:
+        from app.services.alert_fanout import start_alert_fanout
 
-    spike, latest, previous, change = detect_cpi_spike(cpi_data)
-    if spike:
         subject = "CPI Spike Alert"
-        body = (
+        body_template = (
+            "Dear {full_name},\n\n"
             f"Alert from ABSecure!! A spike was detected in the Consumer Price Index (CPI).\n\n"
             f"Latest CPI: {latest}\n"
             f"Previous CPI: {previous}\n"
             f"Percentage Change: {change:.2f}%\n\n"
-            "This may indicate rising inflation. Please review your investment strategy."
+            "This may indicate rising inflation and affects the {tranche_count} tranche(s) you hold. "
+            "Please review your investment strategy."
+        )
+        fanout = start_alert_fanout(
+            db, "cpi_spike", subject, body_template,
+            {"date": latest_date, "latest": latest, "previous": previous, "percentage_change": change},
         )
-        send_email_notification(subject, body)
-        return "Spike detected and email sent."
-    else:
-        print("No significant CPI spike detected.")
-        return "No spike detected."
\ No newline at end of file
+        return finish("spike", f"Spike detected; alert {fanout['alert_id']} queued for "
+                               f"{fanout['recipients']} investor(s).")
+    return finish("no_spike", "No spike detected.")
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Investor portfolio summaries.
+
+Each investor has one document in `portfolios` (keyed by the investor id)
+holding a compact entry per owned tranche (name, categories, budgets, average
+risk, loan count) and the portfolio totals. Reading a portfolio is a single
+document lookup, however many tranches and loans the investor holds.
+
+Summaries are maintained incrementally by tranche checkout and purchase with
+pipeline updates: the tranche's entry is merged into the document and the
+totals are recomputed from the entries on the server, in the same write. The
+update is idempotent, so re-checking out a tranche never double counts it.
+
+Portfolios missing (investors who bought before summaries existed, or a
+summary dropped after a failed update) are rebuilt from `tranches` on first read.
+"""
+
+import logging
+from typing import Optional
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from app.services.loan_versioning import utc_now
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIOS_COLLECTION = "portfolios"
+
+# Tranche fields copied into portfolio entries
+ENTRY_FIELDS = (
+    "tranche_name", "risk_category", "return_category", "payment_priority",
+    "investor_budget", "budget_spent", "average_risk",
+)
+
+# Projection returning exactly what portfolio_entry needs from a tranche
+ENTRY_PROJECTION = {
+    **{field: 1 for field in ENTRY_FIELDS},
+    "loan_count": {"$size": {"$ifNull": ["$loans", []]}},
+}
+
+# Totals recomputed from the entries inside a pipeline update
+_TOTALS = {"$let": {
+    "vars": {"entries": {"$map": {"input": {"$objectToArray": "$tranches"}, "in": "$$this.v"}}},
+    "in": {
+        "tranche_count": {"$size": "$$entries"},
+        "investor_budget": {"$sum": "$$entries.investor_budget"},
+        "budget_spent": {"$sum": "$$entries.budget_spent"},
+        "risk_amount": {"$sum": "$$entries.risk_amount"},
+        "loan_count": {"$sum": "$$entries.loan_count"},
+    },
+}}
+
+
+def portfolio_entry(tranche: dict) -> dict:
+    """Build the portfolio entry of a tranche document.
+
+    Args:
+        tranche: Tranche document; either with `loans` or with a precomputed `loan_count`
+    """
+    entry = {field: tranche.get(field) for field in ENTRY_FIELDS}
+    entry["loan_count"] = tranche["loan_count"] if "loan_count" in tranche else len(tranche.get("loans", []))
+    entry["risk_amount"] = (entry["average_risk"] or 0) * (entry["budget_spent"] or 0)
+    return entry
+
+
+def add_tranches_update(entries: dict) -> list:
+    """Pipeline update merging {tranche id: entry} into a portfolio and refreshing its totals."""
+    merged = {"$arrayToObject": {"$literal": [{"k": str(tranche_id), "v": entry}
+                                              for tranche_id, entry in entries.items()]}}
+    return [
+        {"$set": {"tranches": {"$mergeObjects": [{"$ifNull": ["$tranches", {}]}, merged]}}},
+        {"$set": {"totals": _TOTALS, "updated_at": utc_now()}},
+    ]
+
+
+def remove_tranche_update(tranche_id) -> list:
+    """Pipeline update dropping a tranche's entry and refreshing the totals."""
+    return [
+        {"$set": {"tranches": {"$arrayToObject": {"$filter": {
+            "input": {"$objectToArray": {"$ifNull": ["$tranches", {}]}},
+            "cond": {"$ne": ["$$this.k", str(tranche_id)]},
+        }}}}},
+        {"$set": {"totals": _TOTALS, "updated_at": utc_now()}},
+    ]
+
+
+def portfolio_operations(by_investor: dict) -> list:
+    """Portfolio bulk operations for {investor_id: {tranche id: entry}}."""
+    return [
+        UpdateOne({"_id": investor_id}, add_tranches_update(entries), upsert=True)
+        for investor_id, entries in by_investor.items()
+    ]
+
+
+async def add_tranche(db, investor_id: ObjectId, tranche_id, entry: dict, session=None) -> None:
+    await db[PORTFOLIOS_COLLECTION].update_one(
+        {"_id": investor_id}, add_tranches_update({tranche_id: entry}), upsert=True, session=session
+    )
+
+
+async def remove_tranche(db, investor_id: ObjectId, tranche_id, session=None) -> None:
+    await db[PORTFOLIOS_COLLECTION].update_one(
+        {"_id": investor_id}, remove_tranche_update(tranche_id), session=session
+    )
+
+
+async def invalidate_portfolio(db, investor_id: ObjectId) -> None:
+    """Drop a summary that may be out of date; it is rebuilt on the next read."""
+    try:
+        await db[PORTFOLIOS_COLLECTION].delete_one({"_id": investor_id})
+    except Exception:
+        logger.error(f"Could not invalidate portfolio of investor {investor_id}", exc_info=True)
+
+
+async def rebuild_portfolio(db, investor_id: ObjectId) -> dict:
+    """Recompute an investor's summary from the tranches they own and store it."""
+    entries = {}
+    async for tranche in db["tranches"].find({"investor_id": investor_id}, ENTRY_PROJECTION):
+        entries[tranche["_id"]] = portfolio_entry(tranche)
+    return await db[PORTFOLIOS_COLLECTION].find_one_and_update(
+        {"_id": investor_id},
+        [{"$set": {"tranches": {"$literal": {}}}}] + add_tranches_update(entries),
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def format_portfolio(investor_id: str, portfolio: Optional[dict]) -> dict:
+    """Shape a portfolio document into the API response."""
+    portfolio = portfolio or {}
+    totals = dict(portfolio.get("totals") or {})
+    spent = totals.get("budget_spent") or 0
+    risk_amount = totals.pop("risk_amount", 0) or 0
+    tranches = []
+    for tranche_id, entry in (portfolio.get("tranches") or {}).items():
+        entry = {key: value for key, value in entry.items() if key != "risk_amount"}
+        tranches.append({"tranche_id": tranche_id, **entry})
+    return {
+        "investor_id": investor_id,
+        "tranches": tranches,
+        "totals": {
+            "tranche_count": totals.get("tranche_count", 0),
+            "investor_budget": totals.get("investor_budget", 0),
+            "budget_spent": spent,
+            "loan_count": totals.get("loan_count", 0),
+            "weighted_risk": risk_amount / spent if spent else None,
+        },
+        "updated_at": portfolio.get("updated_at"),
+    }
+
+
+async def get_portfolio(db, investor_id: str) -> dict:
+    """Return an investor's portfolio summary, rebuilding it if it does not exist yet.
+
+    Args:
+        db: Motor database
+        investor_id: ID of the investor (validated by the caller)
+
+    Returns:
+        dict: tranches (one entry per owned tranche) and totals
+    """
+    oid = ObjectId(investor_id)
+    portfolio = await db[PORTFOLIOS_COLLECTION].find_one({"_id": oid})
+    if portfolio is None:
+        portfolio = await rebuild_portfolio(db, oid)
+    return format_portfolio(investor_id, portfolio)
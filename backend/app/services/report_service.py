@@ -0,0 +1,295 @@
+"""Securitization report generation service.
+
+This module turns tranche and macroeconomic summaries into a written
+securitization report. Generation goes through a pluggable backend
+(Gemini or a local deterministic template), results are cached by a hash
+of the summaries, and reports can be streamed chunk by chunk so callers
+see the first tokens without waiting for the whole response.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Iterator, Optional
+from cachetools import TTLCache
+import google.generativeai as genai
+from dotenv import load_dotenv
+from app.services import loan_events
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GENAI_API_KEY = os.getenv("GENAI_API_KEY")
+GENAI_MODEL_NAME = os.getenv("GENAI_MODEL_NAME", "gemini-1.5-flash")
+REPORT_BACKEND = os.getenv("REPORT_BACKEND", "gemini")  # "gemini" or "template"
+REPORT_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CACHE_TTL_SECONDS", 3600))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", 256))
+
+NO_LOANS_MESSAGE = "No loans available under this category"
+MISSING_KEY_MESSAGE = "AI Report generation failed due to missing API key."
+GENERATION_FAILED_MESSAGE = "AI Report generation failed."
+
+REPORT_SECTIONS = [
+    "I. Tranche Allocation Summary",
+    "II. Macroeconomic Impact Analysis",
+    "III.  Discussion of Findings",
+    "IV. Conclusion",
+    "V. Disclaimer",
+]
+
+
+def build_report_prompt(tranche_summary: str, macro_impact_summary: str) -> str:
+    """Build the LLM prompt for a securitization report.
+
+    Args:
+        tranche_summary: Text summary of the tranche allocation
+        macro_impact_summary: Text summary of the macroeconomic impact
+
+    Returns:
+        str: Prompt sent to the generative model
+    """
+    sections = "\n    ".join(REPORT_SECTIONS)
+    return f"""
+    Imagine yourself as a bank manager and generate a structured loan securitization report:
+    {tranche_summary}
+    {macro_impact_summary}
+    Just have the following sections:
+    Securitization Type,Underlying Assets,Investor Selection Criteria,
+    {sections}
+    Also explain the financial terms used in the report in a structured manner.
+    """
+
+
+class ReportGenerationError(Exception):
+    """Raised by a backend when a report cannot be produced."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class ReportBackend:
+    """Base class for report generation backends.
+
+    Subclasses implement `stream`, yielding the report text in chunks.
+    Backends must raise ReportGenerationError instead of yielding error text
+    so that failures are never cached.
+    """
+
+    name = "base"
+
+    def stream(self, tranche_summary: str, macro_impact_summary: str) -> Iterator[str]:
+        """Yield the report in text chunks."""
+        raise NotImplementedError
+
+    def generate(self, tranche_summary: str, macro_impact_summary: str) -> str:
+        """Return the full report text."""
+        return "".join(self.stream(tranche_summary, macro_impact_summary))
+
+
+class GeminiBackend(ReportBackend):
+    """Google Gemini backend.
+
+    The SDK is configured and the GenerativeModel created once, on first use,
+    and reused for every subsequent report.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = GENAI_API_KEY, model_name: str = GENAI_MODEL_NAME):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        """Return the shared GenerativeModel, creating it on first call."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def stream(self, tranche_summary: str, macro_impact_summary: str) -> Iterator[str]:
+        if not self.api_key:
+            logger.error("Google Gemini API Key is missing. Cannot generate AI report.")
+            raise ReportGenerationError(MISSING_KEY_MESSAGE)
+
+        prompt = build_report_prompt(tranche_summary, macro_impact_summary)
+        try:
+            response = self._get_model().generate_content(prompt, stream=True)
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            logger.error(f"Error generating AI report: {e}")
+            raise ReportGenerationError(GENERATION_FAILED_MESSAGE)
+
+
+class TemplateBackend(ReportBackend):
+    """Local deterministic backend.
+
+    Renders the summaries into the report sections without any network call.
+    The same input always produces the same output, which makes it suitable
+    for offline use, tests and benchmarks.
+    """
+
+    name = "template"
+
+    def stream(self, tranche_summary: str, macro_impact_summary: str) -> Iterator[str]:
+        yield "Loan Securitization Report\n\n"
+        yield "Securitization Type: Asset-Backed Securities (loan pool)\n"
+        yield "Underlying Assets: Consumer loans pooled by the investor's selection criteria\n\n"
+        yield f"{REPORT_SECTIONS[0]}\n{tranche_summary.strip()}\n\n"
+        yield f"{REPORT_SECTIONS[1]}\n{macro_impact_summary.strip()}\n\n"
+        yield (
+            f"{REPORT_SECTIONS[2]}\n"
+            "Senior tranches are paid first and carry the lowest risk; equity tranches absorb "
+            "losses first in exchange for the highest expected return.\n\n"
+        )
+        yield (
+            f"{REPORT_SECTIONS[3]}\n"
+            "The allocation above reflects the selected criteria within the investor budget.\n\n"
+        )
+        yield (
+            f"{REPORT_SECTIONS[4]}\n"
+            "This report was generated from a template and does not constitute investment advice.\n"
+        )
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    TemplateBackend.name: TemplateBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_report_backend(name: Optional[str] = None) -> ReportBackend:
+    """Return the shared backend instance for the given name.
+
+    Args:
+        name: Backend name; defaults to the REPORT_BACKEND setting
+
+    Returns:
+        ReportBackend: Reused backend instance
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    name = name or REPORT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown report backend: {name}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+class ReportCache:
+    """Thread-safe TTL cache of generated reports with LRU-style eviction."""
+
+    def __init__(self, maxsize: int = REPORT_CACHE_MAX_ENTRIES, ttl: int = REPORT_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(backend_name: str, tranche_summary, macro_impact_summary) -> str:
+        """Hash the backend name and both summaries into a cache key."""
+        payload = json.dumps([backend_name, tranche_summary, macro_impact_summary], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: str, report: str) -> None:
+        with self._lock:
+            self._cache[key] = report
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+report_cache = ReportCache()
+
+
+def _on_loans_changed(event: dict) -> None:
+    """Drop cached reports once the loan book changes.
+
+    Reports are keyed by summaries of the previous loans, so after a change they
+    can no longer be hit; clearing once per write batch frees them immediately.
+    """
+    report_cache.clear()
+
+
+loan_events.subscribe(_on_loans_changed)
+
+
+def stream_report(tranche_summary: Optional[str], macro_impact_summary: Optional[str],
+                  backend: Optional[ReportBackend] = None) -> Iterator[str]:
+    """Stream a report, serving it from the cache when possible.
+
+    On a cache miss the backend's chunks are passed through as they arrive
+    and the assembled report is cached once the stream completes.
+
+    Args:
+        tranche_summary: Text summary of the tranche allocation
+        macro_impact_summary: Text summary of the macroeconomic impact
+        backend: Backend to use; defaults to the configured backend
+
+    Yields:
+        str: Report text chunks
+
+    Raises:
+        ReportGenerationError: If the backend fails, possibly after some chunks
+            were yielded; callers must not present the partial text as a report
+    """
+    if tranche_summary is None or macro_impact_summary is None:
+        yield NO_LOANS_MESSAGE
+        return
+
+    backend = backend or get_report_backend()
+    key = ReportCache.make_key(backend.name, tranche_summary, macro_impact_summary)
+    cached = report_cache.get(key)
+    if cached is not None:
+        logger.info("Serving securitization report from cache.")
+        yield cached
+        return
+
+    start = time.perf_counter()
+    chunks = []
+    for chunk in backend.stream(tranche_summary, macro_impact_summary):
+        chunks.append(chunk)
+        yield chunk
+
+    report_cache.set(key, "".join(chunks))
+    logger.info(f"Generated report with '{backend.name}' backend in {time.perf_counter() - start:.2f}s")
+
+
+def generate_report(tranche_summary: Optional[str], macro_impact_summary: Optional[str],
+                    backend: Optional[ReportBackend] = None) -> str:
+    """Return the full report text, using the cache when possible (the error message on failure)."""
+    try:
+        return "".join(stream_report(tranche_summary, macro_impact_summary, backend))
+    except ReportGenerationError as e:
+        return e.message
+
+
+def format_sse(data: str, event: Optional[str] = None) -> str:
+    """Format a text chunk as a Server-Sent Events message.
+
+    Multi-line chunks are split so that every line gets its own `data:` field,
+    as required by the SSE wire format.
+    """
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
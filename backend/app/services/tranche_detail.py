@@ -0,0 +1,237 @@
+"""Tranche composition and loan expansion.
+
+The composition of a tranche is computed by MongoDB in one aggregation
+pipeline: the tranche's loan ids are joined with `$lookup` (projected to the
+few fields needed), unwound and summarized by a `$facet` of `$group` /
+`$bucket` stages:
+- loan count, total amount and amount-weighted risk score,
+- credit score and loan duration histograms,
+- employment status mix.
+
+Results are cached per (tranche id, tranche version): any tranche write bumps
+its `version`, so a changed tranche is never served from a stale entry. Loan
+changes clear the cache through app.services.loan_events.
+
+Loans themselves are expanded a page at a time, slicing the tranche's loan id
+array on the server and fetching only that page of loans.
+"""
+
+import os
+import threading
+import logging
+from typing import Optional
+from bson import ObjectId
+from cachetools import TTLCache
+from app.services import loan_events
+
+logger = logging.getLogger(__name__)
+
+# Cache and page settings
+TRANCHE_DETAIL_CACHE_TTL_SECONDS = int(os.getenv("TRANCHE_DETAIL_CACHE_TTL_SECONDS", 300))
+TRANCHE_DETAIL_CACHE_MAX_ENTRIES = int(os.getenv("TRANCHE_DETAIL_CACHE_MAX_ENTRIES", 1024))
+TRANCHE_LOANS_PAGE_DEFAULT_LIMIT = int(os.getenv("TRANCHE_LOANS_PAGE_DEFAULT_LIMIT", 100))
+TRANCHE_LOANS_PAGE_MAX_LIMIT = int(os.getenv("TRANCHE_LOANS_PAGE_MAX_LIMIT", 1000))
+
+# Histogram bucket boundaries (lower bounds; the last value is the exclusive upper bound)
+CREDIT_SCORE_BUCKETS = [300, 580, 670, 740, 800, 851]
+DURATION_BUCKETS = [0, 13, 37, 61, 121, 100000]
+
+
+class TrancheDetailError(Exception):
+    """Tranche detail failure carrying the HTTP status the API should return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class CompositionCache:
+    """Thread-safe TTL cache of tranche compositions keyed by (tranche id, version)."""
+
+    def __init__(self, maxsize: int = TRANCHE_DETAIL_CACHE_MAX_ENTRIES, ttl: int = TRANCHE_DETAIL_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: tuple, composition: dict) -> None:
+        with self._lock:
+            self._cache[key] = composition
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+composition_cache = CompositionCache()
+
+
+def _on_loans_changed(event: dict) -> None:
+    """Loan edits change tranche compositions without bumping tranche versions."""
+    composition_cache.clear()
+
+
+loan_events.subscribe(_on_loans_changed)
+
+
+def parse_tranche_id(tranche_id: str) -> ObjectId:
+    if not ObjectId.is_valid(tranche_id):
+        raise TrancheDetailError(400, "Invalid tranche ID format")
+    return ObjectId(tranche_id)
+
+
+def _bucket_labels(boundaries: list) -> dict:
+    """Map each bucket's lower bound to a "low-high" label (high inclusive)."""
+    return {low: f"{low}-{high - 1}" for low, high in zip(boundaries, boundaries[1:])}
+
+
+def composition_pipeline(tranche_id: ObjectId) -> list:
+    """Aggregation on `tranches` computing one tranche's composition."""
+    return [
+        {"$match": {"_id": tranche_id}},
+        {"$lookup": {
+            "from": "loans",
+            "localField": "loans",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {
+                "_id": 0, "LoanAmount": 1, "RiskScore": 1, "CreditScore": 1,
+                "LoanDuration": 1, "EmploymentStatus": 1,
+            }}],
+            "as": "loan",
+        }},
+        {"$unwind": "$loan"},
+        {"$replaceRoot": {"newRoot": "$loan"}},
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "loans_found": {"$sum": 1},
+                "total_amount": {"$sum": "$LoanAmount"},
+                "risk_amount": {"$sum": {"$multiply": [
+                    {"$ifNull": ["$RiskScore", 0]}, {"$ifNull": ["$LoanAmount", 0]},
+                ]}},
+                "risk_weight": {"$sum": {"$cond": [
+                    {"$eq": [{"$type": "$RiskScore"}, "missing"]}, 0, {"$ifNull": ["$LoanAmount", 0]},
+                ]}},
+            }}],
+            "credit_score": [{"$bucket": {
+                "groupBy": "$CreditScore", "boundaries": CREDIT_SCORE_BUCKETS, "default": "other",
+                "output": {"count": {"$sum": 1}, "amount": {"$sum": "$LoanAmount"}},
+            }}],
+            "duration": [{"$bucket": {
+                "groupBy": "$LoanDuration", "boundaries": DURATION_BUCKETS, "default": "other",
+                "output": {"count": {"$sum": 1}, "amount": {"$sum": "$LoanAmount"}},
+            }}],
+            "employment": [
+                {"$group": {"_id": {"$ifNull": ["$EmploymentStatus", "Unknown"]},
+                            "count": {"$sum": 1}, "amount": {"$sum": "$LoanAmount"}}},
+                {"$sort": {"count": -1}},
+            ],
+        }},
+    ]
+
+
+def _histogram(rows: list, labels: dict) -> list:
+    return [
+        {"range": labels.get(row["_id"], str(row["_id"])), "count": row["count"], "amount": row["amount"]}
+        for row in rows
+    ]
+
+
+def format_composition(tranche: dict, facets: Optional[dict]) -> dict:
+    """Shape the pipeline output into the API response."""
+    facets = facets or {}
+    summary = (facets.get("summary") or [{}])[0]
+    weight = summary.get("risk_weight") or 0
+    return {
+        "tranche_id": str(tranche["_id"]),
+        "version": tranche.get("version", 0),
+        "loan_count": tranche.get("loan_count", 0),
+        "loans_found": summary.get("loans_found", 0),
+        "total_amount": summary.get("total_amount", 0),
+        "weighted_risk": summary["risk_amount"] / weight if weight else None,
+        "credit_score_histogram": _histogram(facets.get("credit_score", []), _bucket_labels(CREDIT_SCORE_BUCKETS)),
+        "duration_histogram": _histogram(facets.get("duration", []), _bucket_labels(DURATION_BUCKETS)),
+        "employment_mix": [
+            {"status": row["_id"], "count": row["count"], "amount": row["amount"]}
+            for row in facets.get("employment", [])
+        ],
+    }
+
+
+async def get_tranche_composition(db, tranche_id: str) -> dict:
+    """Return the composition statistics of a tranche, from the cache when current.
+
+    Args:
+        db: Motor database
+        tranche_id: ID of the tranche
+
+    Returns:
+        dict: loan_count, loans_found, total_amount, weighted_risk, credit score
+            and duration histograms and employment_mix
+
+    Raises:
+        TrancheDetailError: 400 for an invalid id, 404 if the tranche does not exist
+    """
+    oid = parse_tranche_id(tranche_id)
+    tranche = await db["tranches"].find_one(
+        {"_id": oid}, {"version": 1, "loan_count": {"$size": {"$ifNull": ["$loans", []]}}}
+    )
+    if tranche is None:
+        raise TrancheDetailError(404, "Tranche not found")
+
+    key = (tranche_id, tranche.get("version", 0))
+    cached = composition_cache.get(key)
+    if cached is not None:
+        return cached
+
+    results = await db["tranches"].aggregate(composition_pipeline(oid)).to_list(length=1)
+    composition = format_composition(tranche, results[0] if results else None)
+    composition_cache.set(key, composition)
+    return composition
+
+
+async def get_tranche_loans_page(db, tranche_id: str, offset: int, limit: int,
+                                 projection: Optional[dict] = None) -> dict:
+    """Return one page of a tranche's loans, in the tranche's loan order.
+
+    Args:
+        db: Motor database
+        tranche_id: ID of the tranche
+        offset: Position in the tranche's loan list to start at
+        limit: Page size
+        projection: Optional loan projection (see loan_query.build_projection)
+
+    Returns:
+        dict: loans (string ids), loan_count, offset and next_offset (None on the last page)
+
+    Raises:
+        TrancheDetailError: 400 for an invalid id, 404 if the tranche does not exist
+    """
+    oid = parse_tranche_id(tranche_id)
+    loans = {"$ifNull": ["$loans", []]}
+    pages = await db["tranches"].aggregate([
+        {"$match": {"_id": oid}},
+        {"$project": {"loans": {"$slice": [loans, offset, limit]}, "loan_count": {"$size": loans}}},
+    ]).to_list(length=1)
+    if not pages:
+        raise TrancheDetailError(404, "Tranche not found")
+    tranche = pages[0]
+
+    loan_ids = tranche.get("loans", [])
+    found = {}
+    if loan_ids:
+        async for loan in db["loans"].find({"_id": {"$in": loan_ids}}, projection):
+            loan["_id"] = str(loan["_id"])
+            found[loan["_id"]] = loan
+
+    next_offset = offset + len(loan_ids)
+    return {
+        "loans": [found[str(loan_id)] for loan_id in loan_ids if str(loan_id) in found],
+        "missing": [str(loan_id) for loan_id in loan_ids if str(loan_id) not in found],
+        "loan_count": tranche["loan_count"],
+        "offset": offset,
+        "next_offset": next_offset if next_offset < tranche["loan_count"] else None,
+    }
@@ -0,0 +1,119 @@
+"""Marketplace listing of available tranches.
+
+Unsold tranches are listed in `_id` order, one keyset page at a time, with
+optional filters on risk category, criteria, suboption and budget. The page is
+built entirely by one aggregation pipeline:
+- the filter and the `_id` keyset condition are matched first, on the
+  (investor_id, ..., _id) indexes declared in app.config.indexes,
+- ids are converted with `$toString` on the server, so the documents coming
+  back are JSON-ready and need no per-tranche Python conversion,
+- the `loans` array is left out unless requested; `loan_count` is always given.
+"""
+
+import os
+import logging
+from typing import Optional
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# Listing settings
+TRANCHE_PAGE_DEFAULT_LIMIT = int(os.getenv("TRANCHE_PAGE_DEFAULT_LIMIT", 50))
+TRANCHE_PAGE_MAX_LIMIT = int(os.getenv("TRANCHE_PAGE_MAX_LIMIT", 500))
+
+# Tranche fields returned as stored (ids and loans are converted separately)
+LISTING_FIELDS = (
+    "tranche_name", "risk_category", "return_category", "payment_priority", "budget_spent",
+    "average_risk", "investor_budget", "criteria", "suboption",
+)
+
+
+class TrancheQueryError(ValueError):
+    """Raised for an invalid listing cursor or filter."""
+
+
+def build_tranche_filter(risk_category: Optional[str] = None, criteria: Optional[str] = None,
+                         suboption: Optional[str] = None, min_budget: Optional[float] = None,
+                         max_budget: Optional[float] = None) -> dict:
+    """Build the MongoDB filter for available tranches.
+
+    Args:
+        risk_category: Exact risk category, e.g. "Low"
+        criteria: Exact allocation criterion, e.g. "Duration"
+        suboption: Exact allocation suboption, e.g. "Short-Term"
+        min_budget: Minimum budget_spent (inclusive)
+        max_budget: Maximum budget_spent (inclusive)
+
+    Returns:
+        dict: MongoDB filter (always restricted to unsold tranches)
+
+    Raises:
+        TrancheQueryError: If min_budget is greater than max_budget
+    """
+    query = {"investor_id": None}
+    if risk_category:
+        query["risk_category"] = risk_category
+    if criteria:
+        query["criteria"] = criteria
+    if suboption:
+        query["suboption"] = suboption
+    if min_budget is not None and max_budget is not None and min_budget > max_budget:
+        raise TrancheQueryError("min_budget cannot be greater than max_budget")
+    budget = {}
+    if min_budget is not None:
+        budget["$gte"] = min_budget
+    if max_budget is not None:
+        budget["$lte"] = max_budget
+    if budget:
+        query["budget_spent"] = budget
+    return query
+
+
+def parse_tranche_cursor(after: Optional[str]) -> Optional[ObjectId]:
+    """Parse the `after` cursor (the last tranche id of the previous page)."""
+    if after is None:
+        return None
+    if not ObjectId.is_valid(after):
+        raise TrancheQueryError("Invalid cursor")
+    return ObjectId(after)
+
+
+def listing_projection(include_loans: bool) -> dict:
+    """Projection stage converting ids to strings and optionally expanding loans."""
+    loans = {"$ifNull": ["$loans", []]}
+    projection = {
+        "_id": {"$toString": "$_id"},
+        **{field: 1 for field in LISTING_FIELDS},
+        "investor_id": {"$literal": None},
+        "loan_count": {"$size": loans},
+    }
+    if include_loans:
+        projection["loans"] = {"$map": {"input": loans, "as": "loan", "in": {"$toString": "$$loan"}}}
+    return projection
+
+
+async def list_available_tranches(collection, query: dict, after: Optional[ObjectId], limit: int,
+                                  include_loans: bool = False) -> tuple:
+    """Fetch one page of available tranches in `_id` order.
+
+    Args:
+        collection: Motor tranches collection
+        query: Filter from build_tranche_filter
+        after: Cursor (last id of the previous page) or None for the first page
+        limit: Page size
+        include_loans: Include the loan id list of each tranche
+
+    Returns:
+        tuple: (tranches, next_cursor), next_cursor being None on the last page
+    """
+    match = {**query, "_id": {"$gt": after}} if after is not None else query
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"_id": 1}},
+        {"$limit": limit + 1},
+        {"$project": listing_projection(include_loans)},
+    ]
+    tranches = await collection.aggregate(pipeline).to_list(length=limit + 1)
+    has_more = len(tranches) > limit
+    tranches = tranches[:limit]
+    return tranches, (tranches[-1]["_id"] if has_more else None)
@@ -0,0 +1,361 @@
+"""Tranche checkout and purchase service.
+
+A checkout writes a batch of tranches in a fixed number of round trips, however
+many tranches or loan ids it contains:
+- every tranche document is built up front; new tranches get their ObjectId
+  client-side, so the ids are known before anything is written,
+- every loan is reserved for its tranche first (loan_reservations); a loan
+  already in another tranche fails the checkout with nothing written,
+- all tranches go to the database in one unordered `bulk_write` (inserts for
+  new tranches, upserts for tranches that already have an id),
+- investors' `tranches` arrays get one `$addToSet` / `$each` per investor,
+  and their portfolio summaries one pipeline update each (portfolio_service);
+  a rewritten tranche that changes owner is pulled from the previous owner's
+  list and portfolio,
+- the marketplace statistics get one `$inc` delta (marketplace_stats).
+
+A purchase claims the tranche with one conditional `find_one_and_update`
+(`investor_id: None`), so of any number of concurrent buyers exactly one wins.
+The investor's tranche list is updated afterwards; if that fails, the claim is
+released again (a compensating update conditional on the same buyer). The
+investor's portfolio summary and the marketplace statistics are updated last.
+
+Every tranche write increments the tranche's `version` (1 for a new tranche),
+which keys the composition cache in app.services.tranche_detail.
+
+With TRANCHE_TRANSACTIONS enabled (requires a replica set), the tranche and
+investor writes of a checkout or purchase run in one transaction instead.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from app.services import loan_reservations, marketplace_stats, portfolio_service
+from app.services.current_user import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+TRANCHE_TRANSACTIONS = os.getenv("TRANCHE_TRANSACTIONS", "").lower() in ("1", "true", "yes")
+
+
+class TrancheError(Exception):
+    """Tranche operation failure carrying the HTTP status the API should return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def build_tranche_documents(tranches: List[dict]) -> List[dict]:
+    """Convert tranche dicts (from Tranche.dict(by_alias=True)) into documents ready to write.
+
+    Returns:
+        list: (document, is_new) pairs; documents carry ObjectId ids, investor ids
+            and loan ids, and new tranches get a fresh `_id`
+    """
+    documents = []
+    for tranche in tranches:
+        document = dict(tranche)
+        document.pop("version", None)  # maintained by the writes below
+        if document.get("_id"):
+            document["_id"] = ObjectId(document["_id"])
+            is_new = False
+        else:
+            document["_id"] = ObjectId()
+            is_new = True
+        if document.get("investor_id"):
+            document["investor_id"] = ObjectId(document["investor_id"])
+        document["loans"] = [ObjectId(loan) for loan in document.get("loans", [])]
+        documents.append((document, is_new))
+    return documents
+
+
+def build_checkout_operations(documents: list) -> tuple:
+    """Build the tranche bulk operations and the per-investor portfolio entries.
+
+    Args:
+        documents: (document, is_new) pairs from build_tranche_documents
+
+    Returns:
+        tuple: (tranche operations, {investor_id: {tranche id: portfolio entry}})
+    """
+    operations = []
+    by_investor = defaultdict(dict)
+    for document, is_new in documents:
+        if is_new:
+            operations.append(InsertOne({**document, "version": 1}))
+        else:
+            operations.append(
+                UpdateOne({"_id": document["_id"]}, {"$set": document, "$inc": {"version": 1}}, upsert=True)
+            )
+        if document.get("investor_id"):
+            by_investor[document["investor_id"]][document["_id"]] = portfolio_service.portfolio_entry(document)
+    return operations, dict(by_investor)
+
+
+async def _previous_tranches(db, documents: list, session=None) -> dict:
+    """Stored statistics fields of the tranches a checkout rewrites."""
+    existing_ids = [document["_id"] for document, is_new in documents if not is_new]
+    if not existing_ids:
+        return {}
+    cursor = db["tranches"].find({"_id": {"$in": existing_ids}}, marketplace_stats.STATS_PROJECTION, session=session)
+    return {tranche["_id"]: tranche async for tranche in cursor}
+
+
+def _previous_owners(documents: list, previous: dict) -> dict:
+    """{investor_id: [tranche ids]} for rewritten tranches whose investor changed or was cleared."""
+    moved = defaultdict(list)
+    for document, is_new in documents:
+        owner = previous.get(document["_id"], {}).get("investor_id")
+        if not is_new and owner is not None and owner != document.get("investor_id"):
+            moved[owner].append(document["_id"])
+    return dict(moved)
+
+
+async def _remove_from_previous_owners(db, moved: dict, session=None) -> None:
+    """Drop reassigned tranches from their previous investors' lists and portfolios."""
+    await db["users"].bulk_write(
+        [UpdateOne({"_id": investor_id}, {"$pull": {"tranches": {"$in": tranche_ids}}})
+         for investor_id, tranche_ids in moved.items()],
+        ordered=False,
+        session=session,
+    )
+    for investor_id, tranche_ids in moved.items():
+        invalidate_user(user_id=investor_id)
+        try:
+            for tranche_id in tranche_ids:
+                await portfolio_service.remove_tranche(db, investor_id, tranche_id, session=session)
+        except Exception:
+            if session is not None:
+                raise  # aborts the transaction
+            logger.error("Portfolio update failed during checkout", exc_info=True)
+            await portfolio_service.invalidate_portfolio(db, investor_id)
+
+
+async def _apply_stats(db, delta: dict, session=None) -> None:
+    try:
+        await marketplace_stats.apply_delta(db, delta, session=session)
+    except Exception:
+        if session is not None:
+            raise  # aborts the transaction
+        # Corrected by the periodic reconciliation task
+        logger.error("Marketplace statistics update failed", exc_info=True)
+
+
+async def _reserve_loans(db, documents: list, session=None) -> list:
+    """Reserve every loan of the checkout for its tranche; 409 on conflicts."""
+    claims = {document["_id"]: document["loans"] for document, _ in documents}
+    try:
+        return await loan_reservations.claim_loans(db, claims, session=session)
+    except loan_reservations.LoanReservationConflict as e:
+        sample = ", ".join(e.loan_ids[:20])
+        raise TrancheError(409, f"{len(e.loan_ids)} loan(s) already belong to another tranche: {sample}")
+
+
+async def _write_checkout(db, documents: list, operations: list, by_investor: dict, session=None) -> dict:
+    reserved = await _reserve_loans(db, documents, session=session)
+    previous = await _previous_tranches(db, documents, session=session)
+    try:
+        result = await db["tranches"].bulk_write(operations, ordered=False, session=session)
+    except Exception:
+        if session is None:
+            await loan_reservations.release_claims(db, reserved)
+        raise
+    for document, is_new in documents:
+        if not is_new:  # loans dropped from a rewritten tranche become available again
+            await loan_reservations.release_tranche_loans(db, document["_id"], keep=document["loans"], session=session)
+    await _apply_stats(db, marketplace_stats.checkout_delta(documents, previous), session=session)
+    moved = _previous_owners(documents, previous)
+    if moved:
+        await _remove_from_previous_owners(db, moved, session=session)
+    if by_investor:
+        await db["users"].bulk_write(
+            [
+                UpdateOne({"_id": investor_id}, {"$addToSet": {"tranches": {"$each": list(entries)}}})
+                for investor_id, entries in by_investor.items()
+            ],
+            ordered=False,
+            session=session,
+        )
+        for investor_id in by_investor:
+            invalidate_user(user_id=investor_id)
+        try:
+            await db[portfolio_service.PORTFOLIOS_COLLECTION].bulk_write(
+                portfolio_service.portfolio_operations(by_investor), ordered=False, session=session
+            )
+        except Exception:
+            if session is not None:
+                raise  # aborts the transaction
+            # The tranches are written; drop the summaries so the next reads rebuild them
+            logger.error("Portfolio update failed during checkout", exc_info=True)
+            for investor_id in by_investor:
+                await portfolio_service.invalidate_portfolio(db, investor_id)
+    return {
+        "inserted": result.inserted_count,
+        "updated": result.matched_count + result.upserted_count,
+        "investors_updated": len(by_investor),
+    }
+
+
+async def checkout_tranches(db, tranches: List[dict], use_transaction: bool = TRANCHE_TRANSACTIONS) -> dict:
+    """Write a checkout of tranches with one bulk write per collection.
+
+    Args:
+        db: Motor database
+        tranches: Tranche dicts (Tranche.dict(by_alias=True))
+        use_transaction: Run all writes in a single transaction
+
+    Returns:
+        dict: tranche_ids (in request order), inserted, updated and investors_updated counts
+
+    Raises:
+        TrancheError: 409 if a loan already belongs to another tranche
+    """
+    documents = build_tranche_documents(tranches)
+    if not documents:
+        return {"tranche_ids": [], "inserted": 0, "updated": 0, "investors_updated": 0}
+    operations, by_investor = build_checkout_operations(documents)
+
+    if use_transaction:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                counts = await _write_checkout(db, documents, operations, by_investor, session=session)
+    else:
+        counts = await _write_checkout(db, documents, operations, by_investor)
+
+    logger.info(f"Checked out {len(documents)} tranches for {len(by_investor)} investors")
+    return {"tranche_ids": [str(document["_id"]) for document, _ in documents], **counts}
+
+
+async def _claim_tranche(db, tranche_id: ObjectId, investor_id: ObjectId, session=None) -> Optional[dict]:
+    """Atomically assign an unsold tranche to the investor.
+
+    Returns:
+        dict | None: The tranche's portfolio fields, or None if it is not for sale
+    """
+    return await db["tranches"].find_one_and_update(
+        {"_id": tranche_id, "investor_id": None},
+        {"$set": {"investor_id": investor_id}, "$inc": {"version": 1}},
+        projection=portfolio_service.ENTRY_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+async def _add_to_investor(db, investor_id: ObjectId, tranche_id: ObjectId, session=None) -> bool:
+    """Add the tranche to the investor's list; False if the investor does not exist."""
+    result = await db["users"].update_one(
+        {"_id": investor_id}, {"$addToSet": {"tranches": tranche_id}}, session=session
+    )
+    invalidate_user(user_id=investor_id)
+    return result.matched_count == 1
+
+
+async def _release_tranche(db, tranche_id: ObjectId, investor_id: ObjectId) -> None:
+    """Undo a claim, only if the tranche still belongs to this buyer."""
+    await db["tranches"].update_one({"_id": tranche_id, "investor_id": investor_id},
+                                     {"$set": {"investor_id": None}, "$inc": {"version": 1}})
+
+
+async def _unavailable_error(db, tranche_id: ObjectId, session=None) -> TrancheError:
+    if await db["tranches"].count_documents({"_id": tranche_id}, limit=1, session=session):
+        return TrancheError(409, "Tranche already sold")
+    return TrancheError(404, "Tranche not found")
+
+
+async def purchase_tranche(db, tranche_id: str, investor_id: str, use_transaction: bool = TRANCHE_TRANSACTIONS) -> None:
+    """Sell an unsold tranche to an investor, exactly once.
+
+    Args:
+        db: Motor database
+        tranche_id: ID of the tranche to purchase
+        investor_id: ID of the purchasing investor
+        use_transaction: Claim and investor update in one transaction instead of
+            claim followed by a compensating release on failure
+
+    Raises:
+        TrancheError: 400 for invalid ids, 404 if the tranche or investor does not
+            exist, 409 if the tranche is already sold
+    """
+    if not ObjectId.is_valid(tranche_id) or not ObjectId.is_valid(investor_id):
+        raise TrancheError(400, "Invalid tranche or investor ID format")
+    tranche_oid, investor_oid = ObjectId(tranche_id), ObjectId(investor_id)
+
+    if use_transaction:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                tranche = await _claim_tranche(db, tranche_oid, investor_oid, session=session)
+                if tranche is None:
+                    raise await _unavailable_error(db, tranche_oid, session=session)
+                if not await _add_to_investor(db, investor_oid, tranche_oid, session=session):
+                    raise TrancheError(404, "Investor not found")  # aborts the transaction
+                await portfolio_service.add_tranche(
+                    db, investor_oid, tranche_oid, portfolio_service.portfolio_entry(tranche), session=session
+                )
+                await _apply_stats(db, marketplace_stats.purchase_delta(tranche), session=session)
+        return
+
+    tranche = await _claim_tranche(db, tranche_oid, investor_oid)
+    if tranche is None:
+        raise await _unavailable_error(db, tranche_oid)
+    try:
+        added = await _add_to_investor(db, investor_oid, tranche_oid)
+    except Exception:
+        logger.error(f"Investor update failed; releasing tranche {tranche_id}", exc_info=True)
+        await _release_tranche(db, tranche_oid, investor_oid)
+        raise
+    if not added:
+        await _release_tranche(db, tranche_oid, investor_oid)
+        raise TrancheError(404, "Investor not found")
+
+    try:
+        await portfolio_service.add_tranche(db, investor_oid, tranche_oid, portfolio_service.portfolio_entry(tranche))
+    except Exception:
+        # The purchase itself stands; drop the summary so the next read rebuilds it
+        logger.error(f"Portfolio update failed for investor {investor_id}", exc_info=True)
+        await portfolio_service.invalidate_portfolio(db, investor_oid)
+    await _apply_stats(db, marketplace_stats.purchase_delta(tranche))
+
+
+async def _delete_tranche(db, tranche_oid: ObjectId, session=None) -> None:
+    tranche = await db["tranches"].find_one_and_delete(
+        {"_id": tranche_oid}, projection=marketplace_stats.STATS_PROJECTION, session=session
+    )
+    if tranche is None:
+        raise TrancheError(404, "Tranche not found")
+    await loan_reservations.release_tranche_loans(db, tranche_oid, session=session)
+    investor_oid = tranche.get("investor_id")
+    if investor_oid:
+        await db["users"].update_one({"_id": investor_oid}, {"$pull": {"tranches": tranche_oid}}, session=session)
+        invalidate_user(user_id=investor_oid)
+        await portfolio_service.remove_tranche(db, investor_oid, tranche_oid, session=session)
+    await _apply_stats(db, marketplace_stats.merge_deltas([marketplace_stats.stats_delta(tranche, -1)]),
+                       session=session)
+
+
+async def delete_tranche(db, tranche_id: str, use_transaction: bool = TRANCHE_TRANSACTIONS) -> None:
+    """Delete a tranche and release its loans, investor link, portfolio entry and statistics.
+
+    Args:
+        db: Motor database
+        tranche_id: ID of the tranche to delete
+        use_transaction: Run all writes in a single transaction
+
+    Raises:
+        TrancheError: 400 for an invalid id, 404 if the tranche does not exist
+    """
+    if not ObjectId.is_valid(tranche_id):
+        raise TrancheError(400, "Invalid tranche ID format")
+    tranche_oid = ObjectId(tranche_id)
+
+    if use_transaction:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                await _delete_tranche(db, tranche_oid, session=session)
+    else:
+        await _delete_tranche(db, tranche_oid)
+    logger.info(f"Deleted tranche {tranche_id}")
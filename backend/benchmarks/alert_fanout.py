@@ -0,0 +1,58 @@
+"""Alert fan-out benchmark.
+
+Renders an alert for N synthetic investors and sends it in batches the way the
+`send_alert_batch` Celery subtasks do (each batch on its own pool of SMTP
+connections), with --parallel batches at a time standing in for Celery
+workers. Reports render time, delivery time and throughput. No database or
+broker is needed; point SMTP_* at a local debugging server:
+
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_STARTTLS=false EMAIL_PASSWORD= \\
+        python -m benchmarks.alert_fanout --investors 5000 --parallel 4
+"""
+
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from app.services.alert_fanout import ALERT_BATCH_SIZE, ALERT_SMTP_CONNECTIONS, send_messages, render_messages
+
+TEMPLATE = "Dear {full_name},\n\nA CPI spike affects the {tranche_count} tranche(s) you hold."
+
+
+def send(batch: list, connections: int) -> tuple:
+    started = time.perf_counter()
+    errors = asyncio.run(send_messages(batch, connections))
+    return sum(error is not None for error in errors), time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark alert fan-out delivery.")
+    parser.add_argument("--investors", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=ALERT_BATCH_SIZE)
+    parser.add_argument("--connections", type=int, default=ALERT_SMTP_CONNECTIONS)
+    parser.add_argument("--parallel", type=int, default=4, help="Batches sent at once (Celery workers)")
+    args = parser.parse_args()
+
+    investors = [{"email": f"investor{i}@example.com", "full_name": f"Investor {i}", "tranche_count": i % 7 + 1}
+                 for i in range(args.investors)]
+    started = time.perf_counter()
+    messages = render_messages("benchmark", investors, "CPI Spike Alert", TEMPLATE)
+    rendered = time.perf_counter() - started
+    batches = [messages[i:i + args.batch_size] for i in range(0, len(messages), args.batch_size)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        results = list(pool.map(lambda batch: send(batch, args.connections), batches))
+    elapsed = time.perf_counter() - started
+
+    failed = sum(failures for failures, _ in results)
+    print(f"rendered {len(messages):,} messages in {rendered * 1000:.1f} ms")
+    print(f"delivered {len(messages) - failed:,} ({failed} failed) in {len(batches)} batch(es) "
+          f"x {args.connections} connection(s), {args.parallel} in parallel: "
+          f"{elapsed:.2f}s, {(len(messages) - failed) / elapsed:.1f} emails/s, "
+          f"slowest batch {max(seconds for _, seconds in results):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Risk scoring and tranche allocation at scale.
+
+Times the two CPU-heavy steps behind `/pool/allocate` on synthetic loan sets
+of growing size (app.ml.synthetic, fixed seed), without going through the API
+or reading loans from MongoDB:
+
+    python -m benchmarks.allocation_scale --rows 10000 100000 1000000
+    python -m benchmarks.allocation_scale --rows 100000 --criteria Duration:Short-Term
+
+MONGO_URI must still be set: allocation thresholds are read from the
+`thresholds` collection, exactly as in the allocation workers.
+"""
+
+import time
+import argparse
+from app.ml.synthetic import generate_loan_frame
+from app.services.allocation_worker import init_allocation_worker, predict_risk_scores
+from app.services.pool_service import allocate_tranches
+
+DEFAULT_CRITERIA = ["Duration:Short-Term", "Creditworthiness:Good", "Risk-Based:Very Low Risk"]
+
+
+def timed(fn, *args):
+    """Run fn and return (result, seconds)."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def run(rows: int, seed: int, criteria: list, budget: float) -> None:
+    """Generate `rows` loans, score them and allocate them for each criterion."""
+    df, generate_seconds = timed(generate_loan_frame, rows, seed)
+    predictions, score_seconds = timed(predict_risk_scores, df)
+    if predictions is None:
+        print(f"{rows:>10,} rows: scoring failed")
+        return
+    df["Predicted_RiskScore"] = predictions
+    print(f"{rows:>10,} rows: generate {generate_seconds:7.2f}s  score {score_seconds:7.2f}s "
+          f"({rows / score_seconds:,.0f} rows/s)")
+
+    for spec in criteria:
+        criterion, suboption = spec.split(":", 1)
+        tranches, seconds = timed(allocate_tranches, df.copy(), criterion, suboption, budget)
+        selected = sum(len(tranche) for tranche in tranches.values()) if tranches else 0
+        print(f"{'':>16}allocate {spec:<28} {seconds:7.2f}s  {selected:,} loans selected")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark scoring and allocation on synthetic loans.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--criteria", nargs="+", default=DEFAULT_CRITERIA, help="criterion:suboption pairs")
+    parser.add_argument("--budget", type=float, default=5_000_000)
+    args = parser.parse_args()
+
+    init_allocation_worker()
+    for rows in args.rows:
+        run(rows, args.seed, args.criteria, args.budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Bulk loan ingestion throughput benchmark.
+
+Generates a synthetic loan tape in memory and uploads it to `POST /loans/bulk`
+as NDJSON or CSV, then prints the server's ingestion report and the end-to-end
+rate. Compare with route_load_test.py, which creates loans one request at a time:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.bulk_ingest --rows 500000 --format ndjson
+"""
+
+import csv
+import io
+import json
+import random
+import argparse
+from benchmarks.common import DEFAULT_BASE_URL, add_token_argument, use_token, http_request
+from benchmarks.route_load_test import SAMPLE_LOAN
+
+
+def make_rows(count: int, seed: int = 7):
+    """Yield `count` sample loans with varied numeric fields."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        row = dict(SAMPLE_LOAN)
+        row["Age"] = rng.randint(21, 70)
+        row["CreditScore"] = rng.randint(450, 850)
+        row["LoanAmount"] = rng.randint(1000, 80000)
+        row["AnnualIncome"] = rng.randint(15000, 250000)
+        yield row
+
+
+def encode(rows, fmt: str) -> bytes:
+    """Encode rows as an NDJSON or CSV body."""
+    if fmt == "ndjson":
+        return "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(SAMPLE_LOAN))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    body = encode(make_rows(args.rows), args.format)
+    content_type = "application/x-ndjson" if args.format == "ndjson" else "text/csv"
+    print(f"Uploading {args.rows} loans ({len(body) / 1e6:.1f} MB of {args.format})...")
+    result = http_request(
+        "POST", f"{args.base_url.rstrip('/')}/loans/bulk", body,
+        headers={"Content-Type": content_type}, timeout=3600.0,
+    )
+    if result["status"] != 200:
+        raise SystemExit(f"Upload failed with status {result['status']}: {result['body'][:500]!r}")
+
+    report = json.loads(result["body"])
+    print(
+        f"inserted={report['inserted']} failed={report['failed']} "
+        f"server rate={report['rows_per_second']:.0f} rows/s "
+        f"end-to-end rate={args.rows / result['latency']:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Shared helpers for the backend benchmark scripts.
+
+The benchmarks talk to a running API over plain HTTP (stdlib only) so they can be
+pointed at any build of the backend, e.g. the current tree and an older commit,
+and their numbers compared side by side.
+
+The loan, pool and tranche routes require a bearer token: log in once and pass
+it with --token (or BENCHMARK_TOKEN); every request then carries it.
+"""
+
+import os
+import json
+import time
+import statistics
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BASE_URL = "http://localhost:8000"
+
+# Headers sent with every request (set by use_token)
+_default_headers = {}
+
+
+def add_token_argument(parser) -> None:
+    """Add the --token option (access token from POST /auth/login) to a benchmark's parser."""
+    parser.add_argument("--token", default=os.getenv("BENCHMARK_TOKEN"),
+                        help="Bearer token for protected routes (default: $BENCHMARK_TOKEN)")
+
+
+def use_token(token) -> None:
+    """Send `Authorization: Bearer <token>` with every following request."""
+    _default_headers.pop("Authorization", None)
+    if token:
+        _default_headers["Authorization"] = f"Bearer {token}"
+
+
+def auth_headers() -> dict:
+    """Headers to add to requests made outside http_request."""
+    return dict(_default_headers)
+
+
+def http_request(method: str, url: str, body=None, headers=None, timeout: float = 60.0) -> dict:
+    """Send one HTTP request and time it.
+
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        body: Optional JSON-serializable body, or raw bytes
+        headers: Optional extra headers
+        timeout: Socket timeout in seconds
+
+    Returns:
+        dict: status, latency (seconds), size (response bytes) and body (bytes)
+    """
+    data = None
+    headers = {**_default_headers, **(headers or {})}
+    if body is not None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        headers.setdefault("Content-Type", "application/json")
+
+    request = urllib.request.Request(url, data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        status = e.code
+    except (urllib.error.URLError, TimeoutError) as e:
+        payload = str(e).encode("utf-8")
+        status = 0
+    return {"status": status, "latency": time.perf_counter() - start, "size": len(payload), "body": payload}
+
+
+def run_concurrent(task, total: int, concurrency: int) -> tuple:
+    """Run `task(i)` for i in range(total) with a fixed number of concurrent workers.
+
+    Returns:
+        tuple: (results list, wall-clock seconds)
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(task, range(total)))
+    return results, time.perf_counter() - start
+
+
+def percentile(values, pct: float) -> float:
+    """Return the pct-th percentile (0-100) of values using nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(results, wall: float) -> dict:
+    """Summarize timed results into throughput and latency percentiles (milliseconds)."""
+    latencies = [r["latency"] for r in results]
+    ok = [r for r in results if 200 <= r["status"] < 300]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def print_summary(title: str, summary: dict) -> None:
+    """Print a one-block, human-readable benchmark summary."""
+    print(f"\n== {title} ==")
+    print(
+        f"requests={summary['requests']} ok={summary['ok']} errors={summary['errors']} "
+        f"throughput={summary['throughput_rps']:.1f} req/s"
+    )
+    print(
+        f"latency ms: mean={summary['mean_ms']:.1f} p50={summary['p50_ms']:.1f} "
+        f"p95={summary['p95_ms']:.1f} p99={summary['p99_ms']:.1f} max={summary['max_ms']:.1f}"
+    )
@@ -0,0 +1,86 @@
+"""Email delivery benchmark: one SMTP session per email vs. the outbox's pooled connections.
+
+Sends N messages to the configured SMTP server (SMTP_SERVER / SMTP_PORT /
+SMTP_STARTTLS / EMAIL_ADDRESS / EMAIL_PASSWORD), first the way registration used
+to (a new connection, STARTTLS and login per email, send_verification_email),
+then through the outbox's SMTPPool. With --outbox the pooled run goes through
+MongoDB as well: messages are enqueued in `email_outbox` and drained by
+drain_outbox, then removed.
+
+Run it against a local debugging server, never a real mailbox:
+
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_STARTTLS=false EMAIL_PASSWORD= \
+        python -m benchmarks.email_delivery --emails 500
+"""
+
+import time
+import uuid
+import asyncio
+import argparse
+from app.services.email_service import send_verification_email
+from app.services.email_outbox import (
+    EMAIL_BATCH_SIZE, OUTBOX_COLLECTION, SMTPPool, build_message, drain_outbox, enqueue_email,
+)
+
+
+def per_email_sessions(count: int, recipient: str) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        send_verification_email(recipient, f"benchmark-{i}")
+    return time.perf_counter() - started
+
+
+async def pooled(count: int, recipient: str, connections: int) -> tuple:
+    pool = SMTPPool(connections)
+    documents = [{"_id": f"benchmark-{uuid.uuid4().hex}", "to": recipient, "subject": "Benchmark",
+                  "body": f"Message {i}"} for i in range(count)]
+    started = time.perf_counter()
+    for offset in range(0, count, EMAIL_BATCH_SIZE):
+        batch = documents[offset:offset + EMAIL_BATCH_SIZE]
+        await asyncio.gather(*(pool.send(build_message(document)) for document in batch))
+    elapsed = time.perf_counter() - started
+    await pool.close()
+    return elapsed, pool.connects
+
+
+async def outbox(count: int, recipient: str, connections: int) -> tuple:
+    from app.config.database import get_async_database
+
+    db = get_async_database()
+    run = uuid.uuid4().hex
+    pool = SMTPPool(connections)
+    started = time.perf_counter()
+    for i in range(count):
+        await enqueue_email(db, recipient, "Benchmark", f"Message {i}", dedupe_key=f"benchmark:{run}:{i}")
+    enqueued = time.perf_counter() - started
+    totals = await drain_outbox(db, pool)
+    elapsed = time.perf_counter() - started
+    await pool.close()
+    await db[OUTBOX_COLLECTION].delete_many({"_id": {"$regex": f"^benchmark:{run}:"}})
+    return enqueued, elapsed, totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark email delivery.")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--recipient", default="benchmark@example.com")
+    parser.add_argument("--connections", type=int, default=2)
+    parser.add_argument("--outbox", action="store_true", help="Also enqueue and drain through MongoDB")
+    args = parser.parse_args()
+
+    elapsed = per_email_sessions(args.emails, args.recipient)
+    print(f"one session per email: {args.emails / elapsed:8.1f} emails/s ({elapsed * 1000 / args.emails:.1f} ms each)")
+
+    elapsed, connects = asyncio.run(pooled(args.emails, args.recipient, args.connections))
+    print(f"pooled ({args.connections} conns):     {args.emails / elapsed:8.1f} emails/s "
+          f"({elapsed * 1000 / args.emails:.1f} ms each, {connects} connection(s) opened)")
+
+    if args.outbox:
+        enqueued, elapsed, totals = asyncio.run(outbox(args.emails, args.recipient, args.connections))
+        print(f"outbox enqueue:           {enqueued * 1000 / args.emails:.2f} ms per email (registration cost)")
+        print(f"outbox enqueue + drain:   {args.emails / elapsed:8.1f} emails/s {totals}")
+
+
+if __name__ == "__main__":
+    main()
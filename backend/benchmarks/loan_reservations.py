@@ -0,0 +1,70 @@
+"""Loan reservation claim benchmark.
+
+Times the operations behind checkout's double-allocation check directly
+against MongoDB (MONGO_URI; random loan ids, so no real loans are touched):
+- claiming N loans for a new tranche,
+- re-claiming the same loans for the same tranche (idempotent re-checkout),
+- a conflicting claim of the same loans by another tranche (fails fast),
+- releasing the tranche's reservations.
+
+    python -m benchmarks.loan_reservations --loans 10000 --repeat 5
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+from bson import ObjectId
+from app.services.loan_reservations import LoanReservationConflict, claim_loans, release_tranche_loans
+
+
+async def timed(coro) -> tuple:
+    started = time.perf_counter()
+    try:
+        result = await coro
+    except LoanReservationConflict as e:
+        result = e
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def run(loans: int, repeat: int) -> None:
+    from app.config.database import get_async_database
+
+    db = get_async_database()
+    timings = {"claim": [], "re-claim (same tranche)": [], "conflicting claim": [], "release": []}
+    for _ in range(repeat):
+        loan_ids = [ObjectId(os.urandom(12)) for _ in range(loans)]
+        tranche_id, other_id = ObjectId(), ObjectId()
+
+        claimed, ms = await timed(claim_loans(db, {tranche_id: loan_ids}))
+        assert len(claimed) == loans, "every loan should be newly reserved"
+        timings["claim"].append(ms)
+
+        claimed, ms = await timed(claim_loans(db, {tranche_id: loan_ids}))
+        assert claimed == [], "re-claiming for the same tranche is a no-op"
+        timings["re-claim (same tranche)"].append(ms)
+
+        conflict, ms = await timed(claim_loans(db, {other_id: loan_ids}))
+        assert isinstance(conflict, LoanReservationConflict) and len(conflict.loan_ids) == loans
+        timings["conflicting claim"].append(ms)
+
+        released, ms = await timed(release_tranche_loans(db, tranche_id))
+        assert released == loans
+        timings["release"].append(ms)
+
+    print(f"{loans:,} loans, {repeat} runs (milliseconds)")
+    for name, values in timings.items():
+        print(f"  {name:<26} median={statistics.median(values):8.1f}  max={max(values):8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark loan reservation claims.")
+    parser.add_argument("--loans", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.loans, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Login throughput benchmark.
+
+Floods POST /auth/login with a verified account's credentials while a second
+set of clients hits a cheap route, to show both login throughput and whether
+unrelated requests stall behind bcrypt. 429 responses (password pool full)
+are counted separately from errors.
+
+    # terminal 1 (one worker; compare PASSWORD_WORKERS=0 against the pool)
+    uvicorn app.main:app --workers 1 --port 8000
+    # terminal 2
+    python -m benchmarks.login_throughput --email user@example.com --password secret \
+        --requests 500 --concurrency 64
+
+Add --rounds to also time local hashing at a given bcrypt cost.
+"""
+
+import time
+import argparse
+import threading
+import urllib.parse
+from benchmarks.common import DEFAULT_BASE_URL, http_request, run_concurrent, summarize, print_summary
+
+
+def time_local_hashing(rounds: int, samples: int = 5) -> None:
+    """Print the mean hash and verify time for one bcrypt cost in this process."""
+    from passlib.context import CryptContext
+
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    started = time.perf_counter()
+    hashes = [context.hash("benchmark-password") for _ in range(samples)]
+    hashed = (time.perf_counter() - started) / samples
+    started = time.perf_counter()
+    for value in hashes:
+        context.verify("benchmark-password", value)
+    verified = (time.perf_counter() - started) / samples
+    print(f"bcrypt cost {rounds}: hash={hashed * 1000:.1f} ms verify={verified * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark login throughput.")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--email", required=True, help="Verified account used for every login")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--probe-concurrency", type=int, default=4,
+                        help="Clients hitting GET / during the login flood")
+    parser.add_argument("--rounds", type=int, help="Also time local hashing at this bcrypt cost")
+    args = parser.parse_args()
+
+    if args.rounds:
+        time_local_hashing(args.rounds)
+
+    form = urllib.parse.urlencode({"username": args.email, "password": args.password}).encode("utf-8")
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    login_url = f"{args.base_url}/auth/login"
+
+    probes, done = [], threading.Event()
+
+    def probe_loop() -> None:
+        while not done.is_set():
+            probes.append(http_request("GET", f"{args.base_url}/"))
+
+    probe_threads = [threading.Thread(target=probe_loop, daemon=True) for _ in range(args.probe_concurrency)]
+    for thread in probe_threads:
+        thread.start()
+    results, wall = run_concurrent(
+        lambda _: http_request("POST", login_url, body=form, headers=headers), args.requests, args.concurrency
+    )
+    done.set()
+    for thread in probe_threads:
+        thread.join()
+
+    rejected = sum(1 for r in results if r["status"] == 429)
+    print_summary("POST /auth/login", summarize(results, wall))
+    print(f"rejected with 429: {rejected}")
+    if probes:
+        print_summary("GET / during the login flood", summarize(probes, wall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Marketplace listing benchmark.
+
+Seeds a large marketplace (10k+ unsold tranches with realistic loan id lists)
+and measures `GET /tranch/available` response size and latency for:
+- the first page (default projection, without loans),
+- a filtered page (risk category),
+- a page with `include_loans=true`,
+- walking every page via the X-Next-Cursor header.
+
+Tranches are inserted directly in MongoDB (MONGO_URI must point at the same,
+preferably scratch, database as the API) and removed at the end:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.marketplace_listing --tranches 20000 --loans 2000
+"""
+
+import os
+import time
+import argparse
+from urllib.parse import urlencode
+from bson import ObjectId
+from benchmarks.common import (
+    DEFAULT_BASE_URL, add_token_argument, auth_headers, use_token,
+    http_request, run_concurrent, summarize, print_summary,
+)
+
+RISK_CATEGORIES = ["Low", "Medium", "High"]
+CRITERIA = [("Duration", "Short-Term"), ("Duration", "Long-Term"), ("Creditworthiness", "Good")]
+
+
+def seed_tranches(db, count: int, loans_per_tranche: int, run_id: str) -> None:
+    """Insert `count` unsold tranches tagged with run_id, in batches."""
+    batch = []
+    for index in range(count):
+        criteria, suboption = CRITERIA[index % len(CRITERIA)]
+        batch.append({
+            "tranche_name": f"Tranche {index}", "risk_category": RISK_CATEGORIES[index % len(RISK_CATEGORIES)],
+            "return_category": "Stable", "payment_priority": "First to be paid",
+            "loans": [ObjectId(os.urandom(12)) for _ in range(loans_per_tranche)],
+            "budget_spent": float(10_000 + index % 500 * 1000), "average_risk": 40.0,
+            "investor_budget": 1_000_000.0, "criteria": criteria, "suboption": suboption,
+            "investor_id": None, "benchmark_run": run_id,
+        })
+        if len(batch) == 1000:
+            db["tranches"].insert_many(batch)
+            batch = []
+    if batch:
+        db["tranches"].insert_many(batch)
+
+
+def measure(title: str, url: str, requests: int, concurrency: int) -> None:
+    results, wall = run_concurrent(lambda i: http_request("GET", url), requests, concurrency)
+    print_summary(title, summarize(results, wall))
+    sizes = [result["size"] for result in results if result["status"] == 200]
+    if sizes:
+        print(f"response size: {sum(sizes) / len(sizes) / 1024:,.1f} KiB")
+
+
+def walk_pages(base: str, limit: int) -> None:
+    """Fetch every page by following X-Next-Cursor and report totals."""
+    import urllib.request
+
+    started = time.perf_counter()
+    pages = total_bytes = 0
+    after = None
+    while True:
+        params = {"limit": limit, **({"after": after} if after else {})}
+        request = urllib.request.Request(f"{base}?{urlencode(params)}", headers=auth_headers())
+        with urllib.request.urlopen(request, timeout=120) as response:
+            total_bytes += len(response.read())
+            after = response.headers.get("X-Next-Cursor")
+        pages += 1
+        if not after:
+            break
+    elapsed = time.perf_counter() - started
+    print(f"\n== full walk (limit={limit}) ==\npages={pages} bytes={total_bytes / 1024 / 1024:,.1f} MiB "
+          f"time={elapsed:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the marketplace listing.")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--tranches", type=int, default=10_000)
+    parser.add_argument("--loans", type=int, default=1000, help="Loan ids per tranche")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded tranches")
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    from app.config.database import get_database
+
+    db = get_database()
+    run_id = str(ObjectId())
+    seed_tranches(db, args.tranches, args.loans, run_id)
+    base = f"{args.base_url.rstrip('/')}/tranch/available"
+    try:
+        measure("first page", f"{base}?limit={args.limit}", args.requests, args.concurrency)
+        measure("filtered page (risk_category=Low)", f"{base}?limit={args.limit}&risk_category=Low",
+                args.requests, args.concurrency)
+        measure("first page with loans", f"{base}?limit={args.limit}&include_loans=true",
+                args.requests, args.concurrency)
+        walk_pages(base, 500)
+    finally:
+        if not args.keep:
+            db["tranches"].delete_many({"benchmark_run": run_id})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Mixed CRUD + allocation traffic benchmark.
+
+Checks that cheap CRUD requests keep their tail latency while CPU-heavy
+`/pool/allocate` requests run at the same time. The script measures CRUD latency
+twice, first on its own and then with a steady background stream of allocation
+requests, and prints both summaries plus the p99 ratio:
+
+    # terminal 1 (one API worker, two allocation workers)
+    ALLOCATION_WORKERS=2 uvicorn app.main:app --workers 1 --port 8000
+    # terminal 2
+    python -m benchmarks.mixed_traffic --requests 2000 --concurrency 32 --allocators 4
+
+Run it once more with ALLOCATION_WORKERS=0 (allocation in the API process) to see
+the baseline the process pool is meant to fix. Allocation requests rejected with
+503 because the pool queue is full are counted separately; they are expected when
+--allocators exceeds ALLOCATION_MAX_PENDING.
+"""
+
+import json
+import time
+import argparse
+import itertools
+import threading
+from benchmarks.common import (
+    DEFAULT_BASE_URL, add_token_argument, use_token,
+    http_request, run_concurrent, summarize, print_summary,
+)
+from benchmarks.route_load_test import SAMPLE_LOAN
+
+
+def crud_phase(base: str, loan_ids, total: int, concurrency: int):
+    """Run the CRUD mix (reads, creates and marketplace listings) and return its summary."""
+    ids = itertools.cycle(loan_ids)
+    routes = [
+        lambda: http_request("GET", f"{base}/loans/{next(ids)}"),
+        lambda: http_request("GET", f"{base}/loans/{next(ids)}"),
+        lambda: http_request("POST", f"{base}/loans/", SAMPLE_LOAN),
+        lambda: http_request("GET", f"{base}/tranch/available"),
+    ]
+    results, wall = run_concurrent(lambda i: routes[i % len(routes)](), total, concurrency)
+    return summarize(results, wall)
+
+
+def allocation_loop(base: str, params: str, stop: threading.Event, results: list) -> None:
+    """Issue allocation requests back to back until `stop` is set."""
+    while not stop.is_set():
+        results.append(http_request("POST", f"{base}/pool/allocate?{params}", timeout=300.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--requests", type=int, default=2000, help="CRUD requests per phase")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent CRUD clients")
+    parser.add_argument("--allocators", type=int, default=4, help="Concurrent allocation clients")
+    parser.add_argument("--seed-loans", type=int, default=50, help="Loans created before measuring")
+    parser.add_argument("--criterion", default="Risk")
+    parser.add_argument("--suboption", default="Low")
+    parser.add_argument("--budget", type=float, default=1_000_000)
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    base = args.base_url.rstrip("/")
+    seeded = [http_request("POST", f"{base}/loans/", SAMPLE_LOAN) for _ in range(args.seed_loans)]
+    loan_ids = [json.loads(r["body"])["id"] for r in seeded if r["status"] == 201]
+    if not loan_ids:
+        raise SystemExit(f"Could not create sample loans at {base}; is the API running?")
+
+    baseline = crud_phase(base, loan_ids, args.requests, args.concurrency)
+    print_summary(f"CRUD only, concurrency={args.concurrency}", baseline)
+
+    params = f"criterion={args.criterion}&suboption={args.suboption}&investor_budget={args.budget}"
+    stop = threading.Event()
+    allocations = []
+    threads = [
+        threading.Thread(target=allocation_loop, args=(base, params, stop, allocations), daemon=True)
+        for _ in range(args.allocators)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        mixed = crud_phase(base, loan_ids, args.requests, args.concurrency)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - start
+
+    print_summary(f"CRUD with {args.allocators} allocation clients, concurrency={args.concurrency}", mixed)
+    rejected = [r for r in allocations if r["status"] == 503]
+    completed = [r for r in allocations if r["status"] != 503]
+    if completed:
+        print_summary("Allocation requests (excluding 503 rejections)", summarize(completed, wall))
+    print(f"allocation requests rejected with 503: {len(rejected)}")
+
+    if baseline["p99_ms"]:
+        print(f"\nCRUD p99 ratio (mixed / CRUD only): {mixed['p99_ms'] / baseline['p99_ms']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Concurrent-request load test for the loan, tranche and auth routes.
+
+Measures how many requests per second a single API worker sustains when many
+clients hit the database-backed routes at once. Run it against a build that uses
+blocking PyMongo calls inside `async def` routes and against the current Motor
+build to compare throughput before and after:
+
+    # terminal 1 (one worker, so event-loop blocking is visible)
+    uvicorn app.main:app --workers 1 --port 8000
+    # terminal 2
+    python -m benchmarks.route_load_test --requests 2000 --concurrency 64
+
+The script creates its own sample loans, then issues a mix of loan reads,
+loan creates, marketplace listings and (with --user-id) user-tranche lookups.
+"""
+
+import json
+import argparse
+import itertools
+from benchmarks.common import (
+    DEFAULT_BASE_URL, add_token_argument, use_token,
+    http_request, run_concurrent, summarize, print_summary,
+)
+
+SAMPLE_LOAN = {
+    "ApplicationDate": "2023-06-01",
+    "Age": 35,
+    "AnnualIncome": 60000,
+    "CreditScore": 690,
+    "LoanAmount": 15000,
+    "LoanDuration": 36,
+    "SavingsAccountBalance": 4000,
+    "CheckingAccountBalance": 1500,
+    "MonthlyIncome": 5000,
+    "MonthlyLoanPayment": 480,
+    "DebtToIncomeRatio": 28,
+    "TotalDebtToIncomeRatio": 33,
+    "NumberOfOpenCreditLines": 4,
+    "NumberOfCreditInquiries": 1,
+    "LengthOfCreditHistory": 9,
+    "NumberOfDependents": 1,
+    "PreviousLoanDefaults": 0,
+    "BankruptcyHistory": 0,
+    "EmploymentStatus": "Employed",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests in the measured phase")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--seed-loans", type=int, default=50, help="Loans created before measuring")
+    parser.add_argument("--user-id", help="Existing user id; adds /tranch/user-tranches to the mix")
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    base = args.base_url.rstrip("/")
+    seeded = [http_request("POST", f"{base}/loans/", SAMPLE_LOAN) for _ in range(args.seed_loans)]
+    loan_ids = [json.loads(r["body"])["id"] for r in seeded if r["status"] == 201]
+    if not loan_ids:
+        raise SystemExit(f"Could not create sample loans at {base}; is the API running?")
+
+    ids = itertools.cycle(loan_ids)
+    routes = [
+        lambda: http_request("GET", f"{base}/loans/{next(ids)}"),
+        lambda: http_request("GET", f"{base}/loans/{next(ids)}"),
+        lambda: http_request("POST", f"{base}/loans/", SAMPLE_LOAN),
+        lambda: http_request("GET", f"{base}/tranch/available"),
+    ]
+    if args.user_id:
+        routes.append(lambda: http_request("GET", f"{base}/tranch/user-tranches?user_id={args.user_id}"))
+
+    results, wall = run_concurrent(lambda i: routes[i % len(routes)](), args.requests, args.concurrency)
+    print_summary(f"Mixed routes, concurrency={args.concurrency}", summarize(results, wall))
+
+    reads, wall = run_concurrent(lambda i: http_request("GET", f"{base}/loans/{next(ids)}"), args.requests, args.concurrency)
+    print_summary(f"GET /loans/{{id}}, concurrency={args.concurrency}", summarize(reads, wall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Tranche checkout latency benchmark.
+
+Posts checkouts of growing size to `POST /tranch/checkout` and prints latency
+per (tranches, loan ids per tranche) combination. Every tranche is owned by
+the same investor, so each checkout also updates that investor's tranche list:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.tranche_checkout --investor-id <user id> --tranches 1 4 16 --loans 100 5000
+
+Run it against an older build to compare with per-tranche writes. The
+benchmark creates real tranches; use a scratch database.
+"""
+
+import os
+import argparse
+from benchmarks.common import (
+    DEFAULT_BASE_URL, add_token_argument, use_token,
+    http_request, run_concurrent, summarize, print_summary,
+)
+
+
+def random_object_id() -> str:
+    return os.urandom(12).hex()
+
+
+def make_checkout(tranche_count: int, loans_per_tranche: int, investor_id: str) -> list:
+    """Build one checkout body of new tranches with random loan ids."""
+    return [
+        {
+            "tranche_name": f"Tranche {index}",
+            "risk_category": "Low",
+            "return_category": "Stable",
+            "payment_priority": "First to be paid",
+            "loans": [random_object_id() for _ in range(loans_per_tranche)],
+            "budget_spent": 100000.0,
+            "average_risk": 40.0,
+            "investor_budget": 200000.0,
+            "criteria": "Duration",
+            "suboption": "Short-Term",
+            "investor_id": investor_id,
+        }
+        for index in range(tranche_count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /tranch/checkout latency.")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--investor-id", default=random_object_id(), help="Investor owning the tranches")
+    parser.add_argument("--tranches", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--loans", type=int, nargs="+", default=[100, 1000, 5000], help="Loan ids per tranche")
+    parser.add_argument("--requests", type=int, default=20, help="Checkouts per combination")
+    parser.add_argument("--concurrency", type=int, default=1)
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    url = f"{args.base_url.rstrip('/')}/tranch/checkout"
+    for tranche_count in args.tranches:
+        for loans_per_tranche in args.loans:
+            bodies = [make_checkout(tranche_count, loans_per_tranche, args.investor_id) for _ in range(args.requests)]
+            results, wall = run_concurrent(lambda i: http_request("POST", url, bodies[i]), args.requests, args.concurrency)
+            print_summary(f"checkout: {tranche_count} tranches x {loans_per_tranche} loan ids", summarize(results, wall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Concurrent tranche purchase benchmark.
+
+Hundreds of simulated buyers race for the same few tranches through
+`POST /tranch/buy-tranche`. Afterwards the script checks ownership directly in
+MongoDB and reports:
+- how many purchases succeeded (must equal the number of tranches),
+- tranches whose owner differs from what the API reported, and buyers holding a
+  tranche they do not own (both must be zero),
+- request throughput and latency.
+
+Buyers and tranches are created directly in the database (MONGO_URI must point
+at the same database as the API, ideally a scratch one) and removed at the end:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.tranche_purchase_race --buyers 300 --tranches 20 --concurrency 64
+"""
+
+import random
+import argparse
+from urllib.parse import urlencode
+from bson import ObjectId
+from benchmarks.common import (
+    DEFAULT_BASE_URL, add_token_argument, use_token,
+    http_request, run_concurrent, summarize, print_summary,
+)
+
+
+def setup(db, buyers: int, tranches: int, run_id: str) -> tuple:
+    """Insert unsold tranches and buyer accounts tagged with run_id; return their ids."""
+    tranche_docs = [
+        {"tranche_name": f"Race {index}", "risk_category": "Low", "return_category": "Stable",
+         "payment_priority": "First to be paid", "loans": [], "budget_spent": 0.0, "average_risk": 0.0,
+         "investor_budget": 0.0, "criteria": "Benchmark", "suboption": "Race", "investor_id": None,
+         "benchmark_run": run_id}
+        for index in range(tranches)
+    ]
+    buyer_docs = [
+        {"full_name": f"Buyer {index}", "email": f"race-{run_id}-{index}@example.com", "password": "-",
+         "is_verified": True, "tranches": [], "benchmark_run": run_id}
+        for index in range(buyers)
+    ]
+    tranche_ids = db["tranches"].insert_many(tranche_docs).inserted_ids
+    buyer_ids = db["users"].insert_many(buyer_docs).inserted_ids
+    return tranche_ids, buyer_ids
+
+
+def verify(db, run_id: str, wins: list) -> dict:
+    """Compare the API's reported wins with the ownership stored in MongoDB."""
+    owners = {t["_id"]: t["investor_id"] for t in db["tranches"].find({"benchmark_run": run_id})}
+    holdings = [(u["_id"], tranche_id) for u in db["users"].find({"benchmark_run": run_id})
+                for tranche_id in u.get("tranches", [])]
+    reported = {}
+    for tranche_id, buyer_id in wins:
+        reported.setdefault(tranche_id, []).append(buyer_id)
+    return {
+        "tranches": len(owners),
+        "sold": sum(1 for owner in owners.values() if owner is not None),
+        "double_sold": sum(1 for buyers in reported.values() if len(buyers) > 1),
+        "owner_mismatch": sum(1 for tranche_id, buyers in reported.items() if owners.get(tranche_id) != buyers[0]),
+        "foreign_holdings": sum(1 for buyer_id, tranche_id in holdings if owners.get(tranche_id) != buyer_id),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Race concurrent buyers for the same tranches.")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--buyers", type=int, default=300)
+    parser.add_argument("--tranches", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark documents")
+    add_token_argument(parser)
+    args = parser.parse_args()
+    use_token(args.token)
+
+    from app.config.database import get_database
+
+    db = get_database()
+    run_id = str(ObjectId())
+    tranche_ids, buyer_ids = setup(db, args.buyers, args.tranches, run_id)
+    try:
+        # Every buyer tries every tranche, in its own random order
+        rng = random.Random(args.seed)
+        attempts = []
+        for buyer_id in buyer_ids:
+            order = list(tranche_ids)
+            rng.shuffle(order)
+            attempts.extend((tranche_id, buyer_id) for tranche_id in order)
+        rng.shuffle(attempts)
+
+        url = f"{args.base_url.rstrip('/')}/tranch/buy-tranche"
+
+        def buy(index):
+            tranche_id, buyer_id = attempts[index]
+            query = urlencode({"tranche_id": str(tranche_id), "investor_id": str(buyer_id)})
+            return http_request("POST", f"{url}?{query}")
+
+        results, wall = run_concurrent(buy, len(attempts), args.concurrency)
+        wins = [attempts[i] for i, result in enumerate(results) if result["status"] == 200]
+        conflicts = sum(1 for result in results if result["status"] == 409)
+        failures = len(results) - len(wins) - conflicts
+
+        print_summary(f"{args.buyers} buyers x {args.tranches} tranches", summarize(results, wall))
+        report = verify(db, run_id, wins)
+        print(f"purchases={len(wins)} conflicts(409)={conflicts} other_failures={failures}")
+        print(", ".join(f"{key}={value}" for key, value in report.items()))
+        exactly_once = (len(wins) == report["sold"] == report["tranches"]
+                        and not report["double_sold"] and not report["owner_mismatch"]
+                        and not report["foreign_holdings"])
+        print("exactly-once ownership: " + ("OK" if exactly_once else "VIOLATED"))
+    finally:
+        if not args.keep:
+            db["tranches"].delete_many({"benchmark_run": run_id})
+            db["users"].delete_many({"benchmark_run": run_id})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Generate synthetic loans for scale and load testing.
+
+Loans come from app.ml.synthetic (vectorized, seeded) and are written chunk by
+chunk, so memory stays flat whatever the number of rows:
+- parquet: one row group per chunk (needs pyarrow),
+- ndjson / csv: appended per chunk,
+- mongo: unordered insert_many batches into the loans collection, with the
+  version fields stamped as for any other new loan.
+
+Usage (from the backend directory):
+
+    python generate_loans.py --rows 5000000 --format parquet --output loans.parquet
+    python generate_loans.py --rows 1000000 --format csv --output Loan.csv --seed 7
+    python generate_loans.py --rows 2000000 --format mongo --collection loans_scale
+"""
+
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.ml.synthetic import DEFAULT_CHUNK_SIZE, generate_loans
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+FORMATS = ("parquet", "ndjson", "csv", "mongo")
+
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Generate synthetic loans.")
+    parser.add_argument("--rows", type=int, required=True, help="Number of loans to generate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows generated per chunk")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--output", help="Output file (parquet, ndjson and csv formats)")
+    parser.add_argument("--collection", default="loans", help="Target collection (mongo format)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many (mongo format)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel insert batches (mongo format)")
+    args = parser.parse_args()
+    if args.format != "mongo" and not args.output:
+        parser.error(f"--output is required for the {args.format} format")
+    return args
+
+
+class ParquetWriter:
+    """Write each chunk as one Parquet row group."""
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class TextWriter:
+    """Append chunks to an NDJSON or CSV file."""
+
+    def __init__(self, path, fmt):
+        self.file = open(path, "w", newline="")
+        self.fmt = fmt
+        self._header = True
+
+    def write(self, chunk):
+        if self.fmt == "csv":
+            chunk.to_csv(self.file, header=self._header, index=False)
+            self._header = False
+        else:
+            chunk.to_json(self.file, orient="records", lines=True)
+
+    def close(self):
+        self.file.close()
+
+
+class MongoWriter:
+    """Insert chunks into a collection with parallel, unordered batches."""
+
+    def __init__(self, collection_name, batch_size, workers):
+        from app.config.database import get_database
+
+        self.db = get_database()
+        self.collection = self.db[collection_name]
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _insert(self, documents):
+        from app.services.loan_versioning import reserve_change_seqs_sync, stamp_new_loan, utc_now
+
+        first_seq = reserve_change_seqs_sync(self.db, len(documents))
+        now = utc_now()
+        for offset, document in enumerate(documents):
+            stamp_new_loan(document, first_seq + offset, now)
+        self.collection.insert_many(documents, ordered=False)
+
+    def write(self, chunk):
+        documents = chunk.to_dict("records")
+        batches = [documents[start:start + self.batch_size] for start in range(0, len(documents), self.batch_size)]
+        for future in [self.executor.submit(self._insert, batch) for batch in batches]:
+            future.result()  # re-raises batch errors
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def open_writer(args):
+    """Return the writer for the selected output format."""
+    if args.format == "parquet":
+        return ParquetWriter(args.output)
+    if args.format == "mongo":
+        return MongoWriter(args.collection, args.batch_size, args.workers)
+    return TextWriter(args.output, args.format)
+
+
+def main():
+    """Main function to execute the script."""
+    load_dotenv()
+    args = parse_args()
+    if args.format == "mongo" and not os.getenv("MONGO_URI"):
+        logging.error("MONGO_URI is not set in the .env file.")
+        exit(1)
+
+    writer = open_writer(args)
+    started = time.perf_counter()
+    rows_done = 0
+    try:
+        for chunk in generate_loans(args.rows, args.seed, args.chunk_size):
+            writer.write(chunk)
+            rows_done += len(chunk)
+            elapsed = time.perf_counter() - started
+            logging.info(f"{rows_done:,}/{args.rows:,} loans ({rows_done / elapsed:,.0f} rows/sec)")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    target = args.collection if args.format == "mongo" else args.output
+    logging.info(f"Done: {rows_done:,} loans written to {target} in {elapsed:.1f}s "
+                 f"({rows_done / elapsed if elapsed else 0:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,87 @@
+"""Seed the loans collection from a CSV file.
+
+The loader streams the CSV in chunks, converts each chunk straight into typed
+loan documents and inserts them with parallel, unordered batches:
+- every row gets a deterministic ObjectId derived from its row number and
+  content, so re-loading rows after a crash never creates duplicates, while a
+  new tape under the same file name still loads its (different) rows,
+- progress is checkpointed to a JSON file after each chunk, and a re-run
+  resumes after the last fully loaded row,
+- with --upsert-key the rows are upserted on a natural key instead, which
+  updates existing loans in place,
+- throughput (rows/sec) is logged per chunk and for the whole run.
+
+Integer loan fields holding fractional values are stored unchanged (as floats)
+and reported, never rounded.
+
+Usage (from the backend directory):
+
+    python seed.py                                # CSV_FILE from .env, default Loan.csv
+    python seed.py --csv loans.csv --workers 8 --batch-size 2000
+    python seed.py --upsert-key ApplicationDate,Age,AnnualIncome,LoanAmount
+    python seed.py --restart                      # ignore an existing checkpoint
+"""
+
 import os
 import json
-import tempfile
+import time
+import hashlib
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
-from pymongo import MongoClient
+from bson import ObjectId
 from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.services.loan_query import LOAN_FIELDS
+from app.services.loan_versioning import reserve_change_seqs_sync, stamp_new_loan, utc_now
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+DUPLICATE_KEY_ERROR = 11000
+
+
 def load_environment_variables():
     """Load and validate environment variables."""
     load_dotenv()
     mongo_uri = os.getenv("MONGO_URI")
     csv_file = os.getenv("CSV_FILE", "Loan.csv")
-    
+
     if not mongo_uri:
         logging.error("MONGO_URI is not set in the .env file.")
         exit(1)
-    
+
     return mongo_uri, csv_file
 
-def load_csv(file_path):
-    """Load a CSV file into a pandas DataFrame."""
-    try:
-        df = pd.read_csv(file_path)
-        if df.empty:
-            logging.error("The CSV file is empty.")
-            exit(1)
-        logging.info(f"Loaded CSV file: {file_path}")
-        return df
-    except FileNotFoundError:
-        logging.error(f"CSV file {file_path} not found.")
-        exit(1)
+def parse_args(csv_file):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Stream a loan CSV into MongoDB.")
+    parser.add_argument("--csv", default=csv_file, help="CSV file to load (default: CSV_FILE or Loan.csv)")
+    parser.add_argument("--collection", default="loans")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("SEED_CHUNK_SIZE", 20000)),
+                        help="Rows read and checkpointed together")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("SEED_BATCH_SIZE", 1000)),
+                        help="Documents per insert_many/bulk_write call")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SEED_WORKERS", 4)),
+                        help="Batches written in parallel")
+    parser.add_argument("--upsert-key", help="Comma-separated natural key columns; upsert instead of insert")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <csv>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    return parser.parse_args()
+
+def connect_to_mongodb(mongo_uri, db_name=None, collection_name="loans"):
+    """Connect to MongoDB and return the specified collection.
 
-def convert_csv_to_json(df):
-    """Convert a DataFrame to JSON and save it to a temporary file."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_json:
-        temp_json_path = temp_json.name
-        df.to_json(temp_json_path, orient="records", lines=True)
-        logging.info(f"Converted CSV to JSON: {temp_json_path}")
-        return temp_json_path
+    The client is built from the shared pool settings in app.config.database.
+    """
+    # Imported here so a missing MONGO_URI is reported by load_environment_variables first
+    from app.config.database import create_client, MONGO_DB_NAME
 
-def connect_to_mongodb(mongo_uri, db_name="loan_database", collection_name="loans"):
-    """Connect to MongoDB and return the specified collection."""
     try:
-        client = MongoClient(mongo_uri)
-        db = client[db_name]
+        client = create_client(mongo_uri)
+        db = client[db_name or MONGO_DB_NAME]
         collection = db[collection_name]
         logging.info("Connected to MongoDB")
         return collection
@@ -54,36 +89,167 @@ def connect_to_mongodb(mongo_uri, db_name="loan_database", collection_name="loan
         logging.error(f"Error connecting to MongoDB: {e}")
         exit(1)
 
-def insert_data_into_mongodb(collection, json_file_path, batch_size=1000):
-    """Insert data from a JSON file into a MongoDB collection."""
-    try:
-        with open(json_file_path, "r") as file:
-            data = [json.loads(line) for line in file]
-        
-        if data:
-            collection.insert_many(data)  # Batch insert
-            logging.info(f"Inserted {len(data)} records into MongoDB.")
-        else:
-            logging.warning("No records found in the JSON file.")
-    except Exception as e:
-        logging.error(f"Error inserting data into MongoDB: {e}")
+def file_fingerprint(path):
+    """Identify a CSV file version so a checkpoint is never applied to a different file."""
+    stat = os.stat(path)
+    return {"csv": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+def load_checkpoint(path, fingerprint):
+    """Return the number of rows already loaded according to the checkpoint (0 if none applies)."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as file:
+        checkpoint = json.load(file)
+    if {key: checkpoint.get(key) for key in fingerprint} != fingerprint:
+        logging.warning(f"Checkpoint {path} belongs to a different file version; starting over.")
+        return 0
+    return checkpoint.get("rows_done", 0)
+
+def save_checkpoint(path, fingerprint, rows_done):
+    """Atomically write the checkpoint."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({**fingerprint, "rows_done": rows_done}, file)
+    os.replace(temp_path, path)
 
-def cleanup_temp_file(file_path):
-    """Delete a temporary file."""
+def row_object_id(row_number, document):
+    """Deterministic ObjectId for a CSV row: the same row of the same data always gets the same id."""
+    content = json.dumps(document, sort_keys=True, default=str)
+    return ObjectId(hashlib.sha1(f"{row_number}:{content}".encode("utf-8")).digest()[:12])
+
+def _integers_where_integral(values):
+    """Whole numbers become ints; fractional values are kept as they are."""
+    converted = [int(value) if value == value and value % 1 == 0 else value for value in values.tolist()]
+    return pd.Series(converted, index=values.index, dtype=object)
+
+def to_documents(chunk, first_row, with_ids=True):
+    """Convert a DataFrame chunk into typed loan documents.
+
+    Known loan fields are coerced to the types of the Loan model; missing values
+    are left out of the document rather than stored as NaN. Fractional values in
+    integer fields are kept as floats and logged, not rounded.
+    """
+    for name in chunk.columns:
+        field_type = LOAN_FIELDS.get(name)
+        if field_type is int:
+            numeric = pd.to_numeric(chunk[name], errors="coerce")
+            fractional = int((numeric % 1 != 0).sum() - numeric.isna().sum())
+            if fractional:
+                logging.warning(f"Rows {first_row + 1}-{first_row + len(chunk)}: {fractional} fractional "
+                                f"value(s) in integer field {name} kept as floats")
+            chunk[name] = _integers_where_integral(numeric)
+        elif field_type is float:
+            chunk[name] = pd.to_numeric(chunk[name], errors="coerce")
+        elif field_type is str:
+            chunk[name] = chunk[name].where(chunk[name].isna(), chunk[name].astype(str))
+
+    documents = []
+    for offset, record in enumerate(chunk.to_dict("records")):
+        document = {key: value for key, value in record.items() if value is not None and value == value}
+        if with_ids:
+            document["_id"] = row_object_id(first_row + offset, document)
+        documents.append(document)
+    return documents
+
+def write_batch(collection, documents, upsert_key):
+    """Write one batch; returns (written, already_present).
+
+    Inserts are unordered and duplicate-key errors for deterministic ids are
+    counted as rows already loaded by an earlier run. Any other error is raised.
+    """
+    first_seq = reserve_change_seqs_sync(collection.database, len(documents))
+    now = utc_now()
+    if upsert_key:
+        operations = []
+        for offset, document in enumerate(documents):
+            key = {name: document.get(name) for name in upsert_key}
+            fields = {name: value for name, value in document.items() if name not in key}
+            operations.append(UpdateOne(
+                key,
+                {"$set": {**fields, "updated_at": now, "change_seq": first_seq + offset}, "$inc": {"version": 1}},
+                upsert=True,
+            ))
+        result = collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.modified_count, result.matched_count - result.modified_count
+
+    for offset, document in enumerate(documents):
+        stamp_new_loan(document, first_seq + offset, now)
     try:
-        os.remove(file_path)
-        logging.info(f"Deleted temporary file: {file_path}")
-    except Exception as e:
-        logging.warning(f"Unable to delete temporary file: {e}")
+        result = collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids), 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return e.details.get("nInserted", 0), len(errors)
+
+def load_chunk(collection, executor, documents, batch_size, upsert_key):
+    """Write a chunk's documents as parallel batches and wait for all of them.
+
+    Returns:
+        tuple: (written, already_present)
+    """
+    futures = [
+        executor.submit(write_batch, collection, documents[start:start + batch_size], upsert_key)
+        for start in range(0, len(documents), batch_size)
+    ]
+    written = present = 0
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            batch_written, batch_present = future.result()  # re-raises batch errors
+            written += batch_written
+            present += batch_present
+    return written, present
 
 def main():
     """Main function to execute the script."""
     mongo_uri, csv_file = load_environment_variables()
-    df = load_csv(csv_file)
-    temp_json_path = convert_csv_to_json(df)
-    collection = connect_to_mongodb(mongo_uri)
-    insert_data_into_mongodb(collection, temp_json_path)
-    cleanup_temp_file(temp_json_path)
+    args = parse_args(csv_file)
+    if not os.path.exists(args.csv):
+        logging.error(f"CSV file {args.csv} not found.")
+        exit(1)
+
+    upsert_key = [name.strip() for name in args.upsert_key.split(",")] if args.upsert_key else None
+    checkpoint_path = args.checkpoint or f"{args.csv}.checkpoint.json"
+    fingerprint = file_fingerprint(args.csv)
+    rows_done = 0 if args.restart else load_checkpoint(checkpoint_path, fingerprint)
+    if rows_done:
+        logging.info(f"Resuming after row {rows_done} from checkpoint {checkpoint_path}")
+
+    collection = connect_to_mongodb(mongo_uri, collection_name=args.collection)
+    reader = pd.read_csv(args.csv, chunksize=args.chunk_size, skiprows=range(1, rows_done + 1))
+
+    started = time.perf_counter()
+    total_written = total_present = rows_read = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for chunk in reader:
+            chunk_started = time.perf_counter()
+            documents = to_documents(chunk, rows_done, with_ids=upsert_key is None)
+            try:
+                written, present = load_chunk(collection, executor, documents, args.batch_size, upsert_key)
+            except Exception as e:
+                logging.error(f"Loading rows {rows_done + 1}-{rows_done + len(chunk)} failed: {e}")
+                logging.error(f"Progress saved; re-run to resume after row {rows_done}.")
+                exit(1)
+
+            rows_done += len(chunk)
+            rows_read += len(chunk)
+            total_written += written
+            total_present += present
+            save_checkpoint(checkpoint_path, fingerprint, rows_done)
+            elapsed = time.perf_counter() - chunk_started
+            logging.info(
+                f"Rows up to {rows_done}: {written} written, {present} already present "
+                f"({len(chunk) / elapsed:,.0f} rows/sec)"
+            )
+
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"Done: {rows_read} rows read, {total_written} written, {total_present} already present "
+        f"in {elapsed:.1f}s ({rows_read / elapsed if elapsed else 0:,.0f} rows/sec)"
+    )
 
 if __name__ == "__main__":
     main()
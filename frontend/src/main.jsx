@@ -5,6 +5,28 @@ import App from "./App.jsx";
 import { BrowserRouter } from "react-router";
 import { TrancheProvider } from "./context/TrancheContext";
 import { UserProvider } from "./context/UserContext";
+import axios from "axios";
+
+// Send the login token with every API request; an expired or rejected token logs the user out
+axios.interceptors.request.use((config) => {
+  const token = localStorage.getItem("token");
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+axios.interceptors.response.use(
+  (response) => response,
+  (error) => {
+    if (error.response?.status === 401 && localStorage.getItem("token")) {
+      localStorage.removeItem("token");
+      localStorage.removeItem("user");
+      window.location.assign("/login");
+    }
+    return Promise.reject(error);
+  }
+);
 
 createRoot(document.getElementById("root")).render(
   <StrictMode>
@@ -47,8 +47,9 @@ const Dashboard = () => {
 
     const fetchUserTranches = async () => {
       try {
-        const response = await axios.get(`${API_URL}/tranch/user-tranches`, {
-          params: { user_id: user.id },
+        // One request: the portfolio summary carries every owned tranche
+        const response = await axios.get(`${API_URL}/tranch/portfolio`, {
+          params: { investor_id: user.id },
         });
 
         if (response.status === 200) {
@@ -66,14 +67,7 @@ const Dashboard = () => {
 
     const fetchTrancheDetails = async () => {
       try {
-        const details = await Promise.all(
-          tranches.map(async (trancheId) => {
-            const response = await axios.get(`${API_URL}/tranch/tranche`, {
-              params: { tranche_id: trancheId },
-            });
-            return response.data;
-          })
-        );
+        const details = tranches;
         setTrancheDetails(details);
 
         const totalInvestorBudget = details.reduce(
@@ -111,14 +105,14 @@ const Dashboard = () => {
         setReturnDistribution(retDist);
 
         const totalLoans = details.reduce(
-          (sum, t) => sum + (t.loans?.length || 0),
+          (sum, t) => sum + (t.loan_count || 0),
           0
         );
         setLoanCount(totalLoans);
 
         const loanDist = details.map((t) => ({
           name: t.tranche_name,
-          loans: t.loans?.length || 0,
+          loans: t.loan_count || 0,
         }));
         setLoanDistribution(loanDist);
 
@@ -36,9 +36,18 @@ const TrancheMarketplace = () => {
   useEffect(() => {
     const fetchTranches = async () => {
       try {
-        const response = await axios.get(`${API_URL}/tranch/available`);
-        setTranches(response.data);
-        setFilteredTranches(response.data);
+        // The listing is paginated; follow X-Next-Cursor until the last page
+        let available = [];
+        let after = null;
+        do {
+          const response = await axios.get(`${API_URL}/tranch/available`, {
+            params: { limit: 500, ...(after && { after }) },
+          });
+          available = available.concat(response.data);
+          after = response.headers["x-next-cursor"];
+        } while (after);
+        setTranches(available);
+        setFilteredTranches(available);
       } catch (error) {
         console.error("Error fetching available tranches:", error);
       } finally {